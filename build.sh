@@ -10,7 +10,12 @@ rm -f .DS_Store
 
 pip install -r requirements.txt
 pip install pyinstaller
-pyinstaller --windowed --name "PDF Creator" --icon=resources/icon.icns --add-data "resources:resources" pdf_creator.py
+# jpegtran rotates and crops JPEGs losslessly; it is bundled because the app
+# started from the Finder does not see Homebrew
+brew list jpeg-turbo > /dev/null 2>&1 || brew install jpeg-turbo
+JPEGTRAN="$(brew --prefix jpeg-turbo)/bin/jpegtran"
+pyinstaller --windowed --name "PDF Creator" --icon=resources/icon.icns --add-data "resources:resources" \
+  --add-binary "$JPEGTRAN:bin" pdf_creator.py
 
 # Make sure entitlements are correct
 echo "Checking entitlements file..."
@@ -21,6 +26,7 @@ codesign --force --deep --verbose --timestamp --options runtime --entitlements e
 
 # Sign all dylibs
 find "dist/PDF Creator.app/Contents/Frameworks" -name "*.dylib" -exec codesign --force --timestamp --options runtime --entitlements entitlements.plist --verbose -s "$CERT_ID" {} \;
+codesign --force --timestamp --options runtime --entitlements entitlements.plist --verbose -s "$CERT_ID" "dist/PDF Creator.app/Contents/Frameworks/bin/jpegtran"
 
 # Verify app signing
 echo "Verifying app signing..."
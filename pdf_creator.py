@@ -2,63 +2,1373 @@ import sys
 import os
 import subprocess
 import shutil
+import hashlib
+import copy
+import json
+import math
+import multiprocessing
+import queue
+import re
+import struct
+import threading
+import heapq
+import itertools
+import time
+import uuid
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from io import BytesIO
-from PIL import Image, ImageOps
+import numpy as np
+from PIL import Image, ImageOps, ExifTags, ImageCms
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QFileDialog,
-    QLineEdit, QComboBox, QScrollArea, QFrame, QGridLayout, QHBoxLayout, QMessageBox,
-    QSizePolicy, QProgressDialog
+    QLineEdit, QComboBox, QHBoxLayout, QMessageBox, QSizePolicy, QProgressDialog, QProgressBar,
+    QListView, QAbstractItemView, QStyledItemDelegate, QStyle, QInputDialog
+)
+from PyQt6.QtGui import QPixmap, QIntValidator, QImage, QIcon, QDrag, QPainter, QColor, QPen, QCursor
+from PyQt6.QtCore import (
+    Qt, QTranslator, QLibraryInfo, QLocale, QThread, pyqtSignal, QMimeData, QPoint, QStandardPaths,
+    QAbstractListModel, QModelIndex, QSize, QRect, QEvent, QTimer, QBuffer, QIODevice
 )
-from PyQt6.QtGui import QPixmap, QIntValidator, QImage, QIcon, QDrag
-from PyQt6.QtCore import Qt, QTranslator, QLibraryInfo, QLocale, QThread, pyqtSignal, QMimeData, QPoint
 from fpdf import FPDF
 
 os.environ["LANG"] = "de_DE.UTF-8"
 
 
-class ImageImportWorker(QThread):
-    imageImported = pyqtSignal(str, QImage)
-    progress = pyqtSignal(int)
+THUMBNAIL_SIZE = 120
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+ARCHIVE_EXTENSIONS = (".zip",)
+
+# Open archives per thread; ZipFile parses the central directory only once
+# per version of the archive file
+_archives = threading.local()
+
+
+def split_archive_path(file_path):
+    # "<folder>/photos.zip/Bad/IMG_1.jpg" -> ("<folder>/photos.zip", "Bad/IMG_1.jpg")
+    lower_path = file_path.lower()
+    for extension in ARCHIVE_EXTENSIONS:
+        start = 0
+        while True:
+            idx = lower_path.find(extension + "/", start)
+            if idx == -1:
+                break
+            archive_path = file_path[:idx + len(extension)]
+            if os.path.isfile(archive_path):
+                return archive_path, file_path[idx + len(extension) + 1:]
+            start = idx + 1
+    return None, None
+
+
+def open_archive(archive_path):
+    archives = getattr(_archives, "open", None)
+    if archives is None:
+        archives = _archives.open = {}
+    # A replaced archive is reopened instead of being read through the
+    # central directory of the old file
+    st = os.stat(archive_path)
+    version = (st.st_mtime_ns, st.st_size)
+    cached = archives.get(archive_path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    if cached is not None:
+        cached[1].close()
+    zf = zipfile.ZipFile(archive_path)
+    archives[archive_path] = (version, zf)
+    return zf
+
+
+def close_archives():
+    # Releases the archives opened by the calling thread
+    archives = getattr(_archives, "open", None) or {}
+    for _, zf in archives.values():
+        zf.close()
+    _archives.open = {}
+
+
+def list_archive_images(archive_path):
+    with zipfile.ZipFile(archive_path) as zf:
+        names = [info.filename for info in zf.infolist()
+                 if not info.is_dir()
+                 and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+                 and not info.filename.startswith("__MACOSX/")
+                 and not os.path.basename(info.filename).startswith(".")]
+    return [f"{archive_path}/{name}" for name in sorted(names)]
+
+
+def open_image_source(file_path):
+    # Archive members are streamed from the archive, which is never extracted;
+    # header reads only decompress as far as the header goes
+    archive_path, member = (None, None) if os.path.exists(file_path) else split_archive_path(file_path)
+    if archive_path is not None:
+        return open_archive(archive_path).open(member)
+    return open(file_path, "rb")
+
+
+def source_signature(file_path, use_content_hash=False):
+    archive_path, member = (None, None) if os.path.exists(file_path) else split_archive_path(file_path)
+    if archive_path is not None:
+        # The archive already stores a CRC of every member
+        info = open_archive(archive_path).getinfo(member)
+        if use_content_hash:
+            return f"zip|{info.CRC:08x}|{info.file_size}"
+        st = os.stat(archive_path)
+        return f"{os.path.abspath(archive_path)}|{st.st_mtime_ns}|{member}|{info.CRC:08x}"
+    if use_content_hash:
+        digest = hashlib.sha1()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    st = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def natural_sort_key(text):
+    # "Foto Nr. 9" before "Foto Nr. 10": digit runs compare as numbers
+    parts = re.split(r"(\d+)", text.casefold())
+    return [int(part) if i % 2 else part for i, part in enumerate(parts)]
+
+
+def source_stat(file_path):
+    archive_path, member = (None, None) if os.path.exists(file_path) else split_archive_path(file_path)
+    if archive_path is not None:
+        info = open_archive(archive_path).getinfo(member)
+        return info.file_size, time.mktime(info.date_time + (0, 0, -1))
+    st = os.stat(file_path)
+    return st.st_size, st.st_mtime
+
+
+def source_folder(file_path):
+    archive_path, _ = (None, None) if os.path.exists(file_path) else split_archive_path(file_path)
+    return os.path.dirname(archive_path or file_path)
+
+
+EXIF_ORIENTATION_TAG = 0x0112
+EXIF_TRANSPOSE_METHODS = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+class ImageMeta:
+    # Header facts about one image, read once at import; width and height are
+    # as stored, before the EXIF orientation is applied
+    __slots__ = ("width", "height", "orientation", "format", "size", "mtime", "taken")
+
+    def __init__(self, width, height, orientation=1, format=None, size=0, mtime=0.0, taken=None):
+        self.width = width
+        self.height = height
+        self.orientation = orientation
+        self.format = format
+        self.size = size
+        self.mtime = mtime
+        # EXIF capture time as "YYYY:MM:DD HH:MM:SS", which sorts as a string
+        self.taken = taken
+
+    @property
+    def display_size(self):
+        # Orientations 5 to 8 swap width and height
+        if self.orientation in (5, 6, 7, 8):
+            return self.height, self.width
+        return self.width, self.height
+
+    @property
+    def is_horizontal(self):
+        width, height = self.display_size
+        return width >= height
+
+
+def read_image_meta(file_path):
+    # Image.open only parses the header; the EXIF block comes from the same read
+    with open_image_source(file_path) as source, Image.open(source) as img:
+        width, height = img.size
+        exif = img.getexif()
+        orientation = exif.get(EXIF_ORIENTATION_TAG, 1)
+        taken = exif.get_ifd(ExifTags.IFD.Exif).get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime)
+        image_format = img.format
+    if orientation not in range(1, 9):
+        orientation = 1
+    if isinstance(taken, bytes):
+        taken = taken.decode("ascii", "ignore")
+    if isinstance(taken, str):
+        taken = taken.strip("\x00 ") or None
+    else:
+        taken = None
+    return ImageMeta(width, height, orientation, image_format, *source_stat(file_path), taken)
+
+
+def try_read_image_meta(file_path):
+    try:
+        return read_image_meta(file_path)
+    except Exception as e:
+        print(f"Fehler beim Lesen der Bilddaten {file_path}: {e}")
+        return None
+
+
+def luma_array(img, size):
+    # Only reduced by a whole factor, to between size and twice that; a
+    # resample would cost as much again as the scoring itself
+    gray = img.convert("L")
+    factor = max(gray.size) // size
+    if factor > 1:
+        gray = gray.reduce(factor)
+    return np.asarray(gray)
+
+
+def load_exif_thumbnail(file_path, size=THUMBNAIL_SIZE, luma_size=None):
+    # With luma_size, returns (thumbnail, luma): the grayscale of the preview
+    # at about luma_size, see luma_array, for image_quality_scores
+    with open_image_source(file_path) as source, Image.open(source) as img:
+        exif_data = img.info.get("exif")
+        if img.format != "JPEG" or not exif_data:
+            return None
+        exif = img.getexif()
+        ifd1 = exif.get_ifd(ExifTags.IFD.IFD1)
+        offset = ifd1.get(ExifTags.Base.JpegIFOffset)
+        length = ifd1.get(ExifTags.Base.JpegIFByteCount)
+        orientation = exif.get(EXIF_ORIENTATION_TAG, 1)
+        full_width, full_height = img.size
+    if not offset or not length:
+        return None
+
+    # The offsets are relative to the TIFF header that follows "Exif\0\0"
+    thumb = Image.open(BytesIO(exif_data[6 + offset:6 + offset + length]))
+    thumb.load()
+    if max(thumb.size) < size:
+        return None
+    # Many cameras store a 4:3 preview with black bars for other aspect ratios
+    if abs(thumb.width / thumb.height - full_width / full_height) > 0.02:
+        return None
+
+    luma = luma_array(thumb, luma_size) if luma_size else None
+    if orientation in EXIF_TRANSPOSE_METHODS:
+        thumb = thumb.transpose(EXIF_TRANSPOSE_METHODS[orientation])
+    thumb.thumbnail((size, size), Image.LANCZOS)
+    if thumb.mode not in ("RGB", "L"):
+        thumb = thumb.convert("RGB")
+    return thumb if luma_size is None else (thumb, luma)
+
+
+def load_thumbnail(file_path, size=THUMBNAIL_SIZE, luma_size=None):
+    # With luma_size, returns (thumbnail, luma): the grayscale of the same
+    # decode at about luma_size, see luma_array, for image_quality_scores
+    with open_image_source(file_path) as source, Image.open(source) as img:
+        # Let the JPEG decoder scale down in the DCT domain (1/2, 1/4, 1/8) so
+        # the full-resolution pixels are never materialized
+        request = (size, size)
+        if luma_size:
+            # Asked for by the long side, which a 1/8 decode of a camera
+            # photo covers anyway
+            scale = luma_size / max(img.size)
+            request = (max(size, math.ceil(img.width * scale)), max(size, math.ceil(img.height * scale)))
+        img.draft("RGB", request)
+        luma = luma_array(img, luma_size) if luma_size else None
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size), Image.LANCZOS)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        return img if luma_size is None else (img, luma)
+
+
+def pil_to_qimage(img):
+    if img.mode == "RGBA":
+        qformat, bytes_per_pixel = QImage.Format.Format_RGBA8888, 4
+    elif img.mode == "L":
+        qformat, bytes_per_pixel = QImage.Format.Format_Grayscale8, 1
+    else:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        qformat, bytes_per_pixel = QImage.Format.Format_RGB888, 3
+    # The QImage wraps the single tobytes() copy without duplicating it again;
+    # PyQt keeps a reference to `data` for as long as the QImage wrapper lives,
+    # and thumbnails travel between threads as Python objects in list signals
+    data = img.tobytes()
+    return QImage(data, img.width, img.height, img.width * bytes_per_pixel, qformat)
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir=None, max_bytes=256 * 1024 * 1024, use_content_hash=False):
+        if cache_dir is None:
+            base_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.GenericCacheLocation)
+            cache_dir = os.path.join(base_dir, "PDF Creator", "thumbnails")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Hash the file content instead of path, size and mtime; survives
+        # renames and copies at the cost of reading every file once
+        self.use_content_hash = use_content_hash
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._total_bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir)
+                                if entry.name.endswith(".jpg"))
+
+    def key(self, file_path, size):
+        source = source_signature(file_path, self.use_content_hash)
+        return hashlib.sha1(f"{source}|{size}".encode("utf-8")).hexdigest()
+
+    def entryPath(self, key):
+        return os.path.join(self.cache_dir, f"{key}.jpg")
+
+    def get(self, file_path, size):
+        try:
+            entry_path = self.entryPath(self.key(file_path, size))
+            qimg = QImage(entry_path) if os.path.exists(entry_path) else QImage()
+            if not qimg.isNull():
+                # The modification time doubles as the LRU access time
+                os.utime(entry_path)
+        except (OSError, KeyError, zipfile.BadZipFile):
+            qimg = QImage()
+        with self._lock:
+            if qimg.isNull():
+                self.misses += 1
+                return None
+            self.hits += 1
+        return qimg
+
+    def put(self, file_path, size, qimg, quality=None):
+        if quality is not None:
+            # Kept as a JPEG comment, so a hit comes with its score
+            qimg = QImage(qimg)
+            qimg.setText("quality", quality.to_text())
+        try:
+            entry_path = self.entryPath(self.key(file_path, size))
+            temp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+            if not qimg.save(temp_path, "JPG", 90):
+                return
+            os.replace(temp_path, entry_path)
+            entry_size = os.path.getsize(entry_path)
+        except (OSError, KeyError, zipfile.BadZipFile) as e:
+            print(f"Fehler beim Schreiben des Vorschaubild-Caches: {e}")
+            return
+        with self._lock:
+            self._total_bytes += entry_size
+            if self._total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        # Drop the least recently used entries down to 90% of the cap so the
+        # directory is not scanned again on every following insert
+        entries = sorted((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path)
+                         for entry in os.scandir(self.cache_dir) if entry.name.endswith(".jpg"))
+        self._total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._total_bytes -= size
+            self.evictions += 1
+
+
+PROJECT_EXTENSION = ".pdfprojekt"
+PROJECT_VERSION = 1
+
+
+def write_project(project_path, project):
+    # A ZIP with project.json and the grid thumbnails as small JPEGs, written
+    # next to the target first so a failed save keeps the old file
+    images = []
+    temp_path = f"{project_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with zipfile.ZipFile(temp_path, "w") as zf:
+            for i, entry in enumerate(project["images"]):
+                entry = dict(entry)
+                thumbnail = entry.pop("thumbnail", None)
+                if thumbnail:
+                    entry["thumbnail"] = f"thumbnails/{i}.jpg"
+                    zf.writestr(entry["thumbnail"], thumbnail)
+                images.append(entry)
+            data = dict(project, version=PROJECT_VERSION, images=images)
+            zf.writestr("project.json", json.dumps(data, ensure_ascii=False), compress_type=zipfile.ZIP_DEFLATED)
+        os.replace(temp_path, project_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def read_project(project_path):
+    with zipfile.ZipFile(project_path) as zf:
+        project = json.loads(zf.read("project.json"))
+        if project.get("version", 0) > PROJECT_VERSION:
+            raise ValueError("Projektdatei stammt aus einer neueren Version")
+        for entry in project["images"]:
+            name = entry.get("thumbnail")
+            entry["thumbnail"] = zf.read(name) if name else None
+    return project
+
+
+DUPLICATE_MAX_DISTANCE = 6
+
+
+def perceptual_hash(qimg):
+    # 64-bit difference hash: brightness gradients of a 9x8 grayscale copy,
+    # taken from the thumbnail that was decoded anyway
+    small = qimg.scaled(9, 8, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+    small = small.convertToFormat(QImage.Format.Format_Grayscale8)
+    bits = small.constBits()
+    bits.setsize(small.sizeInBytes())
+    data = bytes(bits)
+    stride = small.bytesPerLine()
+    value = 0
+    for y in range(8):
+        row = data[y * stride:y * stride + 9]
+        for x in range(8):
+            value = (value << 1) | (row[x] > row[x + 1])
+    return value
+
+
+class DuplicateIndex:
+    # Multi-index hashing: the 64-bit hash is split into 8 one-byte chunks.
+    # Two hashes that differ in fewer than 8 bits share at least one chunk,
+    # so a lookup only checks the 8 buckets of its own chunks
+    CHUNKS = 8
+
+    def __init__(self):
+        self._hashes = {}
+        self._buckets = [{} for _ in range(self.CHUNKS)]
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, key, value):
+        self._hashes[key] = value
+        for i, bucket in enumerate(self._buckets):
+            bucket.setdefault((value >> (8 * i)) & 0xFF, []).append(key)
+
+    def remove(self, key):
+        value = self._hashes.pop(key, None)
+        if value is None:
+            return
+        for i, bucket in enumerate(self._buckets):
+            bucket[(value >> (8 * i)) & 0xFF].remove(key)
+
+    def search(self, value, max_distance=DUPLICATE_MAX_DISTANCE):
+        seen = set()
+        matches = []
+        for i, bucket in enumerate(self._buckets):
+            for key in bucket.get((value >> (8 * i)) & 0xFF, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                distance = (value ^ self._hashes[key]).bit_count()
+                if distance <= max_distance:
+                    matches.append((distance, key))
+        matches.sort()
+        return matches
+
+    def clear(self):
+        self._hashes.clear()
+        for bucket in self._buckets:
+            bucket.clear()
+
+
+SHARPNESS_THRESHOLD = 50.0
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+# Quality is scored on the luma of the thumbnail's own decode, kept at about
+# this size; the grid thumbnail is too small for the Laplacian to tell focus
+# from downscaling, while a 12 MP JPEG decodes to about this size at 1/8
+# scale anyway
+QUALITY_SIZE = 480
+
+
+class ImageQuality:
+    # Scores from a grayscale decode: sharpness is the variance of the
+    # Laplacian, exposure the mean level and the share of clipped pixels
+    __slots__ = ("sharpness", "brightness", "dark", "bright")
+
+    def __init__(self, sharpness, brightness, dark, bright):
+        self.sharpness = sharpness
+        self.brightness = brightness
+        self.dark = dark
+        self.bright = bright
+
+    def to_text(self):
+        return ",".join(repr(value) for value in (self.sharpness, self.brightness, self.dark, self.bright))
+
+    @classmethod
+    def from_text(cls, text):
+        # None for text without a score, such as older cache entries
+        try:
+            return cls(*map(float, text.split(",")))
+        except (TypeError, ValueError):
+            return None
+
+    @property
+    def is_blurry(self):
+        return self.sharpness < SHARPNESS_THRESHOLD
+
+    @property
+    def exposure(self):
+        if self.brightness < 50 or self.dark > 0.5:
+            return "dark"
+        if self.brightness > 205 or self.bright > 0.5:
+            return "bright"
+        return None
+
+
+def image_quality_scores(grays):
+    # Grayscale images of the same shape are stacked and scored in one pass
+    scores = [None] * len(grays)
+    by_shape = {}
+    for i, gray in enumerate(grays):
+        if gray.shape[0] >= 3 and gray.shape[1] >= 3:
+            by_shape.setdefault(gray.shape, []).append((i, gray))
+    for items in by_shape.values():
+        stack = np.stack([gray for _, gray in items]).astype(np.float32)
+        laplacian = (stack[:, :-2, 1:-1] + stack[:, 2:, 1:-1] + stack[:, 1:-1, :-2] + stack[:, 1:-1, 2:]
+                     - 4 * stack[:, 1:-1, 1:-1])
+        sharpness = laplacian.var(axis=(1, 2))
+        brightness = stack.mean(axis=(1, 2))
+        dark = (stack < DARK_LEVEL).mean(axis=(1, 2))
+        bright = (stack >= BRIGHT_LEVEL).mean(axis=(1, 2))
+        for j, (i, _) in enumerate(items):
+            scores[i] = ImageQuality(float(sharpness[j]), float(brightness[j]), float(dark[j]), float(bright[j]))
+    return scores
+
+
+class ThumbnailLoader(QThread):
+    thumbnailsLoaded = pyqtSignal(list)
+    thumbnailsFailed = pyqtSignal(list)
+    idle = pyqtSignal()
     finished = pyqtSignal()
 
-    def __init__(self, file_paths):
+    def __init__(self, thumbnail_size=THUMBNAIL_SIZE, use_exif_thumbnails=True, max_workers=None, cache=None,
+                 batch_interval=0.1, score_quality=True):
         super().__init__()
-        self.file_paths = file_paths
+        # None decodes every image at full resolution
+        self.thumbnail_size = thumbnail_size
+        self.use_exif_thumbnails = use_exif_thumbnails
+        self.score_quality = score_quality
+        # 1 decodes one image per wave
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache = cache
+        # Loaded thumbnails are collected for batch_interval seconds unless the queue runs empty
+        self.batch_interval = batch_interval
+        self._isCanceled = False
+        self._condition = threading.Condition()
+        # unique_id -> (file_path, known ImageMeta, request sequence); requests
+        # without an explicit priority load in request order once the visible
+        # ones are done
+        self._pending = {}
+        self._ranks = {}
+        self._sequence = itertools.count()
+        self._inflight = set()
+        self._failed = set()
+
+    def cancel(self):
+        with self._condition:
+            self._isCanceled = True
+            self._condition.notify_all()
+
+    def request(self, items):
+        # Items are (unique_id, file_path, meta); the header is only read for
+        # images whose ImageMeta is not known yet
+        with self._condition:
+            for unique_id, file_path, meta in items:
+                if unique_id in self._pending or unique_id in self._inflight or unique_id in self._failed:
+                    continue
+                self._pending[unique_id] = (file_path, meta, next(self._sequence))
+            self._condition.notify_all()
+
+    def discard(self, unique_ids=None):
+        with self._condition:
+            if unique_ids is None:
+                self._pending.clear()
+                self._ranks.clear()
+            else:
+                for unique_id in unique_ids:
+                    self._pending.pop(unique_id, None)
+
+    def prioritize(self, unique_ids):
+        with self._condition:
+            self._ranks = {unique_id: rank for rank, unique_id in enumerate(unique_ids)}
+
+    def pendingCount(self):
+        with self._condition:
+            return len(self._pending)
+
+    def loadImage(self, file_path):
+        # Returns (qimg, luma, quality): a cache hit brings its stored
+        # quality, a decode the luma it is to be scored on
+        luma_size = QUALITY_SIZE if self.score_quality else None
+        if self.thumbnail_size:
+            if self.cache is not None:
+                qimg = self.cache.get(file_path, self.thumbnail_size)
+                if qimg is not None:
+                    return qimg, None, ImageQuality.from_text(qimg.text("quality"))
+            loaded = None
+            if self.use_exif_thumbnails:
+                try:
+                    loaded = load_exif_thumbnail(file_path, self.thumbnail_size, luma_size)
+                except Exception as err:
+                    print(f"Fehler beim Lesen des EXIF-Vorschaubilds {file_path}: {err}")
+            if loaded is None:
+                loaded = load_thumbnail(file_path, self.thumbnail_size, luma_size)
+            img, luma = loaded if luma_size else (loaded, None)
+            qimg = pil_to_qimage(img)
+            if self.cache is not None and luma is None:
+                # Scored thumbnails are stored by run once their score is known
+                self.cache.put(file_path, self.thumbnail_size, qimg)
+            return qimg, luma, None
+        with open_image_source(file_path) as source, Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            return pil_to_qimage(img), luma_array(img, luma_size) if luma_size else None, None
+
+    def tryLoadImage(self, file_path):
+        if self._isCanceled:
+            return None
+        try:
+            return self.loadImage(file_path)
+        except Exception as err:
+            print(f"Fehler beim Importieren {file_path}: {err}")
+            return None
+
+    def loadThumbnail(self, file_path, meta=None):
+        loaded = self.tryLoadImage(file_path)
+        if loaded is None:
+            return None, None, None, None, None
+        qimg, luma, quality = loaded
+        return qimg, perceptual_hash(qimg), meta or try_read_image_meta(file_path), luma, quality
+
+    def takeNext(self, count):
+        background = len(self._ranks)
+        jobs = heapq.nsmallest(count, self._pending.items(),
+                               key=lambda item: (self._ranks.get(item[0], background), item[1][2]))
+        for unique_id, _ in jobs:
+            del self._pending[unique_id]
+            self._inflight.add(unique_id)
+        return [(unique_id, file_path, meta) for unique_id, (file_path, meta, _) in jobs]
+
+    def run(self):
+        batch = []
+        failed = []
+        batch_started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                with self._condition:
+                    while not self._pending and not self._isCanceled:
+                        self._condition.wait()
+                    if self._isCanceled:
+                        break
+                    # One wave per worker, so priority changes apply to the next wave
+                    jobs = self.takeNext(self.max_workers)
+                futures = [(unique_id, file_path, pool.submit(self.loadThumbnail, file_path, meta))
+                           for unique_id, file_path, meta in jobs]
+                results = [(unique_id, file_path, future.result()) for unique_id, file_path, future in futures]
+                lumas = [luma for _, _, (_, _, _, luma, _) in results if luma is not None]
+                scores = iter(image_quality_scores(lumas))
+                with self._condition:
+                    for unique_id, file_path, (qimg, phash, meta, luma, quality) in results:
+                        self._inflight.discard(unique_id)
+                        if qimg is None:
+                            self._failed.add(unique_id)
+                            failed.append((unique_id, file_path))
+                            continue
+                        if luma is not None:
+                            quality = next(scores)
+                            if self.cache is not None and self.thumbnail_size:
+                                pool.submit(self.cache.put, file_path, self.thumbnail_size, qimg, quality)
+                        batch.append((unique_id, qimg, phash, meta, quality))
+                    drained = not self._pending
+                # The batch is flushed whenever the queue runs empty, before going to sleep
+                if batch and (drained or time.monotonic() - batch_started >= self.batch_interval):
+                    self.thumbnailsLoaded.emit(batch)
+                    batch = []
+                    batch_started = time.monotonic()
+                if failed:
+                    self.thumbnailsFailed.emit(failed)
+                    failed = []
+                if drained:
+                    self.idle.emit()
+        # Leaving the pool waits for the cache writes still queued; every
+        # thumbnail load was already waited for in its wave
+        self.finished.emit()
+
+
+class FolderScanWorker(QThread):
+    filesFound = pyqtSignal(list)
+    finished = pyqtSignal()
+
+    def __init__(self, paths, batch_size=64, batch_interval=0.1):
+        super().__init__()
+        self.paths = paths
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
         self._isCanceled = False
 
     def cancel(self):
         self._isCanceled = True
 
+    def walk(self, folder):
+        # Depth-first with sorted entries: files of a folder, then its sub-folders
+        stack = [folder]
+        while stack and not self._isCanceled:
+            current = stack.pop()
+            files = []
+            folders = []
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        # Skip hidden files and the "._" resource forks macOS leaves on shares
+                        if entry.name.startswith("."):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            folders.append(entry.path)
+                        elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                            files.append(entry.path)
+            except OSError as e:
+                print(f"Fehler beim Lesen des Ordners {current}: {e}")
+                continue
+            yield from sorted(files)
+            stack.extend(sorted(folders, reverse=True))
+
     def run(self):
-        count = 0
-        for file_path in self.file_paths:
-            if self._isCanceled:
+        batch = []
+        batch_started = time.monotonic()
+        for path in self.paths:
+            if os.path.isdir(path):
+                found = self.walk(path)
+            elif path.lower().endswith(ARCHIVE_EXTENSIONS):
+                try:
+                    found = list_archive_images(path)
+                except (OSError, zipfile.BadZipFile) as e:
+                    print(f"Fehler beim Lesen des Archivs {path}: {e}")
+                    continue
+            else:
+                found = [path]
+            for file_path in found:
+                if self._isCanceled:
+                    break
+                batch.append(file_path)
+                # Stream what is found so thumbnails start before the walk ends
+                if len(batch) >= self.batch_size or time.monotonic() - batch_started >= self.batch_interval:
+                    self.filesFound.emit(batch)
+                    batch = []
+                    batch_started = time.monotonic()
+        if batch and not self._isCanceled:
+            self.filesFound.emit(batch)
+        self.finished.emit()
+
+
+def read_image_source(file_path):
+    archive_path, member = (None, None) if os.path.exists(file_path) else split_archive_path(file_path)
+    if archive_path is not None:
+        return open_archive(archive_path).read(member)
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+class PreparedImage:
+    # An encoded PDF image handed from the preparation pool straight to the
+    # page layout, in the form fpdf keeps parsed images in
+    __slots__ = ("width", "height", "colorspace", "filter", "data", "passthrough", "dct_transformed", "export",
+                 "probes")
+
+    def __init__(self, width, height, colorspace, filter, data, passthrough=False, dct_transformed=False):
+        self.width = width
+        self.height = height
+        self.colorspace = colorspace
+        self.filter = filter
+        self.data = data
+        # True when data is the source JPEG's scan data, not re-encoded; only
+        # its metadata segments are stripped, see strip_jpeg_metadata
+        self.passthrough = passthrough
+        # True when data was rotated or cropped from the source JPEG without re-encoding
+        self.dct_transformed = dct_transformed
+        # (method, bytes) of the exported original, see export_original
+        self.export = None
+        # JPEG sizes for the size budget's rate model, see jpeg_rate_probes
+        self.probes = None
+
+    def pdfInfo(self):
+        info = {"w": self.width, "h": self.height, "cs": self.colorspace, "bpc": 8,
+                "f": self.filter, "data": self.data}
+        if self.filter == "FlateDecode":
+            # Rows carry their PNG filter type, as fpdf writes parsed PNGs
+            colors = 3 if self.colorspace == "DeviceRGB" else 1
+            info["dp"] = f"/Predictor 15 /Colors {colors} /BitsPerComponent 8 /Columns {self.width}"
+        return info
+
+    def open(self):
+        if self.filter == "DCTDecode":
+            return Image.open(BytesIO(self.data))
+        # The data is the IDAT stream of a PNG; wrapped in a header it decodes as one
+        color_type = 2 if self.colorspace == "DeviceRGB" else 0
+        header = struct.pack(">IIBBBBB", self.width, self.height, 8, color_type, 0, 0, 0)
+        return Image.open(BytesIO(PNG_SIGNATURE + png_chunk(b"IHDR", header) + png_chunk(b"IDAT", self.data)
+                                  + png_chunk(b"IEND", b"")))
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def encode_png_rows(img):
+    # Pillow's PNG encoder picks a filter per row before deflating; the IDAT
+    # chunks together are the stream a PDF decodes with /Predictor 15
+    buffer = BytesIO()
+    img.save(buffer, "PNG")
+    png = buffer.getvalue()
+    chunks = []
+    pos = len(PNG_SIGNATURE)
+    while pos < len(png):
+        length, kind = struct.unpack(">I4s", png[pos:pos + 8])
+        if kind == b"IDAT":
+            chunks.append(png[pos + 8:pos + 8 + length])
+        pos += 12 + length
+    return b"".join(chunks)
+
+
+def encode_pdf_image(img, lossless=False, quality=85, subsampling=-1):
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    colorspace = "DeviceRGB" if img.mode == "RGB" else "DeviceGray"
+    if lossless:
+        return PreparedImage(img.width, img.height, colorspace, "FlateDecode", encode_png_rows(img))
+    return PreparedImage(img.width, img.height, colorspace, "DCTDecode", encode_jpeg(img, quality, subsampling))
+
+
+def encode_jpeg(img, quality=85, subsampling=-1):
+    # Optimized Huffman tables, no EXIF or ICC payload; subsampling 0 is
+    # 4:4:4, 2 is 4:2:0 and -1 the encoder's default
+    buffer = BytesIO()
+    img.save(buffer, "JPEG", quality=quality, subsampling=subsampling, optimize=True)
+    return buffer.getvalue()
+
+
+# APP14 (Adobe) stays: it tells decoders how the components are encoded
+JPEG_METADATA_MARKERS = set(range(0xE1, 0xEE)) | {0xEF, 0xFE}
+
+
+def foreign_rgb_profile(icc):
+    # The PDF places photos as DeviceRGB, which viewers show as sRGB. Returns
+    # the profile of an RGB photo that would look different there, such as
+    # Display P3 or Adobe RGB, else None; unreadable profiles are ignored, as
+    # nothing could be converted from them either
+    if not icc:
+        return None
+    try:
+        profile = ImageCms.ImageCmsProfile(BytesIO(icc))
+        if profile.profile.xcolor_space == "RGB " and "sRGB" not in ImageCms.getProfileDescription(profile):
+            return profile
+    except (OSError, ImageCms.PyCMSError):
+        pass
+    return None
+
+
+def to_srgb(img, icc):
+    profile = foreign_rgb_profile(icc) if img.mode == "RGB" else None
+    if profile is None:
+        return img
+    return ImageCms.profileToProfile(img, profile, ImageCms.createProfile("sRGB"))
+
+
+def strip_jpeg_metadata(data):
+    # Drops EXIF, XMP, ICC, maker notes and comments from a JPEG embedded in
+    # the PDF, which ignores them; the entropy-coded data is kept as it is.
+    # Photos with another RGB profile are converted instead, see
+    # foreign_rgb_profile, so a dropped ICC profile only restated sRGB
+    if data[:2] != b"\xff\xd8":
+        return data
+    parts = [data[:2]]
+    pos = 2
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        if marker == 0xDA:
+            break
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], "big")
+        if marker not in JPEG_METADATA_MARKERS:
+            parts.append(data[pos:end])
+        pos = end
+    parts.append(data[pos:])
+    return b"".join(parts)
+
+
+# Settings the size budget steps down through, best first: chroma is
+# subsampled before the quality drops below 90
+BUDGET_LADDER = [(95, 0), (90, 0), (90, 2)] + [(quality, 2) for quality in range(85, 15, -5)]
+# Share of the budget that is planned for, as headroom for the rate model
+BUDGET_MARGIN = 0.95
+
+
+# Qualities at which each photo is test-encoded with 4:2:0 for the rate model
+PROBE_QUALITIES = (85, 50, 25)
+
+
+def jpeg_quant_scale(quality):
+    # libjpeg's scaling of the standard quantization tables, in percent
+    return 5000 / quality if quality < 50 else 200 - 2 * quality
+
+
+def jpeg_rate_probes(img):
+    # Encoded sizes at PROBE_QUALITIES, then at 85 with 4:4:4
+    sizes = [len(encode_jpeg(img, quality, 2)) for quality in PROBE_QUALITIES]
+    return tuple(sizes) + (len(encode_jpeg(img, PROBE_QUALITIES[0], 0)),)
+
+
+def predicted_jpeg_size(probes, quality, subsampling):
+    # Between two probes the size follows a power law of the quantizer
+    # scale; outside them the nearest segment is extended
+    sizes, size_444 = probes[:-1], probes[-1]
+    segment = 0 if quality >= PROBE_QUALITIES[1] else 1
+    quality_1, quality_2 = PROBE_QUALITIES[segment:segment + 2]
+    size_1, size_2 = sizes[segment:segment + 2]
+    t = (math.log(jpeg_quant_scale(quality) / jpeg_quant_scale(quality_1))
+         / math.log(jpeg_quant_scale(quality_2) / jpeg_quant_scale(quality_1)))
+    size = size_1 * (size_2 / size_1) ** t
+    if subsampling == 0:
+        size *= size_444 / sizes[0]
+    return size
+
+
+def plan_size_budget(images, budget):
+    # images holds (current bytes, probes or None) per photo. Returns a
+    # BUDGET_LADDER setting per photo, or None to keep its current encoding,
+    # so that the predicted total stays under budget: the best step that
+    # fits for all photos, then single photos one step up while it still fits
+    def size(image, level):
+        current, probes = image
+        if level < 0 or probes is None:
+            return current
+        return min(current, predicted_jpeg_size(probes, *BUDGET_LADDER[level]))
+
+    def total(level):
+        return sum(size(image, level) for image in images)
+
+    low, high = -1, len(BUDGET_LADDER) - 1
+    while low < high:
+        middle = (low + high) // 2
+        if total(middle) <= budget:
+            high = middle
+        else:
+            low = middle + 1
+    levels = [low] * len(images)
+    if low >= 0:
+        spare = budget - total(low)
+        costs = [size(image, low - 1) - size(image, low) for image in images]
+        for i in sorted(range(len(images)), key=costs.__getitem__):
+            if costs[i] > spare:
                 break
+            levels[i] = low - 1
+            spare -= costs[i]
+    settings = []
+    for image, level in zip(images, levels):
+        if level < 0 or image[1] is None or size(image, level) >= image[0]:
+            settings.append(None)
+        else:
+            settings.append(BUDGET_LADDER[level])
+    return settings
+
+
+PDF_MAX_SIDE = 2000
+
+
+def crop_box_4_3(width, height):
+    # Nearly square landscape shots are cropped to 4:3 around the centre
+    aspect_ratio = width / height
+    if not (width >= height and 1.0 <= aspect_ratio <= 1.33):
+        return None
+    new_width = width
+    new_height = int(width * 3 / 4)
+    if new_height > height:
+        new_height = height
+        new_width = int(height * 4 / 3)
+    left = (width - new_width) / 2
+    top = (height - new_height) / 2
+    return left, top, left + new_width, top + new_height
+
+
+def exif_orientation(img):
+    orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+    return orientation if orientation in range(1, 9) else 1
+
+
+def crop_size(width, height):
+    crop_box = crop_box_4_3(width, height)
+    if crop_box is None:
+        return width, height
+    return int(crop_box[2]) - int(crop_box[0]), int(crop_box[3]) - int(crop_box[1])
+
+
+def pdf_pixel_size(width, height, target_size=None):
+    # Pixel size of the PDF copy of a width x height crop: the slot size at
+    # the profile's DPI, or the PDF_MAX_SIDE cap without one; never upsampled
+    if target_size is None:
+        scale = PDF_MAX_SIDE / max(width, height)
+        target_size = (int(width * scale), int(height * scale))
+    if target_size[0] >= width or target_size[1] >= height:
+        return width, height
+    return target_size
+
+
+def fits_pdf_size(width, height, target_size=None, tolerance=1.0):
+    # Whether a width x height crop can be placed without resampling: at most
+    # tolerance times its PDF pixel size in each dimension
+    target = pdf_pixel_size(width, height, target_size)
+    return width <= target[0] * tolerance and height <= target[1] * tolerance
+
+
+def can_pass_through(img, target_size=None, tolerance=1.0):
+    # The JPEG scan data can go into the PDF without re-encoding when no
+    # orientation, crop or colour conversion is needed and the photo is
+    # within the profile's tolerance of its slot. Camera photos are usually
+    # far larger than a slot at 150 or 300 dpi, so mostly pre-sized JPEGs and
+    # the archive profile qualify
+    if img.format != "JPEG" or img.mode not in ("RGB", "L"):
+        return False
+    if exif_orientation(img) != 1 or foreign_rgb_profile(img.info.get("icc_profile")) is not None:
+        return False
+    return crop_box_4_3(*img.size) is None and fits_pdf_size(*img.size, target_size, tolerance)
+
+
+def set_jpeg_orientation(data, orientation):
+    # Rewrites the orientation entry of the EXIF block in place; data without
+    # such an entry is returned as it is
+    if data[:2] != b"\xff\xd8":
+        return data
+    pos = 2
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        if marker in (0xD9, 0xDA):
+            break
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        segment = pos + 4
+        if marker == 0xE1 and data[segment:segment + 6] == b"Exif\0\0":
+            tiff = segment + 6
+            order = "little" if data[tiff:tiff + 2] == b"II" else "big"
+            ifd = tiff + int.from_bytes(data[tiff + 4:tiff + 8], order)
+            count = int.from_bytes(data[ifd:ifd + 2], order)
+            for i in range(count):
+                entry = ifd + 2 + 12 * i
+                if entry + 12 > segment + length - 2:
+                    break
+                if int.from_bytes(data[entry:entry + 2], order) == EXIF_ORIENTATION_TAG:
+                    patched = bytearray(data)
+                    patched[entry + 8:entry + 10] = orientation.to_bytes(2, order)
+                    return bytes(patched)
+            return data
+        pos = segment + length - 2
+    return data
+
+
+# jpegtran arguments that undo each EXIF orientation
+JPEGTRAN_TRANSFORMS = {
+    2: ["-flip", "horizontal"],
+    3: ["-rotate", "180"],
+    4: ["-flip", "vertical"],
+    5: ["-transpose"],
+    6: ["-rotate", "90"],
+    7: ["-transverse"],
+    8: ["-rotate", "270"],
+}
+
+
+# Homebrew's jpeg-turbo is keg-only, so its jpegtran is not on the PATH
+JPEGTRAN_LOCATIONS = ("/opt/homebrew/opt/jpeg-turbo/bin/jpegtran", "/usr/local/opt/jpeg-turbo/bin/jpegtran")
+
+
+def find_jpegtran():
+    # The packaged app brings its own copy (see build.sh); an app started
+    # from the Finder has no Homebrew on its PATH either way
+    if getattr(sys, "frozen", False):
+        bundled = os.path.join(sys._MEIPASS, "bin", "jpegtran")
+        if os.path.isfile(bundled):
+            return bundled
+    return shutil.which("jpegtran") or next((path for path in JPEGTRAN_LOCATIONS if os.path.isfile(path)), None)
+
+
+def snap_crop_box(crop_box, width, height, mcu_size):
+    # jpegtran moves a crop origin back onto the MCU grid and keeps the far
+    # edges, which shifts a centred crop towards the top left. Instead the
+    # box keeps its size and moves to the grid position nearest its own
+    left, top, right, bottom = (int(v) for v in crop_box)
+    box_width, box_height = right - left, bottom - top
+    mcu_width, mcu_height = mcu_size
+    left = min(round(left / mcu_width) * mcu_width, (width - box_width) // mcu_width * mcu_width)
+    top = min(round(top / mcu_height) * mcu_height, (height - box_height) // mcu_height * mcu_height)
+    return left, top, left + box_width, top + box_height
+
+
+def jpeg_mcu_size(img):
+    # 8 pixels per sampling factor: 8x8 for 4:4:4 and grayscale, 16x16 for 4:2:0
+    return 8 * max(layer[1] for layer in img.layer), 8 * max(layer[2] for layer in img.layer)
+
+
+def lossless_jpeg_transform(data, orientation=1, crop_box=None):
+    # Rotates, flips and crops in the DCT domain, so the coefficients are
+    # carried over instead of decoded and quantized again. The crop box is
+    # moved onto the MCU grid, see snap_crop_box. Returns None when jpegtran
+    # is not installed or the transform would not be exact; callers then
+    # decode and re-encode
+    jpegtran = find_jpegtran()
+    if jpegtran is None:
+        return None
+    args = [jpegtran, "-copy", "all", "-perfect"] + JPEGTRAN_TRANSFORMS.get(orientation, [])
+    if crop_box is not None:
+        with Image.open(BytesIO(data)) as img:
+            (width, height), mcu_size = img.size, jpeg_mcu_size(img)
+        if orientation in (5, 6, 7, 8):
+            # The crop applies to the transposed image
+            width, height, mcu_size = height, width, mcu_size[::-1]
+        left, top, right, bottom = snap_crop_box(crop_box, width, height, mcu_size)
+        args += ["-crop", f"{right - left}x{bottom - top}+{left}+{top}"]
+    try:
+        result = subprocess.run(args, input=data, capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    if not result.stdout:
+        return None
+    # The pixels are upright now, the copied EXIF block must say so
+    return set_jpeg_orientation(result.stdout, 1)
+
+
+def can_transform_losslessly(img):
+    return img.format == "JPEG" and img.mode in ("RGB", "L") and find_jpegtran() is not None
+
+
+def prepare_jpeg_losslessly(img, data, final_path, export=True, target_size=None, tolerance=1.0):
+    # DCT-domain path for JPEG sources: the upright original is exported
+    # without re-encoding (unless export is False because the original was
+    # already copied), and so is the PDF copy when it needs no downscale.
+    # Returns (export, prepared); export is None when nothing was written,
+    # prepared is None when the PDF copy still has to be resampled
+    orientation = exif_orientation(img)
+    upright = data
+    written = None
+    if orientation != 1:
+        upright = lossless_jpeg_transform(data, orientation)
+        if upright is None:
+            return None, None
+        if export:
+            with open(final_path, "wb") as f:
+                f.write(upright)
+            written = ("lossless", len(upright))
+    width, height = img.size
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+    crop_box = crop_box_4_3(width, height)
+    if not fits_pdf_size(*crop_size(width, height), target_size, tolerance):
+        return written, None
+    if foreign_rgb_profile(img.info.get("icc_profile")) is not None:
+        # The PDF copy is converted to sRGB; only the export stays lossless
+        return written, None
+    pdf_data = upright if crop_box is None else lossless_jpeg_transform(upright, 1, crop_box)
+    if pdf_data is None:
+        return written, None
+    with Image.open(BytesIO(pdf_data)) as pdf_img:
+        colorspace = "DeviceRGB" if pdf_img.mode == "RGB" else "DeviceGray"
+        prepared = PreparedImage(pdf_img.width, pdf_img.height, colorspace, "DCTDecode",
+                                 strip_jpeg_metadata(pdf_data), dct_transformed=True)
+    return written, prepared
+
+
+# Linux ioctl for a copy-on-write clone of a whole file (Btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+
+def reflink_file(source_path, final_path):
+    if sys.platform.startswith("linux"):
+        import fcntl
+        with open(source_path, "rb") as src, open(final_path, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    elif sys.platform == "darwin":
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(source_path), os.fsencode(final_path), 0) != 0:
+            raise OSError(ctypes.get_errno(), "clonefile fehlgeschlagen", final_path)
+    else:
+        raise OSError("Reflinks werden nicht unterstützt")
+
+
+def remove_file(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def export_original(file_path, data, final_path, orientation_tag=None, hardlink=False):
+    # Puts the source under its final name without touching the pixels: a
+    # copy-on-write clone where the filesystem allows it, a hard link only
+    # when asked for, since edits to either file would show in both,
+    # otherwise the bytes already read. An out-of-range orientation tag of a
+    # JPEG is rewritten to upright, which needs a real copy. Returns
+    # (method, bytes)
+    if orientation_tag is not None and orientation_tag not in range(1, 9):
+        data = set_jpeg_orientation(data, 1)
+    elif os.path.exists(file_path):
+        if os.path.exists(final_path) and os.path.samefile(file_path, final_path):
+            if os.path.realpath(file_path) == os.path.realpath(final_path):
+                # Exported onto itself; replacing it would delete the source
+                return "copy", len(data)
+            if hardlink:
+                return "hardlink", len(data)
+        links = [("reflink", reflink_file)] + ([("hardlink", os.link)] if hardlink else [])
+        for method, link in links:
+            # Never write through an existing file, it may be linked to a source
+            remove_file(final_path)
             try:
-                with Image.open(file_path) as img:
-                    img = ImageOps.exif_transpose(img)
-                    if img.mode in ("RGBA", "LA"):
-                        img = img.convert("RGB")
-                    buf = BytesIO()
-                    img.save(buf, format='JPEG')
-                    qimg = QImage.fromData(buf.getvalue())
-                self.imageImported.emit(file_path, qimg)
-            except Exception as err:
-                print(f"Fehler beim Importieren {file_path}: {err}")
-            count += 1
-            self.progress.emit(count)
-        self.finished.emit()
+                link(file_path, final_path)
+                return method, len(data)
+            except OSError:
+                continue
+    remove_file(final_path)
+    with open(final_path, "wb") as f:
+        f.write(data)
+    return "copy", len(data)
+
+
+# How the originals are exported: "copy" keeps the source file and its
+# orientation tag, "upright" stores rotated photos with upright pixels and
+# "link" is "copy" with hard links to the sources where possible
+EXPORT_MODES = ("copy", "upright", "link")
+
+
+EXPORT_METHOD_LABELS = {
+    "reflink": "als Reflink",
+    "hardlink": "als Hardlink",
+    "copy": "kopiert",
+    "lossless": "verlustfrei gedreht",
+    "reencode": "neu kodiert",
+}
+
+
+# Resolution profiles: DPI at which each image is resampled to the size of
+# its slot on the page; None keeps the original pixels
+PDF_PROFILES = {"screen": 150, "print": 300, "archive": None}
+# How much larger than its slot a JPEG may be, per side, and still go into the
+# PDF without re-encoding; a second generation costs more print quality than
+# the extra pixels cost in size
+PASSTHROUGH_TOLERANCE = {"screen": 1.0, "print": 1.5, "archive": 1.0}
+
+
+def prepare_pdf_image(file_path, final_path, data=None, export_mode="copy", target_size=None, encoding=None,
+                      tolerance=1.0, probe=False):
+    # Exports the original under its final name (skipped without a final
+    # path) and returns the PDF version, sized to target_size pixels when the
+    # page layout gives one and JPEG-encoded with encoding, a (quality,
+    # subsampling) pair, when the size budget sets one. JPEGs within
+    # tolerance of target_size keep their scan data
+    if data is None:
+        data = read_image_source(file_path)
+    with Image.open(BytesIO(data)) as img:
+        orientation = exif_orientation(img)
+        icc = img.info.get("icc_profile")
+        export = None
+        # Photos already stored upright are exported as they are in both modes
+        if final_path is not None and (orientation == 1 or export_mode != "upright"):
+            orientation_tag = img.getexif().get(EXIF_ORIENTATION_TAG) if img.format == "JPEG" else None
+            export = export_original(file_path, data, final_path, orientation_tag, export_mode == "link")
+
+        if encoding is None and can_pass_through(img, target_size, tolerance):
+            colorspace = "DeviceRGB" if img.mode == "RGB" else "DeviceGray"
+            prepared = PreparedImage(img.width, img.height, colorspace, "DCTDecode", strip_jpeg_metadata(data),
+                                     passthrough=True)
+            prepared.export = export
+            return prepared
+
+        if encoding is None and can_transform_losslessly(img):
+            written, prepared = prepare_jpeg_losslessly(img, data, final_path, export is None and final_path is not None,
+                                                        target_size, tolerance)
+            export = export or written
+            if prepared is not None:
+                prepared.export = export
+                return prepared
+
+        # PNG and other lossless sources stay lossless in the PDF unless
+        # the size budget asks for a JPEG encoding
+        lossless = img.format != "JPEG" and encoding is None
+        width, height = img.size
+        if orientation in (5, 6, 7, 8):
+            width, height = height, width
+        crop_box = crop_box_4_3(width, height) or (0, 0, width, height)
+        crop_width, crop_height = crop_size(width, height)
+        target = pdf_pixel_size(crop_width, crop_height, target_size)
+        scale = max(target[0] / crop_width, target[1] / crop_height)
+
+        if export is None and final_path is not None:
+            # The upright export needs the full resolution anyway
+            upright = img.transpose(EXIF_TRANSPOSE_METHODS[orientation])
+            if upright.mode in ("RGBA", "LA"):
+                upright = upright.convert("RGB")
+            remove_file(final_path)
+            upright.save(final_path, quality=85)
+            export = ("reencode", os.path.getsize(final_path))
+        else:
+            if scale < 1.0:
+                # Let the JPEG decoder scale down by 1/2, 1/4 or 1/8 as far
+                # as the crop still covers the target size; no-op for other formats
+                img.draft(img.mode, (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+            upright = img if orientation == 1 else img.transpose(EXIF_TRANSPOSE_METHODS[orientation])
+
+        if upright.mode not in ("RGB", "L"):
+            upright = upright.convert("RGB")
+        # The crop box in the coordinates of the possibly reduced decode
+        factor = upright.width / width
+        box = tuple(v * factor for v in crop_box)
+        if scale < 1.0:
+            img = upright.resize(target, Image.LANCZOS, box=box, reducing_gap=3.0)
+        elif box != (0, 0, upright.width, upright.height):
+            img = upright.crop(box)
+        else:
+            img = upright
+
+        img = to_srgb(img, icc)
+        prepared = encode_pdf_image(img, lossless, *(encoding or ()))
+        if probe:
+            # Rate model for the size budget, on the pixels before they are encoded
+            prepared.probes = jpeg_rate_probes(img)
+        prepared.export = export
+        return prepared
+
+
+def prepare_image(file_path, final_path, data=None, export_mode="copy", target_size=None, encoding=None,
+                  tolerance=1.0, probe=False):
+    # Runs in a worker process on the bytes read ahead by the parent
+    try:
+        prepared = prepare_pdf_image(file_path, final_path, data, export_mode, target_size, encoding, tolerance,
+                                     probe)
+        if probe and prepared.probes is None:
+            # Taken over without a decode; the rate model needs the pixels
+            with prepared.open() as img:
+                prepared.probes = jpeg_rate_probes(img)
+        return prepared
+    except Exception as e:
+        print("Fehler bei processImage:", e)
+        return None
 
 
 class PDFCreationWorker(QThread):
     progressUpdate = pyqtSignal(int)
+    # The size budget's second pass adds steps beyond one per photo
+    progressMaximum = pyqtSignal(int)
     finished = pyqtSignal(str)
     errorOccurred = pyqtSignal(str)
 
     def __init__(self, image_paths, aktennummer, dokumentenkürzel, dokumentenzahl,
-                 pdf_path, briefkopf_path, output_folder, start_photo_number=1):
+                 pdf_path, briefkopf_path, output_folder, start_photo_number=1, image_meta=None,
+                 max_workers=None, read_ahead=4, prepare_ahead=None, export_mode="copy", profile="print",
+                 max_pdf_size=None):
         super().__init__()
         self.image_paths = image_paths
+        # ImageMeta per path as far as known from the import; gaps are read here
+        self.image_meta = list(image_meta) if image_meta is not None else [None] * len(image_paths)
         self.aktennummer = aktennummer
         self.dokumentenkürzel = dokumentenkürzel
         self.dokumentenzahl = dokumentenzahl
@@ -66,78 +1376,271 @@ class PDFCreationWorker(QThread):
         self.briefkopf_path = briefkopf_path
         self.output_folder = output_folder
         self.start_photo_number = start_photo_number
+        self.max_workers = max_workers or min(os.cpu_count() or 1, 8)
+        # Queue depths between the pipeline stages bound how many source
+        # files and prepared images are held in memory at once
+        self.read_ahead = read_ahead
+        self.prepare_ahead = prepare_ahead or self.max_workers * 2
+        self.stage_stalls = {"read": 0.0, "prepare": 0.0, "layout": 0.0}
+        # Finished steps over both passes, for progressUpdate
+        self.progress = 0
+        self.passthrough_count = 0
+        self.dct_transform_count = 0
+        self.export_mode = export_mode
+        self.profile = profile
+        # Size budget in bytes; the second pass re-encodes photos to fit it
+        self.max_pdf_size = max_pdf_size
+        # Bytes by which the written PDF still exceeds max_pdf_size
+        self.budget_overshoot = 0
+        # PDF image name -> PreparedImage as placed, kept for the second pass
+        self.placed = {}
+        # Export method -> [images, bytes], to compare copied and re-encoded originals
+        self.export_report = {}
+        # Summary lines for the message box; the packaged app has no console
+        self.report = []
         self._isCanceled = False
 
     def cancel(self):
         self._isCanceled = True
 
     def is_horizontal(self, file_path):
-        try:
-            with Image.open(file_path) as img:
-                img = ImageOps.exif_transpose(img)
-                width, height = img.size
-            return width >= height
-        except Exception as e:
-            print("Error in is_horizontal:", e)
-            return False
+        meta = try_read_image_meta(file_path)
+        return meta is not None and meta.is_horizontal
+
+    def imageMeta(self, index):
+        if self.image_meta[index] is None:
+            self.image_meta[index] = try_read_image_meta(self.image_paths[index])
+        return self.image_meta[index]
+
+    def groupImages(self):
+        horizontal = []
+        for i in range(len(self.image_paths)):
+            meta = self.imageMeta(i)
+            horizontal.append(meta is not None and meta.is_horizontal)
+        grouped = []
+        i = 0
+        n = len(self.image_paths)
+        while i < n:
+            if not horizontal[i]:
+                grouped.append([self.image_paths[i]])
+                i += 1
+            else:
+                if i + 1 < n and horizontal[i + 1]:
+                    grouped.append([self.image_paths[i], self.image_paths[i + 1]])
+                    i += 2
+                else:
+                    grouped.append([self.image_paths[i]])
+                    i += 1
+        return grouped
+
+    def imageFilename(self, image_counter, file_extension):
+        if self.dokumentenkürzel.startswith("("):
+            return f"{self.aktennummer}-{self.dokumentenzahl} Foto Nr. {image_counter}{file_extension}"
+        return f"{self.aktennummer}-{self.dokumentenkürzel}-{self.dokumentenzahl} Foto Nr. {image_counter}{file_extension}"
+
+    def prepareJob(self, file_path, image_counter, target_size=None):
+        file_extension = os.path.splitext(file_path)[1]
+        final_path = os.path.join(self.output_folder, self.imageFilename(image_counter, file_extension))
+        return file_path, final_path, target_size, None
 
     def processImage(self, file_path, image_counter):
+        file_path, final_path, target_size, _ = self.prepareJob(file_path, image_counter)
+        return prepare_image(file_path, final_path, export_mode=self.export_mode, target_size=target_size)
+
+    def fitSlot(self, width, height, slot_width, max_height):
+        new_width = slot_width
+        new_height = height * (new_width / width)
+        if new_height > max_height:
+            new_height = max_height
+            new_width = width * (new_height / height)
+        return new_width, new_height
+
+    def targetSize(self, index, slot_width, max_height):
+        # Pixel size of an image's slot at the profile's DPI, worked out from
+        # the import metadata before anything is decoded
+        meta = self.imageMeta(index)
+        if meta is None:
+            raise ValueError(f"Bild konnte nicht verarbeitet werden: {os.path.basename(self.image_paths[index])}")
+        width, height = crop_size(*meta.display_size)
+        dpi = PDF_PROFILES[self.profile]
+        if dpi is None:
+            return width, height
+        new_width, new_height = self.fitSlot(width, height, slot_width, max_height)
+        return max(1, round(new_width / 25.4 * dpi)), max(1, round(new_height / 25.4 * dpi))
+
+    def checkPrepared(self, processed, file_path):
+        if processed is None:
+            raise ValueError(f"Bild konnte nicht verarbeitet werden: {os.path.basename(file_path)}")
+        if processed.passthrough:
+            self.passthrough_count += 1
+        elif processed.dct_transformed:
+            self.dct_transform_count += 1
+        if processed.export is not None:
+            method, size = processed.export
+            entry = self.export_report.setdefault(method, [0, 0])
+            entry[0] += 1
+            entry[1] += size
+        return processed
+
+    def exportSummary(self):
+        parts = []
+        for method, label in EXPORT_METHOD_LABELS.items():
+            if method in self.export_report:
+                count, size = self.export_report[method]
+                parts.append(f"{count} {label} ({size / 1e6:.1f} MB)")
+        return ", ".join(parts) or "keine Bilder"
+
+    def stallSummary(self):
+        return (f"Lesen {self.stage_stalls['read']:.2f} s, Aufbereiten {self.stage_stalls['prepare']:.2f} s, "
+                f"Seitenaufbau {self.stage_stalls['layout']:.2f} s")
+
+    def placeImage(self, pdf, processed, image_counter, x, y, w, h):
+        # Registered like an image fpdf parsed itself, so it is embedded as is;
+        # the dict layout is fpdf 1.7.2's, which requirements.txt pins
+        name = f"foto_{image_counter}"
+        if name not in pdf.images:
+            pdf.images[name] = dict(processed.pdfInfo(), i=len(pdf.images) + 1)
+            self.placed[name] = processed
+        pdf.image(name, x=x, y=y, w=w, h=h)
+
+    def pdfOverhead(self, pdf, names):
+        # Size of the document without the photo data, from a throwaway copy
+        # taken while the photos are blanked out
+        data = {name: pdf.images[name]["data"] for name in names}
         try:
-            with Image.open(file_path) as img:
-                # Apply EXIF orientation to the original image first
-                img_raw = ImageOps.exif_transpose(img.copy())
-                
-                # Create a copy for PDF processing
-                img = img_raw.copy()
-                if img.mode in ("RGBA", "LA"):
-                    img = img.convert("RGB")
-                    img_raw = img_raw.convert("RGB")  # Also convert img_raw if needed
-
-                width, height = img.size
-                aspect_ratio = width / height
-
-                if width >= height and 1.0 <= aspect_ratio <= 1.33:
-                    new_width = width
-                    new_height = int(width * 3 / 4)
-                    if new_height > height:
-                        new_height = height
-                        new_width = int(height * 4 / 3)
-                    left = (width - new_width) / 2
-                    top = (height - new_height) / 2
-                    right = left + new_width
-                    bottom = top + new_height
-                    img = img.crop((left, top, right, bottom))
-
-                max_side = max(img.width, img.height)
-                if max_side > 2000:
-                    scale_factor = 2000 / max_side
-                    new_width = int(img.width * scale_factor)
-                    new_height = int(img.height * scale_factor)
-                    img = img.resize((new_width, new_height), Image.LANCZOS)
-
-                file_extension = os.path.splitext(file_path)[1]
-
-                if self.dokumentenkürzel.startswith("("):
-                    image_filename = f"{self.aktennummer}-{self.dokumentenzahl} Foto Nr. {image_counter}{file_extension}"
-                else:
-                    image_filename = f"{self.aktennummer}-{self.dokumentenkürzel}-{self.dokumentenzahl} Foto Nr. {image_counter}{file_extension}"
-                
-                # Save the properly oriented image to the output folder
-                final_path = os.path.join(self.output_folder, image_filename)
-                img_raw.save(final_path, quality=85)
-                
-                # Create a temporary file for the processed image to use in the PDF
-                temp_dir = os.path.join(self.output_folder, "temp")
-                os.makedirs(temp_dir, exist_ok=True)
-                temp_path = os.path.join(temp_dir, f"temp_{image_counter}{file_extension}")
-                img.save(temp_path, quality=85)
-                
-                return temp_path
-        except Exception as e:
-            print("Fehler bei processImage:", e)
-            return file_path
+            for name in names:
+                pdf.images[name]["data"] = b""
+            probe = copy.deepcopy(pdf)
+        finally:
+            for name in names:
+                pdf.images[name]["data"] = data[name]
+        return len(probe.output(dest="S"))
+
+    def stepDone(self):
+        self.progress += 1
+        self.progressUpdate.emit(self.progress)
+
+    def fitSizeBudget(self, pdf, jobs):
+        # Second pass of the size budget mode: photos whose current encoding
+        # would overshoot are prepared once more with the planned JPEG settings
+        names = [f"foto_{self.start_photo_number + i}" for i in range(len(jobs))]
+        overhead = self.pdfOverhead(pdf, names)
+        sizes = [len(pdf.images[name]["data"]) for name in names]
+        if overhead + sum(sizes) <= self.max_pdf_size:
+            self.report.append(f"Größenbudget: {(overhead + sum(sizes)) / 1e6:.1f} MB passen ohne zweiten Durchgang")
+            return
+        plan = plan_size_budget([(size, self.placed[name].probes) for size, name in zip(sizes, names)],
+                                self.max_pdf_size * BUDGET_MARGIN - overhead)
+        redo = [i for i, setting in enumerate(plan) if setting is not None]
+        self.progressMaximum.emit(self.progress + len(redo))
+        # Encoded once more from the source, so no photo is a second JPEG
+        # generation of its first-pass copy; the originals were exported already
+        prepared = self.preparedImages([(jobs[i][0], None, jobs[i][2], plan[i]) for i in redo])
+        try:
+            for i in redo:
+                if self._isCanceled:
+                    return
+                processed = self.checkPrepared(next(prepared), jobs[i][0])
+                # The first pass counted this photo as taken over or transformed
+                placed = self.placed[names[i]]
+                if placed.passthrough:
+                    self.passthrough_count -= 1
+                elif placed.dct_transformed:
+                    self.dct_transform_count -= 1
+                self.placed[names[i]] = processed
+                # Replaced, not updated: a Flate image's DecodeParms must not stay
+                pdf.images[names[i]] = dict(processed.pdfInfo(), i=pdf.images[names[i]]["i"])
+        finally:
+            prepared.close()
+        if not redo:
+            return
+        qualities = sorted({plan[i][0] for i in redo})
+        self.report.append(f"Größenbudget: {len(redo)} von {len(jobs)} Bildern neu kodiert "
+                           f"(Qualität {qualities[0]}–{qualities[-1]})")
+
+    def readSources(self, jobs, read_queue, stop):
+        # Read-ahead stage: source bytes are loaded while earlier images are
+        # still being prepared; time blocked on a full queue counts as its stall
+        try:
+            for job in jobs + [None]:
+                data = None
+                if job is not None:
+                    try:
+                        data = read_image_source(job[0])
+                    except Exception as e:
+                        print(f"Fehler beim Lesen {job[0]}: {e}")
+                started = time.monotonic()
+                while not stop.is_set():
+                    try:
+                        read_queue.put(None if job is None else (job, data), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                self.stage_stalls["read"] += time.monotonic() - started
+                if stop.is_set():
+                    return
+        finally:
+            # The reader thread ends here; its archives are not needed any more
+            close_archives()
+
+    def createPool(self, count):
+        if self.max_workers > 1 and count > 1:
+            # Spawned, not forked: the parent runs Qt threads
+            return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return ThreadPoolExecutor(max_workers=1)
+
+    def preparedImages(self, jobs):
+        # Yields the prepared images in job order while the reader and the pool
+        # work ahead; progress counts every finished image, in whatever order
+        stop = threading.Event()
+        read_queue = queue.Queue(maxsize=self.read_ahead)
+        reader = threading.Thread(target=self.readSources, args=(jobs, read_queue, stop), daemon=True)
+        pool = self.createPool(len(jobs))
+        reader.start()
+        try:
+            window = deque()
+            unreported = set()
+            reading = True
+            while True:
+                # Only block on the reader when the pool has nothing to do
+                while reading and len(window) < self.prepare_ahead:
+                    started = time.monotonic()
+                    try:
+                        item = read_queue.get(block=not window)
+                    except queue.Empty:
+                        break
+                    self.stage_stalls["prepare"] += time.monotonic() - started
+                    if item is None:
+                        reading = False
+                        break
+                    (file_path, final_path, target_size, encoding), data = item
+                    # The size budget plans from rate probes taken in the first pass
+                    probe = self.max_pdf_size is not None and encoding is None
+                    future = pool.submit(prepare_image, file_path, final_path, data, self.export_mode, target_size,
+                                         encoding, PASSTHROUGH_TOLERANCE[self.profile], probe)
+                    window.append(future)
+                    unreported.add(future)
+                if not window:
+                    break
+                done = {future for future in unreported if future.done()}
+                for _ in done:
+                    self.stepDone()
+                unreported -= done
+                if not window[0].done():
+                    # The page layout waits for its next image; the timeout
+                    # lets new reads reach the pool meanwhile
+                    started = time.monotonic()
+                    wait(unreported, timeout=0.05, return_when=FIRST_COMPLETED)
+                    self.stage_stalls["layout"] += time.monotonic() - started
+                    continue
+                yield window.popleft().result()
+        finally:
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            reader.join()
 
     def run(self):
+        started = time.monotonic()
         try:
             # Check if there are no images to process
             if not self.image_paths or self._isCanceled:
@@ -166,23 +1669,16 @@ class PDFCreationWorker(QThread):
 
             uniform_img_dim = (content_height - spacing_between - (2 * (offset + text_line_height))) / 1.5
 
-            grouped = []
-            i = 0
-            n = len(self.image_paths)
-            while i < n:
-                if not self.is_horizontal(self.image_paths[i]):
-                    grouped.append([self.image_paths[i]])
-                    i += 1
-                else:
-                    if i + 1 < n and self.is_horizontal(self.image_paths[i + 1]):
-                        grouped.append([self.image_paths[i], self.image_paths[i + 1]])
-                        i += 2
-                    else:
-                        grouped.append([self.image_paths[i]])
-                        i += 1
-
+            grouped = self.groupImages()
+            jobs = []
+            for group in grouped:
+                # Single images may be taller than pairs, whose height is shared
+                max_height = content_height - 15 if len(group) == 1 else (content_height - spacing_between) / 2
+                for file_path in group:
+                    target_size = self.targetSize(len(jobs), uniform_img_dim, max_height)
+                    jobs.append(self.prepareJob(file_path, self.start_photo_number + len(jobs), target_size))
+            prepared = self.preparedImages(jobs)
 
-            progress_count = 0
             global_image_counter = self.start_photo_number  # Use the starting number
             
             for group in grouped:
@@ -196,24 +1692,17 @@ class PDFCreationWorker(QThread):
                           w=briefkopf_width_in_pdf, h=briefkopf_height_in_pdf)
 
                 if len(group) == 1:
-                    file_path = group[0]
-                    processed_path = self.processImage(file_path, global_image_counter)
-                    with Image.open(processed_path) as img:
-                        orig_w, orig_h = img.size
+                    processed = self.checkPrepared(next(prepared), group[0])
+                    orig_w, orig_h = processed.width, processed.height
 
-                    new_width = uniform_img_dim
-                    new_height = orig_h * (new_width / orig_w)
-
-                    if new_height > content_height - 15:
-                        new_height = content_height - 15
-                        new_width = orig_w * (new_height / orig_h)
+                    new_width, new_height = self.fitSlot(orig_w, orig_h, uniform_img_dim, content_height - 15)
 
                     block_total_height = new_height + offset + text_line_height
                     y_block_top = (content_top + (content_height - block_total_height) / 2)
                     x_image = (page_width - new_width) / 2
                     y_image = y_block_top
 
-                    pdf.image(processed_path, x=x_image, y=y_image, w=new_width, h=new_height)
+                    self.placeImage(pdf, processed, global_image_counter, x_image, y_image, new_width, new_height)
 
                     pdf.set_font("Arial", "B", 11)
                     
@@ -228,18 +1717,13 @@ class PDFCreationWorker(QThread):
                     pdf.cell(text_width, text_line_height, text, align="C")
 
                     global_image_counter += 1
-                    progress_count += 1
-                    self.progressUpdate.emit(progress_count)
 
                 elif len(group) == 2:
-                    file_path1, file_path2 = group
-                    processed_path1 = self.processImage(file_path1, global_image_counter)
-                    processed_path2 = self.processImage(file_path2, global_image_counter + 1)
+                    processed1 = self.checkPrepared(next(prepared), group[0])
+                    processed2 = self.checkPrepared(next(prepared), group[1])
 
-                    with Image.open(processed_path1) as img1:
-                        orig1_w, orig1_h = img1.size
-                    with Image.open(processed_path2) as img2:
-                        orig2_w, orig2_h = img2.size
+                    orig1_w, orig1_h = processed1.width, processed1.height
+                    orig2_w, orig2_h = processed2.width, processed2.height
 
                     pdf.set_font("Arial", "B", 11)
                     if self.dokumentenkürzel.startswith("("):
@@ -251,25 +1735,17 @@ class PDFCreationWorker(QThread):
                     text1_width = pdf.get_string_width(text1)
                     text2_width = pdf.get_string_width(text2)
 
-                    new1_width = uniform_img_dim
-                    new1_height = orig1_h * (new1_width / orig1_w)
-                    new2_width = uniform_img_dim
-                    new2_height = orig2_h * (new2_width / orig2_w)
-
-                    if new1_height > (content_height - spacing_between) / 2:
-                        new1_height = (content_height - spacing_between) / 2
-                        new1_width = orig1_w * (new1_height / orig1_h)
-
-                    if new2_height > (content_height - spacing_between) / 2:
-                        new2_height = (content_height - spacing_between) / 2
-                        new2_width = orig2_w * (new2_height / orig2_h)
+                    new1_width, new1_height = self.fitSlot(orig1_w, orig1_h, uniform_img_dim,
+                                                           (content_height - spacing_between) / 2)
+                    new2_width, new2_height = self.fitSlot(orig2_w, orig2_h, uniform_img_dim,
+                                                           (content_height - spacing_between) / 2)
 
                     block_total_height = (new1_height + offset + text_line_height) + spacing_between + (new2_height + offset + text_line_height)
                     y_block_top = content_top + (content_height - block_total_height) / 2
 
                     x1 = (page_width - new1_width) / 2
                     y1 = y_block_top
-                    pdf.image(processed_path1, x=x1, y=y1, w=new1_width, h=new1_height)
+                    self.placeImage(pdf, processed1, global_image_counter, x1, y1, new1_width, new1_height)
 
                     x_text1 = (page_width - text1_width) / 2
                     y_text1 = y1 + new1_height + offset
@@ -278,7 +1754,7 @@ class PDFCreationWorker(QThread):
 
                     y2 = y_text1 + text_line_height + spacing_between
                     x2 = (page_width - new2_width) / 2
-                    pdf.image(processed_path2, x=x2, y=y2, w=new2_width, h=new2_height)
+                    self.placeImage(pdf, processed2, global_image_counter + 1, x2, y2, new2_width, new2_height)
 
                     x_text2 = (page_width - text2_width) / 2
                     y_text2 = y2 + new2_height + offset
@@ -286,19 +1762,21 @@ class PDFCreationWorker(QThread):
                     pdf.cell(text2_width, text_line_height, text2, align="C")
 
                     global_image_counter += 2
-                    progress_count += 2
-                    self.progressUpdate.emit(progress_count)
 
+            prepared.close()
+            if self.max_pdf_size is not None and not self._isCanceled:
+                self.fitSizeBudget(pdf, jobs)
+            self.report.append(f"{self.passthrough_count} von {len(jobs)} Bildern ohne Neukodierung übernommen, "
+                               f"{self.dct_transform_count} verlustfrei gedreht/beschnitten")
+            self.report.append(f"Export der Originale: {self.exportSummary()}")
             if not self._isCanceled:
                 pdf.output(self.save_path)
-                
-                # Clean up temporary files
-                temp_dir = os.path.join(self.output_folder, "temp")
-                if os.path.exists(temp_dir):
-                    try:
-                        shutil.rmtree(temp_dir)
-                    except Exception as e:
-                        print(f"Error cleaning up temp files: {e}")
+                pdf_size = os.path.getsize(self.save_path)
+                self.report.insert(0, f"PDF-Profil {self.profile}: {pdf_size / 1e6:.1f} MB "
+                                      f"in {time.monotonic() - started:.1f} s")
+                if self.max_pdf_size is not None and pdf_size > self.max_pdf_size:
+                    self.budget_overshoot = pdf_size - self.max_pdf_size
+                    self.report.append(f"Größenbudget um {self.budget_overshoot / 1e6:.1f} MB überschritten")
 
                 self.finished.emit(self.save_path)
 
@@ -306,55 +1784,367 @@ class PDFCreationWorker(QThread):
             self.errorOccurred.emit(str(e))
 
 
-class DraggableLabel(QLabel):
-    def __init__(self, parent, file_path, main_window):
-        super().__init__(parent)
+IMAGE_ID_MIME_TYPE = "application/x-pdfcreator-image-id"
+GRID_CELL_SIZE = QSize(170, 140)
+REMOVE_BUTTON_SIZE = 16
+# Thumbnails far outside the viewport are dropped beyond this count
+MAX_LOADED_THUMBNAILS = 1500
+
+
+class ImageRecord:
+    __slots__ = ("unique_id", "file_path", "thumbnail", "phash", "duplicate_of", "meta", "quality")
+
+    def __init__(self, file_path, thumbnail=None, unique_id=None):
+        self.unique_id = unique_id or uuid.uuid4().hex
         self.file_path = file_path
+        self.thumbnail = thumbnail
+        self.phash = None
+        # unique_id of an earlier image that looks the same
+        self.duplicate_of = None
+        self.meta = None
+        self.quality = None
+
+
+class ImageListModel(QAbstractListModel):
+    IdRole = Qt.ItemDataRole.UserRole
+    PathRole = Qt.ItemDataRole.UserRole + 1
+    DuplicateRole = Qt.ItemDataRole.UserRole + 2
+    QualityRole = Qt.ItemDataRole.UserRole + 3
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.records = []
+        # unique_id -> row, kept in sync so lookups never scan the list
+        self._rows = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.records[index.row()]
+        if role == Qt.ItemDataRole.DecorationRole:
+            return record.thumbnail
+        if role == Qt.ItemDataRole.ToolTipRole:
+            tooltip = os.path.basename(record.file_path)
+            original = self.recordFor(record.duplicate_of) if record.duplicate_of else None
+            if original is not None:
+                tooltip += f"\nMögliches Duplikat von {os.path.basename(original.file_path)}"
+            return tooltip
+        if role == self.IdRole:
+            return record.unique_id
+        if role == self.PathRole:
+            return record.file_path
+        if role == self.DuplicateRole:
+            return record.duplicate_of is not None
+        if role == self.QualityRole:
+            return record.quality
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsDragEnabled
+
+    def mimeTypes(self):
+        return [IMAGE_ID_MIME_TYPE]
+
+    def mimeData(self, indexes):
+        mime_data = QMimeData()
+        ids = "\n".join(self.records[index.row()].unique_id for index in indexes)
+        mime_data.setData(IMAGE_ID_MIME_TYPE, ids.encode("utf-8"))
+        return mime_data
+
+    def supportedDragActions(self):
+        return Qt.DropAction.MoveAction
+
+    def appendRecords(self, records):
+        if not records:
+            return
+        start = len(self.records)
+        self.beginInsertRows(QModelIndex(), start, start + len(records) - 1)
+        self.records.extend(records)
+        self._reindex(start, len(self.records))
+        self.endInsertRows()
+
+    def _reindex(self, start, stop):
+        for row in range(start, stop):
+            self._rows[self.records[row].unique_id] = row
+
+    def rowOf(self, unique_id):
+        return self._rows.get(unique_id, -1)
+
+    def recordFor(self, unique_id):
+        row = self._rows.get(unique_id)
+        return None if row is None else self.records[row]
+
+    def setThumbnail(self, row, pixmap):
+        self.records[row].thumbnail = pixmap
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def setQuality(self, row, quality):
+        self.records[row].quality = quality
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [self.QualityRole])
+
+    def setDuplicateOf(self, row, unique_id):
+        self.records[row].duplicate_of = unique_id
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [self.DuplicateRole, Qt.ItemDataRole.ToolTipRole])
+
+    def moveRecord(self, source_row, target_row):
+        if source_row == target_row:
+            return
+        # Qt expects the destination in the indexing before the move
+        destination = target_row + 1 if target_row > source_row else target_row
+        if not self.beginMoveRows(QModelIndex(), source_row, source_row, QModelIndex(), destination):
+            return
+        self.records.insert(target_row, self.records.pop(source_row))
+        # Only the rows between source and target change position
+        self._reindex(min(source_row, target_row), max(source_row, target_row) + 1)
+        self.endMoveRows()
+
+    def removeRecords(self, rows):
+        rows = set(rows)
+        if not rows:
+            return
+        # One layout change however scattered the rows, with the index rebuilt
+        # before it goes out; persistent indexes of removed records turn invalid
+        self.layoutAboutToBeChanged.emit()
+        old_records = list(self.records)
+        self.records[:] = [record for row, record in enumerate(old_records) if row not in rows]
+        self._rows.clear()
+        self._reindex(0, len(self.records))
+        persistent = self.persistentIndexList()
+        self.changePersistentIndexList(
+            persistent, [self.index(self.rowOf(old_records[index.row()].unique_id)) for index in persistent])
+        self.layoutChanged.emit()
+
+    def reorderRecords(self, records):
+        # One layout change for any new order of the same records; selection
+        # and current index follow their records
+        self.layoutAboutToBeChanged.emit()
+        old_records = list(self.records)
+        self.records[:] = records
+        self._reindex(0, len(self.records))
+        persistent = self.persistentIndexList()
+        self.changePersistentIndexList(
+            persistent, [self.index(self._rows[old_records[index.row()].unique_id]) for index in persistent])
+        self.layoutChanged.emit()
+
+    def moveRecords(self, rows, target_row):
+        rows = set(rows)
+        if target_row in rows:
+            return
+        moving = [self.records[row] for row in sorted(rows)]
+        rest = [record for row, record in enumerate(self.records) if row not in rows]
+        # Like a single move: dropped behind the target when dragged forward
+        position = rest.index(self.records[target_row])
+        if target_row > min(rows):
+            position += 1
+        self.reorderRecords(rest[:position] + moving + rest[position:])
+
+    def sortRecords(self, key):
+        self.reorderRecords(sorted(self.records, key=key))
+
+    def clear(self):
+        self.beginResetModel()
+        self.records.clear()
+        self._rows.clear()
+        self.endResetModel()
+
+
+class ImageGridDelegate(QStyledItemDelegate):
+    removeRequested = pyqtSignal(str)
+
+    def sizeHint(self, option, index):
+        return GRID_CELL_SIZE
+
+    def imageRect(self, option, index):
+        pixmap = index.data(Qt.ItemDataRole.DecorationRole)
+        size = pixmap.size() if pixmap else QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE * 3 // 4)
+        rect = QRect(QPoint(0, 0), size)
+        rect.moveCenter(option.rect.center())
+        return rect
+
+    def removeButtonRect(self, image_rect):
+        return QRect(image_rect.right() - REMOVE_BUTTON_SIZE + 1, image_rect.top(),
+                     REMOVE_BUTTON_SIZE, REMOVE_BUTTON_SIZE)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        image_rect = self.imageRect(option, index)
+        pixmap = index.data(Qt.ItemDataRole.DecorationRole)
+        if pixmap:
+            painter.drawPixmap(image_rect, pixmap)
+        else:
+            painter.fillRect(image_rect, QColor(230, 230, 230))
+
+        badges = []
+        if index.data(ImageListModel.DuplicateRole):
+            badges.append(("Duplikat", QColor(230, 126, 34)))
+        quality = index.data(ImageListModel.QualityRole)
+        if quality is not None:
+            if quality.is_blurry:
+                badges.append(("Unscharf", QColor(192, 57, 43)))
+            if quality.exposure == "dark":
+                badges.append(("Zu dunkel", QColor(52, 73, 94)))
+            elif quality.exposure == "bright":
+                badges.append(("Zu hell", QColor(142, 68, 173)))
+        for slot, (text, color) in enumerate(badges):
+            self.paintBadge(painter, image_rect, text, color, slot)
+
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.setPen(QPen(QColor("#3498db"), 2))
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawRect(image_rect.adjusted(-2, -2, 1, 1))
+
+        button_rect = self.removeButtonRect(image_rect)
+        hovered = False
+        if option.state & QStyle.StateFlag.State_MouseOver and option.widget is not None:
+            hovered = button_rect.contains(option.widget.viewport().mapFromGlobal(QCursor.pos()))
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor(150, 150, 150) if hovered else QColor(102, 102, 102))
+        painter.drawEllipse(button_rect)
+        font = painter.font()
+        font.setPixelSize(11)
+        painter.setFont(font)
+        painter.setPen(QColor("white"))
+        painter.drawText(button_rect, Qt.AlignmentFlag.AlignCenter, "✖")
+        painter.restore()
+
+    def paintBadge(self, painter, image_rect, text, color, slot=0):
+        painter.save()
+        font = painter.font()
+        font.setPixelSize(10)
+        font.setBold(True)
+        painter.setFont(font)
+        text_width = painter.fontMetrics().horizontalAdvance(text)
+        # Badges stack upwards from the bottom left corner
+        badge_rect = QRect(image_rect.left() + 3, image_rect.bottom() - 17 - slot * 16, text_width + 8, 14)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(color)
+        painter.drawRoundedRect(badge_rect, 4, 4)
+        painter.setPen(QColor("white"))
+        painter.drawText(badge_rect, Qt.AlignmentFlag.AlignCenter, text)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() in (QEvent.Type.MouseButtonPress, QEvent.Type.MouseButtonRelease):
+            button_rect = self.removeButtonRect(self.imageRect(option, index))
+            if button_rect.contains(event.position().toPoint()):
+                # Swallow the press too so it neither selects nor starts a drag
+                if event.type() == QEvent.Type.MouseButtonRelease:
+                    self.removeRequested.emit(index.data(ImageListModel.IdRole))
+                return True
+        return super().editorEvent(event, model, option, index)
+
+
+class ImageGridView(QListView):
+    visibleRangeChanged = pyqtSignal()
+
+    def __init__(self, main_window, parent=None):
+        super().__init__(parent)
         self.main_window = main_window
-        self.unique_id: str | None = None  # Use type annotation to indicate it can be str or None
+        # List mode with wrapping lays out uniform cells arithmetically and
+        # only paints the rows inside the viewport
+        self.setViewMode(QListView.ViewMode.ListMode)
+        self.setFlow(QListView.Flow.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setUniformItemSizes(True)
+        self.setGridSize(GRID_CELL_SIZE)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.setDragEnabled(True)
         self.setAcceptDrops(True)
-        self.setStyleSheet("border: 2px solid transparent;")
+        self.setDragDropMode(QAbstractItemView.DragDropMode.DragDrop)
+        self.setDefaultDropAction(Qt.DropAction.MoveAction)
+        self.setMouseTracking(True)
+
+    def scrollContentsBy(self, dx, dy):
+        super().scrollContentsBy(dx, dy)
+        self.visibleRangeChanged.emit()
 
-    def mousePressEvent(self, event):
-        if event.button() == Qt.MouseButton.LeftButton:
-            self.drag_start_position = event.pos()
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.visibleRangeChanged.emit()
+
+    def visibleRows(self):
+        model = self.model()
+        viewport_rect = self.viewport().rect()
+        first = self.indexAt(viewport_rect.topLeft() + QPoint(1, 1))
+        if not first.isValid():
+            return range(0)
+        last = first.row()
+        while last + 1 < model.rowCount() and self.visualRect(model.index(last + 1)).intersects(viewport_rect):
+            last += 1
+        return range(first.row(), last + 1)
 
     def mouseMoveEvent(self, event):
-        if not (event.buttons() & Qt.MouseButton.LeftButton):
-            return
-        if (event.pos() - self.drag_start_position).manhattanLength() < QApplication.startDragDistance():
+        super().mouseMoveEvent(event)
+        # Repaint the hovered cell so the remove button highlight follows the cursor
+        index = self.indexAt(event.position().toPoint())
+        if index.isValid():
+            self.viewport().update(self.visualRect(index))
+
+    def selectedIds(self):
+        return [index.data(ImageListModel.IdRole) for index in sorted(self.selectedIndexes(), key=lambda i: i.row())]
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key.Key_Delete, Qt.Key.Key_Backspace) and self.selectedIndexes():
+            self.main_window.removeImages(self.selectedIds())
             return
+        super().keyPressEvent(event)
 
+    def startDrag(self, supportedActions):
+        index = self.currentIndex()
+        if not index.isValid():
+            return
+        indexes = sorted(self.selectedIndexes(), key=lambda i: i.row())
+        if index not in indexes:
+            indexes = [index]
         drag = QDrag(self)
-        mime_data = QMimeData()
-        mime_data.setText(self.file_path)
-        drag.setMimeData(mime_data)
-
-        pixmap = self.pixmap()
+        drag.setMimeData(self.model().mimeData(indexes))
+        pixmap = index.data(Qt.ItemDataRole.DecorationRole)
         if pixmap:
             drag.setPixmap(pixmap.scaled(80, 80, Qt.AspectRatioMode.KeepAspectRatio))
-            drag.setHotSpot(QPoint(pixmap.width() // 2, pixmap.height() // 2))
+            drag.setHotSpot(QPoint(40, 40))
         drag.exec(Qt.DropAction.MoveAction)
 
     def dragEnterEvent(self, event):
-        if event.mimeData().hasText():
+        # File drops from outside are handled by the main window
+        if event.mimeData().hasFormat(IMAGE_ID_MIME_TYPE):
             event.acceptProposedAction()
-            self.setStyleSheet("border: 2px solid #3498db;")
+        else:
+            event.ignore()
 
-    def dragLeaveEvent(self, event):
-        self.setStyleSheet("border: 2px solid transparent;")
+    def dragMoveEvent(self, event):
+        if event.mimeData().hasFormat(IMAGE_ID_MIME_TYPE):
+            super().dragMoveEvent(event)
+            event.acceptProposedAction()
+        else:
+            event.ignore()
 
     def dropEvent(self, event):
-        source_path = event.mimeData().text()
-        target_path = self.file_path
-        if source_path != target_path:
-            self.main_window.reorderImages(source_path, target_path)
-            event.acceptProposedAction()
-        self.setStyleSheet("border: 2px solid transparent;")
+        if not event.mimeData().hasFormat(IMAGE_ID_MIME_TYPE):
+            event.ignore()
+            return
+        source_ids = bytes(event.mimeData().data(IMAGE_ID_MIME_TYPE)).decode("utf-8").split("\n")
+        target = self.indexAt(event.position().toPoint())
+        if target.isValid():
+            if len(source_ids) == 1:
+                self.main_window.reorderImages(source_ids[0], target.data(ImageListModel.IdRole))
+            else:
+                self.main_window.moveImages(source_ids, target.data(ImageListModel.IdRole))
+        event.acceptProposedAction()
+        self.stopAutoScroll()
 
 
 class ImageUploader(QWidget):
-    def __init__(self):
+    def __init__(self, thumbnail_cache=None):
         super().__init__()
         translations_path = QLibraryInfo.path(QLibraryInfo.LibraryPath.TranslationsPath)
         translator = QTranslator()
@@ -362,10 +2152,21 @@ class ImageUploader(QWidget):
         self.setLocale(QLocale(QLocale.Language.German))
         self.initUI()
         self.setWindowTitle("PDF Creator")
-        self.images = []
-        self.import_worker = None
+        # None uses the cache in the user's cache folder
+        self.thumbnail_cache = thumbnail_cache if thumbnail_cache is not None else ThumbnailCache()
+        self.duplicate_index = DuplicateIndex()
+        self.thumbnail_loader = None
+        self.folder_scanners = []
+        # Imported images not decoded yet, and the files that could not be read
+        self.import_pending = set()
+        self.import_total = 0
+        self.import_failures = []
         self.pdf_worker = None
 
+    @property
+    def images(self):
+        return self.image_model.records
+
     def initUI(self):
         layout = QVBoxLayout()
         self.setAcceptDrops(True)
@@ -401,44 +2202,111 @@ class ImageUploader(QWidget):
         self.start_photo_number.setValidator(QIntValidator(1, 999))  # Only allow integers
         self.start_photo_number.setFixedWidth(60)
         start_number_layout.addWidget(self.start_photo_number)
+        start_number_layout.addSpacing(20)
+        start_number_layout.addWidget(QLabel("Originale:"))
+        self.export_mode_input = QComboBox(self)
+        # Same order as EXPORT_MODES
+        self.export_mode_input.addItems(["unverändert kopieren", "aufrecht neu speichern", "als Hardlink verknüpfen"])
+        start_number_layout.addWidget(self.export_mode_input)
+        start_number_layout.addSpacing(20)
+        start_number_layout.addWidget(QLabel("Auflösung:"))
+        self.profile_input = QComboBox(self)
+        # Same order as PDF_PROFILES
+        self.profile_input.addItems(["Bildschirm (150 dpi)", "Druck (300 dpi)", "Archiv (Original)"])
+        self.profile_input.setCurrentIndex(1)
+        start_number_layout.addWidget(self.profile_input)
         start_number_layout.addStretch()
         layout.addLayout(start_number_layout)
 
+        # On a row of its own; next to the other options it would not fit the window width
+        max_size_layout = QHBoxLayout()
+        max_size_layout.addWidget(QLabel("Max. Größe (MB):"))
+        self.max_size_input = QLineEdit(self)
+        self.max_size_input.setPlaceholderText("ohne")
+        self.max_size_input.setValidator(QIntValidator(1, 10000))
+        self.max_size_input.setFixedWidth(60)
+        max_size_layout.addWidget(self.max_size_input)
+        max_size_layout.addStretch()
+        layout.addLayout(max_size_layout)
+
+        upload_layout = QHBoxLayout()
         self.upload_button = QPushButton("Dateien hinzufügen", self)
         self.upload_button.clicked.connect(self.openFileDialog)
-        layout.addWidget(self.upload_button)
+        upload_layout.addWidget(self.upload_button)
+        self.upload_folder_button = QPushButton("Ordner hinzufügen", self)
+        self.upload_folder_button.clicked.connect(self.openFolderDialog)
+        upload_layout.addWidget(self.upload_folder_button)
+        self.open_project_button = QPushButton("Projekt öffnen", self)
+        self.open_project_button.clicked.connect(self.openProjectDialog)
+        upload_layout.addWidget(self.open_project_button)
+        self.save_project_button = QPushButton("Projekt speichern", self)
+        self.save_project_button.clicked.connect(self.saveProjectDialog)
+        upload_layout.addWidget(self.save_project_button)
+        layout.addLayout(upload_layout)
 
         # Create a container for the image area and counter
         image_container_layout = QVBoxLayout()
         
         # Add image counter label
         counter_layout = QHBoxLayout()
+        self.sort_input = QComboBox(self)
+        self.sort_input.addItems(["Sortieren nach …", "Aufnahmedatum", "Dateiname", "Ordner"])
+        self.sort_input.activated.connect(self.sortImages)
+        counter_layout.addWidget(self.sort_input)
+        self.remove_blurry_button = QPushButton("Unscharfe entfernen …", self)
+        self.remove_blurry_button.clicked.connect(self.removeBlurryDialog)
+        counter_layout.addWidget(self.remove_blurry_button)
+        self.remove_selected_button = QPushButton("Auswahl entfernen", self)
+        self.remove_selected_button.setEnabled(False)
+        self.remove_selected_button.clicked.connect(lambda: self.removeImages(self.image_view.selectedIds()))
+        counter_layout.addWidget(self.remove_selected_button)
         counter_layout.addStretch()
         self.image_counter_label = QLabel("0 Bilder", self)
         self.image_counter_label.setStyleSheet("color: #888888; font-weight: bold;")
         counter_layout.addWidget(self.image_counter_label)
         image_container_layout.addLayout(counter_layout)
+
+        # Only shown while imported images are still waiting for their first decode
+        import_layout = QHBoxLayout()
+        self.import_progress = QProgressBar(self)
+        self.import_progress.setFormat("%v von %m Bildern geladen")
+        self.import_progress.hide()
+        import_layout.addWidget(self.import_progress)
+        self.import_cancel_button = QPushButton("Import abbrechen", self)
+        self.import_cancel_button.clicked.connect(self.cancelImport)
+        self.import_cancel_button.hide()
+        import_layout.addWidget(self.import_cancel_button)
+        image_container_layout.addLayout(import_layout)
         
         # Add the image area
-        self.image_area = QScrollArea()
-        self.image_container = QWidget()
-        self.image_layout = QGridLayout()
-        self.image_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-        self.image_container.setLayout(self.image_layout)
-        self.image_area.setWidget(self.image_container)
-        self.image_area.setWidgetResizable(True)
-        image_container_layout.addWidget(self.image_area)
+        self.image_model = ImageListModel(self)
+        self.image_delegate = ImageGridDelegate(self)
+        self.image_delegate.removeRequested.connect(self.removeImage)
+        self.image_view = ImageGridView(self)
+        self.image_view.setModel(self.image_model)
+        self.image_view.setItemDelegate(self.image_delegate)
+        self.image_view.selectionModel().selectionChanged.connect(
+            lambda: self.remove_selected_button.setEnabled(bool(self.image_view.selectedIndexes())))
+        image_container_layout.addWidget(self.image_view)
+
+        # Coalesce scroll, resize and model changes into one priority update
+        self.priority_timer = QTimer(self)
+        self.priority_timer.setSingleShot(True)
+        self.priority_timer.setInterval(30)
+        self.priority_timer.timeout.connect(self.updateThumbnailPriorities)
+        self.image_view.visibleRangeChanged.connect(self.priority_timer.start)
+        self.image_model.rowsInserted.connect(self.priority_timer.start)
+        self.image_model.rowsMoved.connect(self.priority_timer.start)
+        self.image_model.layoutChanged.connect(self.priority_timer.start)
         
         layout.addLayout(image_container_layout)
 
-        self.empty_label = QLabel("Importiere Fotos oder ziehe sie hierhin", self.image_container)
+        self.empty_label = QLabel("Importiere Fotos oder ziehe sie hierhin")
         self.empty_label.setStyleSheet("color: #888888;")
         self.empty_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.empty_layout = QVBoxLayout()
-        self.empty_layout.addStretch()
+        self.empty_label.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.empty_layout = QVBoxLayout(self.image_view.viewport())
         self.empty_layout.addWidget(self.empty_label)
-        self.empty_layout.addStretch()
-        self.image_layout.addLayout(self.empty_layout, 0, 0)
 
         pdf_buttons_layout = QHBoxLayout()
         pdf_buttons_layout.setContentsMargins(150, 10, 150, 0)
@@ -465,20 +2333,6 @@ class ImageUploader(QWidget):
         self.overlay.setText("Drag & Drop Here")
         self.overlay.setVisible(False)
 
-    def rearrangeImages(self):
-        for i in reversed(range(self.image_layout.count())):
-            item = self.image_layout.itemAt(i)
-            if item:
-                widget = item.widget()
-                if widget and widget != self.empty_label:
-                    self.image_layout.removeWidget(widget)
-                    widget.setParent(None)
-        for idx, (frame, _, _) in enumerate(self.images):
-            row = idx // 4
-            col = idx % 4
-            self.image_layout.addWidget(frame, row, col)
-        self.empty_label.setVisible(len(self.images) == 0)
-
     def showProgress(self, maximum, text):
         progress_dialog = QProgressDialog(text, "Cancel", 0, maximum, self)
         progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
@@ -509,13 +2363,13 @@ class ImageUploader(QWidget):
     def dropEvent(self, event):
         self.overlay.setVisible(False)
         if event.mimeData().hasUrls():
-            valid_files = []
+            valid_paths = []
             for url in event.mimeData().urls():
                 file_path = url.toLocalFile()
-                if file_path.lower().endswith((".png", ".jpg", ".jpeg", ".bmp")):
-                    valid_files.append(file_path)
-            if valid_files:
-                self.startImageImport(valid_files)
+                if os.path.isdir(file_path) or file_path.lower().endswith(IMAGE_EXTENSIONS + ARCHIVE_EXTENSIONS):
+                    valid_paths.append(file_path)
+            if valid_paths:
+                self.startPathImport(valid_paths)
         event.acceptProposedAction()
 
     def openFileDialog(self):
@@ -525,98 +2379,282 @@ class ImageUploader(QWidget):
             parent=self,
             caption="Bilder auswählen",
             directory=homedir,
-            filter="Bilder (*.png *.jpg *.jpeg *.bmp);;Alle Dateien (*)"
+            filter="Bilder (*.png *.jpg *.jpeg *.bmp *.zip);;Alle Dateien (*)"
         )
         if files:
+            self.startPathImport(files)
+
+    def openFolderDialog(self):
+        homedir = os.environ.get('HOME', '')
+        folder = QFileDialog.getExistingDirectory(self, "Ordner auswählen", homedir)
+        if folder:
+            self.startPathImport([folder])
+
+    def startPathImport(self, paths):
+        if not any(os.path.isdir(path) or path.lower().endswith(ARCHIVE_EXTENSIONS) for path in paths):
+            self.startImageImport(paths)
+            return
+        # Folders and archives are listed in the background and streamed into the grid
+        scanner = FolderScanWorker(paths)
+        scanner.filesFound.connect(lambda files: self.addScannedFiles(scanner, files))
+        scanner.finished.connect(lambda: self.folderScanFinished(scanner))
+        self.folder_scanners.append(scanner)
+        scanner.start()
+        self.updateImportProgress()
+
+    def addScannedFiles(self, scanner, files):
+        # Batches still queued from a scan stopped by a reset are dropped
+        if scanner in self.folder_scanners:
             self.startImageImport(files)
 
+    def folderScanFinished(self, scanner):
+        if scanner in self.folder_scanners:
+            self.folder_scanners.remove(scanner)
+            self.updateImportProgress()
+            self.reportImportFailures()
+
+    def stopFolderScanners(self):
+        for scanner in list(self.folder_scanners):
+            scanner.cancel()
+            scanner.wait()
+        self.folder_scanners.clear()
+
     def startImageImport(self, file_paths):
-        self.import_progress_dialog = self.showProgress(len(file_paths), "Importing images...")
-        self.import_worker = ImageImportWorker(file_paths)
-        self.import_worker.imageImported.connect(self.addImageFromWorker)
-        self.import_worker.progress.connect(lambda val: self.import_progress_dialog.setValue(val))
-        self.import_progress_dialog.canceled.connect(self.import_worker.cancel)
-        self.import_worker.finished.connect(self.importFinished)
-        self.import_worker.start()
+        # Placeholders go into the grid right away; thumbnails follow on demand
+        records = [ImageRecord(file_path) for file_path in file_paths]
+        self.image_model.appendRecords(records)
+        self.updateImageState()
+        self.trackImport(records)
+        self.thumbnailLoader().request((record.unique_id, record.file_path, record.meta) for record in records)
+        self.priority_timer.start()
+
+    def trackImport(self, records):
+        self.import_pending.update(record.unique_id for record in records)
+        self.import_total += len(records)
+        self.updateImportProgress()
+
+    def untrackImport(self, unique_ids):
+        self.import_pending.difference_update(unique_ids)
+        self.updateImportProgress()
+
+    def updateImportProgress(self):
+        running = bool(self.import_pending or self.folder_scanners)
+        if not running:
+            self.import_total = 0
+        # A folder scan that has not found anything yet shows as busy
+        self.import_progress.setMaximum(self.import_total)
+        self.import_progress.setValue(self.import_total - len(self.import_pending))
+        self.import_progress.setVisible(running)
+        self.import_cancel_button.setVisible(running)
+
+    def cancelImport(self):
+        self.stopFolderScanners()
+        # Images already shown stay, placeholders still waiting for their decode are dropped
+        self.removeImages(list(self.import_pending))
+
+    def thumbnailLoader(self):
+        if self.thumbnail_loader is None:
+            self.thumbnail_loader = ThumbnailLoader(cache=self.thumbnail_cache)
+            self.thumbnail_loader.thumbnailsLoaded.connect(self.addThumbnails)
+            self.thumbnail_loader.thumbnailsFailed.connect(self.removeFailedImages)
+            self.thumbnail_loader.idle.connect(self.importFinished)
+            self.thumbnail_loader.start()
+        return self.thumbnail_loader
+
+    def stopThumbnailLoader(self):
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.cancel()
+            self.thumbnail_loader.wait()
+            self.thumbnail_loader = None
+
+    def closeEvent(self, event):
+        self.stopFolderScanners()
+        self.stopThumbnailLoader()
+        super().closeEvent(event)
 
     def updateImageCounter(self):
         count = len(self.images)
         self.image_counter_label.setText(f"{count} {'Bild' if count == 1 else 'Bilder'}")
 
     def importFinished(self):
-        self.import_progress_dialog.close()
         self.updateImageCounter()  # Update the counter when import is finished
+        cache = self.thumbnail_cache
+        self.image_counter_label.setToolTip(f"Vorschaubild-Cache: {cache.hits} Treffer, {cache.misses} Fehlversuche, "
+                                            f"{cache.evictions} verdrängt")
+        self.reportImportFailures()
+
+    def removeFailedImages(self, failed):
+        # Unreadable files leave the grid so they neither count nor reach the PDF
+        failed = [(unique_id, file_path) for unique_id, file_path in failed if self.image_model.rowOf(unique_id) != -1]
+        self.import_failures.extend(os.path.basename(file_path) for _, file_path in failed)
+        self.removeImages([unique_id for unique_id, _ in failed])
+
+    def reportImportFailures(self):
+        # Collected over the whole import and reported once the folder scans are done
+        if not self.import_failures or self.folder_scanners:
+            return
+        failures, self.import_failures = self.import_failures, []
+        QMessageBox.warning(self, "Nicht lesbare Dateien",
+                            f"{len(failures)} Dateien konnten nicht gelesen werden und wurden entfernt:\n"
+                            + "\n".join(failures[:10]))
 
-    def addImageFromWorker(self, file_path, qimage):
+    def thumbnailPixmap(self, qimage):
         pixmap = QPixmap.fromImage(qimage)
-        frame = QFrame(self.image_container)
-        container = QWidget(frame)
-        layout = QGridLayout(container)
-        layout.setContentsMargins(0, 0, 0, 0)
-        
-        # Generate a unique ID for this image instance
-        import uuid
-        unique_id = str(uuid.uuid4())
-        
-        label = DraggableLabel(container, file_path, self)
-        label.unique_id = unique_id  # Now this will work without warnings
-        scaled_pixmap = pixmap.scaled(120, 120, Qt.AspectRatioMode.KeepAspectRatio,
-                                      Qt.TransformationMode.SmoothTransformation)
-        label.setPixmap(scaled_pixmap)
-        label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        remove_button = QPushButton("✖", container)
-        remove_button.setFixedSize(16, 16)
-        remove_button.clicked.connect(lambda: self.removeImage(frame, file_path, unique_id))
-        remove_button.setStyleSheet("""
-            QPushButton {
-                background-color: rgb(102, 102, 102);
-                color: white;
-                border-radius: 8px;
-                font-size: 11px;
-                border: none;
-            }
-            QPushButton:hover {
-                background-color: rgb(150, 150, 150);
-            }
-        """)
-        layout.addWidget(label, 0, 0, Qt.AlignmentFlag.AlignCenter)
-        layout.addWidget(remove_button, 0, 0, Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignRight)
-        frame_layout = QVBoxLayout(frame)
-        frame_layout.setContentsMargins(0, 0, 0, 0)
-        frame_layout.addWidget(container)
-        self.images.append((frame, file_path, unique_id))
-        self.rearrangeImages()
+        if not pixmap.isNull() and max(pixmap.width(), pixmap.height()) > THUMBNAIL_SIZE:
+            pixmap = pixmap.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.AspectRatioMode.KeepAspectRatio,
+                                   Qt.TransformationMode.SmoothTransformation)
+        return pixmap if not pixmap.isNull() else None
+
+    def addThumbnails(self, batch):
+        for unique_id, qimage, phash, meta, quality in batch:
+            row = self.image_model.rowOf(unique_id)
+            if row == -1:
+                continue
+            self.image_model.setThumbnail(row, self.thumbnailPixmap(qimage))
+            record = self.images[row]
+            if meta is not None:
+                record.meta = meta
+            if quality is not None and record.quality is None:
+                self.image_model.setQuality(row, quality)
+            # Reloads of dropped thumbnails are already in the index
+            if record.phash is None:
+                self.registerImageHash(row, phash)
+        self.untrackImport(unique_id for unique_id, *_ in batch)
+        self.dropFarThumbnails()
+
+    def registerImageHash(self, row, phash):
+        record = self.images[row]
+        record.phash = phash
+        matches = self.duplicate_index.search(phash)
+        if matches:
+            self.image_model.setDuplicateOf(row, matches[0][1])
+        self.duplicate_index.add(record.unique_id, phash)
+
+    def forgetImageHashes(self, unique_ids):
+        unique_ids = set(unique_ids)
+        for unique_id in unique_ids:
+            self.duplicate_index.remove(unique_id)
+        # Images flagged as copies of a removed one point to another match, if any
+        for row, record in enumerate(self.images):
+            if record.duplicate_of not in unique_ids:
+                continue
+            matches = [key for _, key in self.duplicate_index.search(record.phash) if key != record.unique_id]
+            self.image_model.setDuplicateOf(row, matches[0] if matches else None)
+
+    def thumbnailWindow(self):
+        visible = self.image_view.visibleRows()
+        if not visible:
+            visible = range(0, min(len(self.images), 20))
+        # Two screens above and below count as near
+        margin = 2 * max(len(visible), 1)
+        near = range(max(0, visible.start - margin), min(len(self.images), visible.stop + margin))
+        return visible, near
+
+    def updateThumbnailPriorities(self):
+        if self.thumbnail_loader is None or not self.images:
+            return
+        visible, near = self.thumbnailWindow()
+        # Visible cells first, then near ones by distance from the viewport
+        rows = list(visible) + sorted((row for row in near if row not in visible),
+                                      key=lambda row: min(abs(row - visible.start), abs(row - visible.stop)))
+        records = [self.images[row] for row in rows]
+        self.thumbnail_loader.request((record.unique_id, record.file_path, record.meta)
+                                      for record in records if record.thumbnail is None)
+        self.thumbnail_loader.prioritize([record.unique_id for record in records])
+
+    def dropFarThumbnails(self):
+        loaded = [row for row, record in enumerate(self.images) if record.thumbnail is not None]
+        if len(loaded) <= MAX_LOADED_THUMBNAILS:
+            return
+        visible, near = self.thumbnailWindow()
+        center = (visible.start + visible.stop) // 2
+        loaded.sort(key=lambda row: abs(row - center), reverse=True)
+        # Far thumbnails reload from the disk cache when scrolled back into view
+        for row in loaded[:len(loaded) - int(MAX_LOADED_THUMBNAILS * 0.9)]:
+            if row in near:
+                break
+            self.image_model.setThumbnail(row, None)
+
+    def updateImageState(self):
+        self.empty_label.setVisible(len(self.images) == 0)
         self.updatePdfButtonState()
         self.updateImageCounter()
 
-    def reorderImages(self, source_path, target_path):
-        source_index = -1
-        target_index = -1
-        # Update the tuple unpacking to handle all three values
-        for i, (_, path, _) in enumerate(self.images):
-            if path == source_path:
-                source_index = i
-            if path == target_path:
-                target_index = i
-        if source_index != -1 and target_index != -1:
-            item = self.images.pop(source_index)
-            self.images.insert(target_index, item)
-            self.rearrangeImages()
-
-    def removeImage(self, frame, file_path, unique_id=None):
-        self.image_layout.removeWidget(frame)
-        frame.deleteLater()
-        
-        if unique_id:
-            # Remove only the specific image instance with this unique ID
-            self.images = [img for img in self.images if img[2] != unique_id]
+    def reorderImages(self, source_id, target_id):
+        source_row = self.image_model.rowOf(source_id)
+        target_row = self.image_model.rowOf(target_id)
+        if source_row != -1 and target_row != -1:
+            self.image_model.moveRecord(source_row, target_row)
+
+    def moveImages(self, source_ids, target_id):
+        rows = [row for row in map(self.image_model.rowOf, source_ids) if row != -1]
+        target_row = self.image_model.rowOf(target_id)
+        if rows and target_row != -1:
+            self.image_model.moveRecords(rows, target_row)
+
+    def removeImage(self, unique_id):
+        self.removeImages([unique_id])
+
+    def removeImages(self, unique_ids):
+        rows = [row for row in map(self.image_model.rowOf, unique_ids) if row != -1]
+        self.image_model.removeRecords(rows)
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.discard(unique_ids)
+        self.forgetImageHashes(unique_ids)
+        self.untrackImport(unique_ids)
+        self.updateImageState()
+
+    def imagesBelowSharpness(self, threshold):
+        return [record.unique_id for record in self.images
+                if record.quality is not None and record.quality.sharpness < threshold]
+
+    def removeBlurryDialog(self):
+        threshold, ok = QInputDialog.getInt(
+            self, "Unscharfe Fotos entfernen",
+            "Fotos mit einer Schärfe unter diesem Wert entfernen:", int(SHARPNESS_THRESHOLD), 0, 10000)
+        if not ok:
+            return
+        unique_ids = self.imagesBelowSharpness(threshold)
+        if not unique_ids:
+            QMessageBox.information(self, "Unscharfe Fotos entfernen", "Keine Fotos unter diesem Wert.")
+            return
+        reply = QMessageBox.question(
+            self,
+            "Bestätigung",
+            f"{len(unique_ids)} Fotos entfernen?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.removeImages(unique_ids)
+
+    def sortImages(self, choice):
+        # Index 0 is the "Sortieren nach …" placeholder; the combo box
+        # returns to it so the same order can be applied again
+        self.sort_input.setCurrentIndex(0)
+        if choice == 1:
+            def key(record):
+                # Sorts on the metadata gathered at import: the capture time, or
+                # the file time for images without one. Images whose metadata has
+                # not arrived yet keep their order behind all others
+                meta = record.meta
+                if meta is None:
+                    return True, ""
+                return False, meta.taken or time.strftime("%Y:%m:%d %H:%M:%S", time.localtime(meta.mtime))
+        elif choice == 2:
+            key = lambda record: natural_sort_key(os.path.basename(record.file_path))
+        elif choice == 3:
+            # The folder is looked up once per directory, not per image
+            folders = {}
+
+            def key(record):
+                directory = os.path.dirname(record.file_path)
+                if directory not in folders:
+                    folders[directory] = natural_sort_key(source_folder(record.file_path))
+                return folders[directory], natural_sort_key(os.path.basename(record.file_path))
         else:
-            # Backward compatibility for any code that might still call without unique_id
-            self.images = [img for img in self.images if img[1] != file_path]
-            
-        self.rearrangeImages()
-        self.updatePdfButtonState()
-        self.updateImageCounter()
+            return
+        self.image_model.sortRecords(key)
 
     def resetApp(self):
         reply = QMessageBox.question(
@@ -627,16 +2665,140 @@ class ImageUploader(QWidget):
             QMessageBox.StandardButton.No
         )
         if reply == QMessageBox.StandardButton.Yes:
-            self.aktennummer_input.clear()
-            self.dokumentenkürzel_input.setCurrentIndex(0)
-            self.dokumentenzahl_input.clear()
-            for frame, _, _ in self.images:  # Updated to unpack 3 values
-                self.image_layout.removeWidget(frame)
-                frame.deleteLater()
-            self.images.clear()
-            self.empty_label.setVisible(True)
-            self.updatePdfButtonState()
-            self.updateImageCounter()  # Update the counter when resetting
+            self.clearProject()
+
+    def clearProject(self):
+        self.aktennummer_input.clear()
+        self.dokumentenkürzel_input.setCurrentIndex(0)
+        self.dokumentenzahl_input.clear()
+        self.stopFolderScanners()
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.discard()
+        self.image_model.clear()
+        self.duplicate_index.clear()
+        self.import_pending.clear()
+        self.import_failures.clear()
+        self.updateImportProgress()
+        self.updateImageState()
+
+    def saveProjectDialog(self):
+        if not self.images:
+            QMessageBox.warning(self, "Keine Bilder", "Bitte fügen Sie mindestens ein Bild hinzu.")
+            return
+        name = self.aktennummer_input.text().strip() or "Projekt"
+        folder = source_folder(self.images[0].file_path) or os.path.expanduser("~")
+        project_path, _ = QFileDialog.getSaveFileName(
+            self, "Projekt speichern", os.path.join(folder, name + PROJECT_EXTENSION),
+            f"PDF Creator Projekt (*{PROJECT_EXTENSION})")
+        if not project_path:
+            return
+        if not project_path.endswith(PROJECT_EXTENSION):
+            project_path += PROJECT_EXTENSION
+        try:
+            self.saveProject(project_path)
+        except Exception as e:
+            QMessageBox.critical(self, "Fehler", f"Projekt konnte nicht gespeichert werden:\n{e}")
+
+    def saveProject(self, project_path):
+        images = []
+        for record in self.images:
+            entry = {"path": record.file_path, "phash": record.phash, "thumbnail": self.thumbnailBytes(record)}
+            if record.quality is not None:
+                quality = record.quality
+                entry["quality"] = [quality.sharpness, quality.brightness, quality.dark, quality.bright]
+            meta = record.meta
+            if meta is not None:
+                entry.update(size=meta.size, mtime=meta.mtime, width=meta.width, height=meta.height,
+                             orientation=meta.orientation, format=meta.format, taken=meta.taken)
+            images.append(entry)
+        write_project(project_path, {
+            "aktennummer": self.aktennummer_input.text(),
+            "dokumentenkürzel": self.dokumentenkürzel_input.currentText() if self.dokumentenkürzel_input.currentIndex() else "",
+            "dokumentenzahl": self.dokumentenzahl_input.text(),
+            "start_photo_number": self.start_photo_number.text(),
+            "images": images,
+        })
+
+    def thumbnailBytes(self, record):
+        image = record.thumbnail
+        if image is None:
+            # Dropped thumbnails are taken from the disk cache, never from the source
+            image = self.thumbnail_cache.get(record.file_path, THUMBNAIL_SIZE)
+        if image is None or image.isNull():
+            return None
+        buffer = QBuffer()
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        image.save(buffer, "JPG", 85)
+        return bytes(buffer.data())
+
+    def openProjectDialog(self):
+        project_path, _ = QFileDialog.getOpenFileName(
+            self, "Projekt öffnen", os.path.expanduser("~"), f"PDF Creator Projekt (*{PROJECT_EXTENSION})")
+        if not project_path:
+            return
+        if self.images:
+            reply = QMessageBox.question(
+                self,
+                "Bestätigung",
+                "Das aktuelle Projekt wird ersetzt. Fortfahren?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No
+            )
+            if reply == QMessageBox.StandardButton.No:
+                return
+        try:
+            missing = self.openProject(project_path)
+        except Exception as e:
+            QMessageBox.critical(self, "Fehler", f"Projekt konnte nicht geöffnet werden:\n{e}")
+            return
+        if missing:
+            QMessageBox.warning(self, "Fehlende Dateien",
+                                f"{len(missing)} Bilder wurden nicht gefunden und fehlen im Projekt:\n"
+                                + "\n".join(missing[:10]))
+
+    def openProject(self, project_path):
+        project = read_project(project_path)
+        self.clearProject()
+        self.aktennummer_input.setText(project.get("aktennummer", ""))
+        kürzel_index = self.dokumentenkürzel_input.findText(project.get("dokumentenkürzel") or "")
+        self.dokumentenkürzel_input.setCurrentIndex(max(kürzel_index, 0))
+        self.dokumentenzahl_input.setText(project.get("dokumentenzahl", ""))
+        self.start_photo_number.setText(str(project.get("start_photo_number") or 1))
+
+        records = []
+        hashes = []
+        missing = []
+        for entry in project["images"]:
+            try:
+                size, mtime = source_stat(entry["path"])
+            except (OSError, KeyError, zipfile.BadZipFile):
+                missing.append(entry["path"])
+                continue
+            record = ImageRecord(entry["path"])
+            # Unchanged files keep everything from the project; changed ones are loaded again
+            if (size, mtime) == (entry.get("size"), entry.get("mtime")):
+                record.meta = ImageMeta(entry["width"], entry["height"], entry["orientation"],
+                                        entry["format"], size, mtime, entry.get("taken"))
+                if entry.get("quality"):
+                    record.quality = ImageQuality(*entry["quality"])
+                if entry["thumbnail"]:
+                    pixmap = QPixmap()
+                    if pixmap.loadFromData(entry["thumbnail"], "JPG"):
+                        record.thumbnail = pixmap
+            hashes.append(entry.get("phash") if record.thumbnail is not None else None)
+            records.append(record)
+
+        self.image_model.appendRecords(records)
+        for row, phash in enumerate(hashes):
+            if phash is not None:
+                self.registerImageHash(row, phash)
+        self.updateImageState()
+        stale = [record for record in records if record.thumbnail is None]
+        if stale:
+            self.trackImport(stale)
+            self.thumbnailLoader().request((record.unique_id, record.file_path, record.meta) for record in stale)
+            self.priority_timer.start()
+        return missing
 
     def updatePdfButtonState(self):
         aktennummer_filled = bool(self.aktennummer_input.text().strip())
@@ -648,6 +2810,10 @@ class ImageUploader(QWidget):
         if not self.images:
             QMessageBox.warning(self, "Keine Bilder", "Bitte fügen Sie mindestens ein Bild hinzu.")
             return
+        if self.import_pending or self.folder_scanners:
+            QMessageBox.information(self, "Import läuft", "Bitte warten Sie, bis alle Bilder geladen sind, "
+                                                          "oder brechen Sie den Import ab.")
+            return
         aktennummer = self.aktennummer_input.text().strip()
         dokumentenkürzel = self.dokumentenkürzel_input.currentText().strip()
         dokumentenzahl = self.dokumentenzahl_input.text().strip()
@@ -665,7 +2831,7 @@ class ImageUploader(QWidget):
             default_folder_name = f"{aktennummer}-{dokumentenzahl}"
         else:
             default_folder_name = f"{aktennummer}-{dokumentenkürzel}-{dokumentenzahl}"
-        first_image_dir = os.path.dirname(self.images[0][1]) if self.images else ""
+        first_image_dir = source_folder(self.images[0].file_path) if self.images else ""
         if not first_image_dir:
             first_image_dir = os.path.expanduser("~")
         folder_suggestion = os.path.join(first_image_dir, default_folder_name)
@@ -750,39 +2916,23 @@ class ImageUploader(QWidget):
                     return
         os.makedirs(output_folder, exist_ok=True)
         pdf_path = os.path.join(output_folder, f"{base_name}.pdf")
-        # Update this line to extract file paths from the new image tuple structure
-        image_paths = [p for _, p, _ in self.images]
-
-        def is_horizontal(fp):
-            try:
-                with Image.open(fp) as im:
-                    im = ImageOps.exif_transpose(im)
-                    w, h = im.size
-                return w >= h
-            except:
-                return False
-
-        grouped = []
-        i = 0
-        n = len(image_paths)
-        while i < n:
-            if not is_horizontal(image_paths[i]):
-                grouped.append([image_paths[i]])
-                i += 1
-            else:
-                if i + 1 < n and is_horizontal(image_paths[i + 1]):
-                    grouped.append([image_paths[i], image_paths[i + 1]])
-                    i += 2
-                else:
-                    grouped.append([image_paths[i]])
-                    i += 1
-        total_images = sum(len(g) for g in grouped)
-        self.pdf_progress_dialog = self.showProgress(total_images, "Creating PDF...")
+        image_paths = [record.file_path for record in self.images]
+        # Upload portals count in MiB as often as in MB; MiB is the safe side
+        max_pdf_size = int(self.max_size_input.text()) * 1024 * 1024 if self.max_size_input.text() else None
+        # Grouping happens in the worker from the import metadata
+        image_meta = [record.meta for record in self.images]
+        self.pdf_progress_dialog = self.showProgress(len(image_paths), "Creating PDF...")
+        # Stays open at the end of the first pass in case the size budget needs a second
+        self.pdf_progress_dialog.setAutoReset(False)
         briefkopf_path = self.resource_path(os.path.join('resources', 'briefkopf.png'))
         self.pdf_worker = PDFCreationWorker(image_paths, aktennummer, dokumentenkürzel,
                                              dokumentenzahl, pdf_path, briefkopf_path, 
-                                             output_folder, start_photo_number)
+                                             output_folder, start_photo_number, image_meta,
+                                             export_mode=EXPORT_MODES[self.export_mode_input.currentIndex()],
+                                             profile=list(PDF_PROFILES)[self.profile_input.currentIndex()],
+                                             max_pdf_size=max_pdf_size)
         self.pdf_worker.progressUpdate.connect(lambda val: self.pdf_progress_dialog.setValue(val))
+        self.pdf_worker.progressMaximum.connect(lambda val: self.pdf_progress_dialog.setMaximum(val))
         self.pdf_progress_dialog.canceled.connect(self.pdf_worker.cancel)
         self.pdf_worker.finished.connect(self.pdfFinished)
         self.pdf_worker.errorOccurred.connect(self.pdfError)
@@ -792,8 +2942,16 @@ class ImageUploader(QWidget):
         self.pdf_progress_dialog.close()
         msg_box = QMessageBox(self)
         msg_box.setWindowTitle("PDF erstellt")
-        msg_box.setText(f"PDF erfolgreich erstellt:\n{save_path}")
-        msg_box.setIcon(QMessageBox.Icon.Information)
+        if self.pdf_worker.budget_overshoot:
+            # The second pass could not bring it under the limit; portals may refuse it
+            msg_box.setText(f"PDF erstellt, aber größer als die erlaubten "
+                            f"{self.pdf_worker.max_pdf_size / 1024 / 1024:.0f} MB:\n{save_path}")
+            msg_box.setIcon(QMessageBox.Icon.Warning)
+        else:
+            msg_box.setText(f"PDF erfolgreich erstellt:\n{save_path}")
+            msg_box.setIcon(QMessageBox.Icon.Information)
+        msg_box.setInformativeText("\n".join(self.pdf_worker.report))
+        msg_box.setDetailedText(f"Wartezeiten der PDF-Pipeline: {self.pdf_worker.stallSummary()}")
         # Use the same icon as the main application
         icon_path = self.resource_path(os.path.join('resources', 'icon.png'))
         msg_box.setWindowIcon(QIcon(icon_path))
@@ -812,6 +2970,7 @@ class ImageUploader(QWidget):
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon("resources/icon.png"))
     translator = QTranslator()
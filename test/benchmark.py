@@ -0,0 +1,234 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path so we can import the pdf_creator module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_creator import (
+    ThumbnailLoader, PDFCreationWorker, ThumbnailCache, DuplicateIndex, load_thumbnail, pil_to_qimage, perceptual_hash,
+    image_quality_scores, lossless_jpeg_transform, find_jpegtran, prepare_image, PDF_PROFILES, THUMBNAIL_SIZE,
+    QUALITY_SIZE
+)
+import multiprocessing
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from PIL import Image
+
+TEST_IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+
+
+def collect_images(paths, repeat):
+    if not paths:
+        paths = [TEST_IMAGES_DIR]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith((".png", ".jpg", ".jpeg", ".bmp")))
+        else:
+            files.append(path)
+    return files * repeat
+
+
+def load_thumbnails(files, **loader_kwargs):
+    # Runs the loader on this thread until every requested thumbnail is done
+    loader = ThumbnailLoader(**loader_kwargs)
+    thumbnails = []
+    loader.thumbnailsLoaded.connect(lambda batch: thumbnails.extend(qimg for _, qimg, *_ in batch))
+    loader.idle.connect(loader.cancel)
+    loader.request((i, path, None) for i, path in enumerate(files))
+    loader.run()
+    return thumbnails
+
+
+def time_import(files, **loader_kwargs):
+    start = time.perf_counter()
+    imported = load_thumbnails(files, **loader_kwargs)
+    elapsed = time.perf_counter() - start
+    return len(imported), elapsed
+
+
+def benchmark_import(files):
+    modes = [
+        ("full decode", {"thumbnail_size": None, "max_workers": 1}),
+        ("thumbnail", {"thumbnail_size": THUMBNAIL_SIZE, "use_exif_thumbnails": False, "max_workers": 1}),
+        ("exif thumbnail", {"thumbnail_size": THUMBNAIL_SIZE, "max_workers": 1}),
+        (f"parallel x{os.cpu_count()}", {"thumbnail_size": THUMBNAIL_SIZE}),
+    ]
+    print(f"Import benchmark: {len(files)} images")
+    for name, kwargs in modes:
+        count, elapsed = time_import(files, **kwargs)
+        print(f"  {name:<20} {count / elapsed:8.1f} images/sec  ({elapsed:.2f} s)")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ThumbnailCache(cache_dir=cache_dir)
+        time_import(files, cache=cache)
+        count, elapsed = time_import(files, cache=cache)
+        print(f"  {'warm cache':<20} {count / elapsed:8.1f} images/sec  ({elapsed:.2f} s)"
+              f"  [{cache.hits} hits, {cache.misses} misses]")
+
+
+def benchmark_duplicates(files, index_size=10000, lookups=1000):
+    thumbnails = [pil_to_qimage(load_thumbnail(path, THUMBNAIL_SIZE)) for path in files]
+    start = time.perf_counter()
+    for qimg in thumbnails:
+        perceptual_hash(qimg)
+    hash_time = (time.perf_counter() - start) / len(thumbnails)
+
+    rng = random.Random(0)
+    index = DuplicateIndex()
+    start = time.perf_counter()
+    for i in range(index_size):
+        index.add(i, rng.getrandbits(64))
+    add_time = time.perf_counter() - start
+    queries = [rng.getrandbits(64) for _ in range(lookups)]
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query)
+    lookup_time = (time.perf_counter() - start) / lookups
+
+    print(f"Duplicate benchmark: {len(files)} thumbnails, index of {index_size} hashes")
+    print(f"  {'hash':<20} {hash_time * 1000:8.3f} ms/image")
+    print(f"  {'index build':<20} {add_time * 1000:8.1f} ms")
+    print(f"  {'lookup':<20} {lookup_time * 1000:8.3f} ms")
+
+
+def benchmark_quality(files, wave=8):
+    # The whole cost of scoring is the difference between the two imports:
+    # the luma copy of the thumbnail's decode plus the NumPy scoring. Best
+    # of two runs each, so the first one does not pay for the warm-up
+    count = len(files)
+    plain_time = min(time_import(files, use_exif_thumbnails=False, max_workers=1, score_quality=False)[1]
+                     for _ in range(2))
+    scored_time = min(time_import(files, use_exif_thumbnails=False, max_workers=1)[1] for _ in range(2))
+
+    lumas = [load_thumbnail(path, THUMBNAIL_SIZE, QUALITY_SIZE)[1] for path in files]
+    start = time.perf_counter()
+    for i in range(0, len(lumas), wave):
+        image_quality_scores(lumas[i:i + wave])
+    score_time = time.perf_counter() - start
+
+    print(f"Quality benchmark: {count} images, scored in waves of {wave}")
+    print(f"  {'import':<20} {plain_time / count * 1000:8.3f} ms/image")
+    print(f"  {'import + scoring':<20} {scored_time / count * 1000:8.3f} ms/image"
+          f"  (+{(scored_time - plain_time) / plain_time * 100:.1f}% of import)")
+    print(f"  {'of which NumPy':<20} {score_time / count * 1000:8.3f} ms/image")
+
+
+def time_pdf(files, **worker_kwargs):
+    briefkopf_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "briefkopf.png")
+    with tempfile.TemporaryDirectory() as output_folder:
+        worker = PDFCreationWorker(files, "12345", "UB", "01", os.path.join(output_folder, "benchmark.pdf"),
+                                   briefkopf_path, output_folder, **worker_kwargs)
+        errors = []
+        worker.errorOccurred.connect(errors.append)
+        start = time.perf_counter()
+        worker.run()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise RuntimeError(errors[0])
+        return worker, elapsed, os.path.getsize(os.path.join(output_folder, "benchmark.pdf"))
+
+
+def benchmark_pdf(files):
+    print(f"PDF benchmark: {len(files)} images")
+    workers = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+    baseline = None
+    for max_workers in workers:
+        worker, elapsed, _ = time_pdf(files, max_workers=max_workers)
+        baseline = baseline or elapsed
+        stalls = ", ".join(f"{stage} {seconds:.2f} s" for stage, seconds in worker.stage_stalls.items())
+        print(f"  {f'{max_workers} processes':<20} {len(files) / elapsed:8.1f} images/sec  ({elapsed:.2f} s, "
+              f"x{baseline / elapsed:.2f})  [stalls: {stalls}]")
+    for export_mode in ("upright", "copy"):
+        worker, elapsed, _ = time_pdf(files, export_mode=export_mode)
+        print(f"  {f'export {export_mode}':<20} {len(files) / elapsed:8.1f} images/sec  ({elapsed:.2f} s)"
+              f"  [{worker.exportSummary()}]")
+
+
+def benchmark_transform(files):
+    sources = []
+    for path in files:
+        with open(path, "rb") as f:
+            sources.append(f.read())
+    print(f"Rotate benchmark: {len(sources)} JPEGs, rotated by 90 degrees")
+
+    start = time.perf_counter()
+    for data in sources:
+        with Image.open(BytesIO(data)) as img:
+            img.transpose(Image.Transpose.ROTATE_270).save(BytesIO(), "JPEG", quality=85)
+    reencode_time = time.perf_counter() - start
+    print(f"  {'decode + encode':<20} {len(sources) / reencode_time:8.1f} images/sec  ({reencode_time:.2f} s)")
+
+    if find_jpegtran() is None:
+        print("  jpegtran not found, skipping the lossless transform")
+        return
+    start = time.perf_counter()
+    for data in sources:
+        lossless_jpeg_transform(data, 6)
+    lossless_time = time.perf_counter() - start
+    print(f"  {'jpegtran':<20} {len(sources) / lossless_time:8.1f} images/sec  ({lossless_time:.2f} s, "
+          f"x{reencode_time / lossless_time:.2f})")
+
+
+def benchmark_profiles(files):
+    print(f"Profile benchmark: {len(files)} images")
+    for profile, dpi in PDF_PROFILES.items():
+        _, elapsed, size = time_pdf(files, profile=profile)
+        name = f"{profile} ({dpi} dpi)" if dpi else f"{profile} (original)"
+        print(f"  {name:<20} {size / 1e6:8.1f} MB  ({elapsed:.2f} s)")
+
+
+def peak_memory(path, export_mode):
+    # Runs in a fresh process; ru_maxrss is the high-water mark in KiB on Linux
+    with tempfile.TemporaryDirectory() as output_folder:
+        final_path = os.path.join(output_folder, "export" + os.path.splitext(path)[1])
+        with open(path, "rb") as f:
+            data = f.read()
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        prepare_image(path, final_path, data, export_mode)
+        return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024
+
+
+def benchmark_memory(files):
+    files = sorted(set(files))
+    print(f"Memory benchmark: {len(files)} images, peak RSS growth of one preparation")
+    context = multiprocessing.get_context("spawn")
+    for export_mode in ("upright", "copy"):
+        peaks = []
+        for path in files:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                peaks.append(pool.submit(peak_memory, path, export_mode).result())
+        print(f"  {f'export {export_mode}':<20} {max(peaks):8.1f} MB max  ({sum(peaks) / len(peaks):.1f} MB mean)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF Creator benchmarks")
+    parser.add_argument("benchmark", choices=["import", "duplicates", "quality", "pdf", "transform", "memory", "profiles"])
+    parser.add_argument("paths", nargs="*", help="image files or folders (default: test/images)")
+    parser.add_argument("--repeat", type=int, default=10, help="repeat the image list N times")
+    args = parser.parse_args()
+
+    files = collect_images(args.paths, args.repeat)
+    if args.benchmark == "import":
+        benchmark_import(files)
+    elif args.benchmark == "duplicates":
+        benchmark_duplicates(files)
+    elif args.benchmark == "quality":
+        benchmark_quality(files)
+    elif args.benchmark == "pdf":
+        benchmark_pdf(files)
+    elif args.benchmark == "transform":
+        benchmark_transform(files)
+    elif args.benchmark == "memory":
+        benchmark_memory(files)
+    elif args.benchmark == "profiles":
+        benchmark_profiles(files)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QPixmap
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from pdf_creator import ImageUploader
+from pdf_creator import ImageUploader, ImageRecord, ThumbnailCache
 
 class TestFunctional(unittest.TestCase):
     @classmethod
@@ -20,7 +20,7 @@ class TestFunctional(unittest.TestCase):
         self.test_output_dir = tempfile.mkdtemp()
         self.test_images_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
         
-        self.ui = ImageUploader()
+        self.ui = ImageUploader(ThumbnailCache(os.path.join(self.test_output_dir, "thumbnails")))
         
     def tearDown(self):
         shutil.rmtree(self.test_output_dir)
@@ -36,11 +36,7 @@ class TestFunctional(unittest.TestCase):
             os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 03.JPG")
         ]
         
-        for img_path in test_images:
-            from PyQt6.QtWidgets import QFrame
-            mock_frame = QFrame()
-            mock_pixmap = QPixmap(img_path)
-            self.ui.images.append((mock_frame, img_path, mock_pixmap))
+        self.ui.image_model.appendRecords([ImageRecord(img_path, QPixmap(img_path)) for img_path in test_images])
         
         self.ui.updateImageCounter()
         self.ui.updatePdfButtonState()
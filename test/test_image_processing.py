@@ -1,13 +1,80 @@
 import unittest
+import gc
 import os
 import shutil
 from PIL import Image, ImageOps
 import sys
 import tempfile
+import struct
+from io import BytesIO
 
 # Add the parent directory to the path so we can import the pdf_creator module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from pdf_creator import PDFCreationWorker
+from pdf_creator import (
+    PDFCreationWorker, ThumbnailLoader, ThumbnailCache, load_thumbnail, load_exif_thumbnail,
+    pil_to_qimage, perceptual_hash, DuplicateIndex, DUPLICATE_MAX_DISTANCE, ImageMeta, read_image_meta,
+    image_quality_scores, set_jpeg_orientation, strip_jpeg_metadata, plan_size_budget, jpeg_rate_probes,
+    predicted_jpeg_size, BUDGET_LADDER, THUMBNAIL_SIZE, QUALITY_SIZE, can_pass_through,
+    PASSTHROUGH_TOLERANCE, snap_crop_box, find_jpegtran, lossless_jpeg_transform, crop_box_4_3, prepare_pdf_image
+)
+
+
+def load_thumbnail_from_image(image):
+    copy = image.copy()
+    copy.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return copy
+
+
+def swapped_primaries_profile():
+    # An RGB profile that is not sRGB: sRGB with red and green exchanged
+    from PIL import ImageCms
+    icc = bytearray(ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes())
+    count = struct.unpack(">I", icc[128:132])[0]
+    entries = {bytes(icc[132 + 12 * i:136 + 12 * i]): 132 + 12 * i for i in range(count)}
+    red, green = entries[b"rXYZ"], entries[b"gXYZ"]
+    icc[red + 4:red + 12], icc[green + 4:green + 12] = icc[green + 4:green + 12], icc[red + 4:red + 12]
+    return bytes(icc).replace("sRGB".encode("utf-16-be"), "Test".encode("utf-16-be"))
+
+
+def encode_jpeg_for_test(image, quality):
+    buf = BytesIO()
+    image.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def fake_jpegtran(args, input, capture_output, check):
+    """Stand in for jpegtran by transforming in the pixel domain, keeping the EXIF block like -copy all."""
+    import subprocess
+    transforms = {("-rotate", "90"): Image.Transpose.ROTATE_270, ("-rotate", "180"): Image.Transpose.ROTATE_180,
+                  ("-rotate", "270"): Image.Transpose.ROTATE_90, ("-flip", "horizontal"): Image.Transpose.FLIP_LEFT_RIGHT,
+                  ("-flip", "vertical"): Image.Transpose.FLIP_TOP_BOTTOM}
+    with Image.open(BytesIO(input)) as img:
+        exif = img.info.get("exif", b"")
+        result = img.copy()
+    for i, arg in enumerate(args):
+        if (arg, args[i + 1] if i + 1 < len(args) else None) in transforms:
+            result = result.transpose(transforms[(arg, args[i + 1])])
+        elif arg == "-crop":
+            size, left, top = args[i + 1].split("+")
+            width, height = (int(v) for v in size.split("x"))
+            result = result.crop((int(left), int(top), int(left) + width, int(top) + height))
+    out = BytesIO()
+    result.save(out, "JPEG", quality=95, exif=exif)
+    return subprocess.CompletedProcess(args, 0, out.getvalue(), b"")
+
+
+def save_jpeg_with_exif_thumbnail(path, image, thumbnail, orientation=1):
+    """Save a JPEG whose EXIF block carries an embedded preview in IFD1, like camera files do."""
+    buf = BytesIO()
+    thumbnail.save(buf, format="JPEG")
+    thumb_data = buf.getvalue()
+    # TIFF header, IFD0 with the orientation tag, IFD1 pointing to the preview
+    ifd0 = struct.pack("<H", 1) + struct.pack("<HHIHH", 0x0112, 3, 1, orientation, 0) + struct.pack("<I", 26)
+    ifd1 = (struct.pack("<H", 2) + struct.pack("<HHII", 0x0201, 4, 1, 56)
+            + struct.pack("<HHII", 0x0202, 4, 1, len(thumb_data)) + struct.pack("<I", 0))
+    tiff = b"II*\x00" + struct.pack("<I", 8) + ifd0 + ifd1 + thumb_data
+    image.save(path, format="JPEG", exif=b"Exif\x00\x00" + tiff)
+
 
 class TestImageProcessing(unittest.TestCase):
     def setUp(self):
@@ -59,11 +126,10 @@ class TestImageProcessing(unittest.TestCase):
         
         # Process a test image
         test_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 04.JPG")
-        processed_path = worker.processImage(test_image_path, 1)
+        processed = worker.processImage(test_image_path, 1)
         
-        # Verify the processed image exists
-        self.assertTrue(os.path.exists(processed_path), 
-                       f"Processed image should exist at {processed_path}")
+        # Verify the processed image was handed back
+        self.assertIsNotNone(processed, "Processed image should be returned")
         
         # Verify the original image was saved to the output folder
         expected_output_path = os.path.join(self.test_output_dir, "12345-UB-01 Foto Nr. 1.JPG")
@@ -71,7 +137,7 @@ class TestImageProcessing(unittest.TestCase):
                        f"Original image should be saved at {expected_output_path}")
         
         # Verify the image orientation is correct
-        with Image.open(processed_path) as img:
+        with processed.open() as img:
             width, height = img.size
             # The processed image should maintain proper orientation
             if not worker.is_horizontal(test_image_path):
@@ -102,7 +168,7 @@ class TestImageProcessing(unittest.TestCase):
         
         for i, img_name in enumerate(test_images):
             test_image_path = os.path.join(self.test_images_dir, img_name)
-            processed_path = worker.processImage(test_image_path, i+1)
+            processed = worker.processImage(test_image_path, i+1)
             
             # Open the original image with EXIF orientation applied
             with Image.open(test_image_path) as original:
@@ -111,8 +177,8 @@ class TestImageProcessing(unittest.TestCase):
                 original_orientation = "vertical" if original_height > original_width else "horizontal"
             
             # Open the processed image
-            with Image.open(processed_path) as processed:
-                processed_width, processed_height = processed.size
+            with processed.open() as processed_img:
+                processed_width, processed_height = processed_img.size
                 processed_orientation = "vertical" if processed_height > processed_width else "horizontal"
             
             # The orientation should be preserved
@@ -134,10 +200,10 @@ class TestImageProcessing(unittest.TestCase):
         
         # Process a test image
         test_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
-        processed_path = worker.processImage(test_image_path, 1)
+        processed = worker.processImage(test_image_path, 1)
         
         # Check if the processed image is properly sized
-        with Image.open(processed_path) as img:
+        with processed.open() as img:
             width, height = img.size
             max_side = max(width, height)
             self.assertLessEqual(max_side, 2000, 
@@ -163,10 +229,10 @@ class TestImageProcessing(unittest.TestCase):
         ]
         
         for i, img_path in enumerate(horizontal_images):
-            processed_path = worker.processImage(img_path, i+1)
+            processed = worker.processImage(img_path, i+1)
             
             # Check if the processed image has the correct aspect ratio
-            with Image.open(processed_path) as img:
+            with processed.open() as img:
                 width, height = img.size
                 aspect_ratio = width / height
                 
@@ -202,13 +268,13 @@ class TestImageProcessing(unittest.TestCase):
         test_image = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
         
         # Process with normal dokumentenkürzel
-        processed_path1 = worker1.processImage(test_image, 1)
+        worker1.processImage(test_image, 1)
         expected_path1 = os.path.join(self.test_output_dir, "12345-UB-01 Foto Nr. 1.JPG")
         self.assertTrue(os.path.exists(expected_path1), 
                        "Image should be saved with dokumentenkürzel in the filename")
         
         # Process with placeholder dokumentenkürzel
-        processed_path2 = worker2.processImage(test_image, 2)
+        worker2.processImage(test_image, 2)
         expected_path2 = os.path.join(self.test_output_dir, "12345-01 Foto Nr. 2.JPG")
         self.assertTrue(os.path.exists(expected_path2), 
                        "Image should be saved without dokumentenkürzel in the filename")
@@ -232,10 +298,10 @@ class TestImageProcessing(unittest.TestCase):
         test_image.save(test_image_path)
         
         # Process the RGBA image
-        processed_path = worker.processImage(test_image_path, 1)
+        processed = worker.processImage(test_image_path, 1)
         
         # Verify the processed image exists and has been converted to RGB
-        with Image.open(processed_path) as img:
+        with processed.open() as img:
             self.assertEqual(img.mode, "RGB", "RGBA image should be converted to RGB")
     
     def test_error_handling_invalid_image(self):
@@ -256,10 +322,499 @@ class TestImageProcessing(unittest.TestCase):
         with open(invalid_image_path, 'w') as f:
             f.write("This is not an image file")
         
-        # Process should return the original path for invalid images
-        result_path = worker.processImage(invalid_image_path, 1)
-        self.assertEqual(result_path, invalid_image_path, 
-                       "For invalid images, the original path should be returned")
+        # Process should return no prepared image for invalid images
+        result = worker.processImage(invalid_image_path, 1)
+        self.assertIsNone(result, "For invalid images, no prepared image should be returned")
+
+    def test_load_thumbnail(self):
+        """Test that thumbnails are decoded at reduced size and keep their orientation."""
+        horizontal_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
+        vertical_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 03.JPG")
+
+        thumb = load_thumbnail(horizontal_image_path)
+        self.assertEqual(max(thumb.size), THUMBNAIL_SIZE,
+                         "Thumbnail long side should match the grid size")
+        self.assertGreater(thumb.width, thumb.height, "Horizontal thumbnail should stay horizontal")
+
+        thumb = load_thumbnail(vertical_image_path)
+        self.assertGreater(thumb.height, thumb.width, "Vertical thumbnail should stay vertical")
+
+    def test_load_thumbnail_exif_orientation(self):
+        """Test that the EXIF orientation is applied to the reduced-size thumbnail."""
+        image = Image.new('RGB', (800, 400), (0, 128, 255))
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Rotate 90 degrees clockwise when displayed
+        image_path = os.path.join(self.test_output_dir, "rotated.jpg")
+        image.save(image_path, exif=exif)
+
+        thumb = load_thumbnail(image_path)
+        self.assertEqual(thumb.size, (THUMBNAIL_SIZE // 2, THUMBNAIL_SIZE),
+                         "Thumbnail should be rotated according to the EXIF orientation")
+
+    def test_load_exif_thumbnail(self):
+        """Test that the embedded EXIF preview is used and rotated by the orientation tag."""
+        image = Image.new('RGB', (1600, 1200), (0, 0, 255))
+        thumbnail = Image.new('RGB', (160, 120), (255, 0, 0))
+        image_path = os.path.join(self.test_output_dir, "camera.jpg")
+        save_jpeg_with_exif_thumbnail(image_path, image, thumbnail, orientation=6)
+
+        thumb = load_exif_thumbnail(image_path)
+        self.assertIsNotNone(thumb, "Embedded preview should be used")
+        self.assertEqual(thumb.size, (90, THUMBNAIL_SIZE),
+                         "Embedded preview should be rotated and scaled to the grid size")
+        red, green, blue = thumb.getpixel((45, 60))
+        self.assertGreater(red, 200, "Thumbnail should come from the embedded preview, not the main image")
+        self.assertLess(blue, 50, "Thumbnail should come from the embedded preview, not the main image")
+        _, luma = load_exif_thumbnail(image_path, luma_size=QUALITY_SIZE)
+        self.assertEqual(luma.shape, (120, 160), "The fast path should be scored on the preview")
+
+    def test_load_exif_thumbnail_fallback(self):
+        """Test that unusable embedded previews are rejected so the importer decodes the image."""
+        image = Image.new('RGB', (1600, 900), (0, 0, 255))
+        letterboxed = Image.new('RGB', (160, 120), (255, 0, 0))
+        image_path = os.path.join(self.test_output_dir, "widescreen.jpg")
+        save_jpeg_with_exif_thumbnail(image_path, image, letterboxed)
+        self.assertIsNone(load_exif_thumbnail(image_path),
+                          "Preview with a different aspect ratio should not be used")
+
+        image = Image.new('RGB', (1600, 1200), (0, 0, 255))
+        tiny = Image.new('RGB', (80, 60), (255, 0, 0))
+        image_path = os.path.join(self.test_output_dir, "tiny_preview.jpg")
+        save_jpeg_with_exif_thumbnail(image_path, image, tiny)
+        self.assertIsNone(load_exif_thumbnail(image_path),
+                          "Preview smaller than the grid should not be used")
+
+        image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
+        self.assertIsNone(load_exif_thumbnail(image_path),
+                          "Images without an embedded preview should fall back to decoding")
+
+    def test_pil_to_qimage(self):
+        """Test that Pillow pixels are handed to Qt with the correct stride and format."""
+        # An odd width makes the packed RGB rows unaligned
+        image = Image.new('RGB', (7, 3), (10, 20, 30))
+        image.putpixel((6, 2), (200, 100, 50))
+        qimage = pil_to_qimage(image)
+        # The QImage must keep its pixel buffer alive on its own
+        del image
+        gc.collect()
+        [bytes(7 * 3 * 3) for _ in range(100)]
+        self.assertEqual((qimage.width(), qimage.height()), (7, 3))
+        self.assertEqual(qimage.pixelColor(0, 0).getRgb(), (10, 20, 30, 255))
+        self.assertEqual(qimage.pixelColor(6, 2).getRgb(), (200, 100, 50, 255))
+
+        qimage = pil_to_qimage(Image.new('RGBA', (5, 5), (255, 0, 0, 128)))
+        self.assertEqual(qimage.pixelColor(2, 2).getRgb(), (255, 0, 0, 128))
+
+        qimage = pil_to_qimage(Image.new('L', (5, 5), 77))
+        self.assertEqual(qimage.pixelColor(4, 4).getRgb(), (77, 77, 77, 255))
+
+    def test_thumbnail_cache(self):
+        """Test that cached thumbnails are reused and invalidated when the file changes."""
+        cache = ThumbnailCache(cache_dir=os.path.join(self.test_output_dir, "cache"))
+        image_path = os.path.join(self.test_output_dir, "photo.jpg")
+        Image.new('RGB', (400, 300), (0, 128, 255)).save(image_path)
+
+        self.assertIsNone(cache.get(image_path, THUMBNAIL_SIZE), "Empty cache should miss")
+        cache.put(image_path, THUMBNAIL_SIZE, pil_to_qimage(load_thumbnail(image_path)))
+        cached = cache.get(image_path, THUMBNAIL_SIZE)
+        self.assertIsNotNone(cached, "Stored thumbnail should be found")
+        self.assertEqual((cached.width(), cached.height()), (THUMBNAIL_SIZE, 90))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        os.utime(image_path, ns=(0, 0))
+        self.assertIsNone(cache.get(image_path, THUMBNAIL_SIZE),
+                          "Changing the modification time should invalidate the entry")
+
+    def test_thumbnail_cache_lru_eviction(self):
+        """Test that the least recently used entries are evicted when the cache is full."""
+        cache_dir = os.path.join(self.test_output_dir, "cache")
+        cache = ThumbnailCache(cache_dir=cache_dir)
+        qimage = pil_to_qimage(Image.new('RGB', (THUMBNAIL_SIZE, 90), (0, 128, 255)))
+        image_paths = []
+        for i in range(3):
+            image_path = os.path.join(self.test_output_dir, f"photo_{i}.jpg")
+            Image.new('RGB', (40, 30)).save(image_path)
+            image_paths.append(image_path)
+            cache.put(image_path, THUMBNAIL_SIZE, qimage)
+            entry_path = cache.entryPath(cache.key(image_path, THUMBNAIL_SIZE))
+            os.utime(entry_path, ns=(i * 10 ** 9, i * 10 ** 9))
+
+        # Touch the oldest entry so the second one becomes least recently used
+        self.assertIsNotNone(cache.get(image_paths[0], THUMBNAIL_SIZE))
+        entry_size = os.path.getsize(cache.entryPath(cache.key(image_paths[0], THUMBNAIL_SIZE)))
+        # Room for two entries after trimming to 90% of the cap
+        cache.max_bytes = int(entry_size * 2.5)
+        cache.evict()
+
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNotNone(cache.get(image_paths[0], THUMBNAIL_SIZE), "Recently used entry should stay")
+        self.assertIsNone(cache.get(image_paths[1], THUMBNAIL_SIZE), "Least recently used entry should be evicted")
+        self.assertIsNotNone(cache.get(image_paths[2], THUMBNAIL_SIZE), "Newest entry should stay")
+
+    def test_thumbnail_loader_uses_thumbnail_cache(self):
+        """Test that a second import is served from the thumbnail cache, quality scores included."""
+        from unittest import mock
+        cache = ThumbnailCache(cache_dir=os.path.join(self.test_output_dir, "cache"))
+        test_images = [os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG"),
+                       os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 03.JPG")]
+
+        metas = {}
+        qualities = []
+        for _ in range(2):
+            loader = ThumbnailLoader(cache=cache, max_workers=1)
+            imported = []
+            scores = {}
+            loader.thumbnailsLoaded.connect(lambda batch: imported.extend(qimage for _, qimage, *_ in batch))
+            loader.thumbnailsLoaded.connect(lambda batch: metas.update((key, meta) for key, _, _, meta, _ in batch))
+            loader.thumbnailsLoaded.connect(lambda batch: scores.update((key, q) for key, *_, q in batch))
+            loader.idle.connect(loader.cancel)
+            loader.request((i, path, metas.get(i)) for i, path in enumerate(test_images))
+            with mock.patch("pdf_creator.read_image_meta", wraps=read_image_meta) as read_meta, \
+                    mock.patch("pdf_creator.Image.open", wraps=Image.open) as pillow_open:
+                loader.run()
+            self.assertEqual(len(imported), len(test_images))
+            qualities.append([scores[i].to_text() for i in range(len(test_images))])
+
+        self.assertEqual((cache.hits, cache.misses), (2, 2), "Second import should only hit the cache")
+        self.assertEqual(read_meta.call_count, 0, "Known image metadata should not be read again")
+        self.assertEqual(pillow_open.call_count, 0, "A cache hit should not open the image")
+        self.assertEqual(qualities[1], qualities[0], "Quality scores should come from the cache")
+        self.assertGreater(imported[1].height(), imported[1].width(),
+                           "Cached thumbnails should keep their orientation")
+
+    def test_perceptual_hash(self):
+        """Test that resized copies hash close together and different pictures do not."""
+        gradient = Image.linear_gradient("L").resize((400, 300)).convert("RGB")
+        scene = Image.new("RGB", (400, 300), "white")
+        scene.paste(gradient.crop((0, 0, 200, 300)), (0, 0))
+        other = ImageOps.mirror(scene)
+
+        original_hash = perceptual_hash(pil_to_qimage(load_thumbnail_from_image(scene)))
+        resized_hash = perceptual_hash(pil_to_qimage(scene.resize((120, 90))))
+        other_hash = perceptual_hash(pil_to_qimage(other))
+
+        self.assertLessEqual((original_hash ^ resized_hash).bit_count(), DUPLICATE_MAX_DISTANCE,
+                             "A resized copy should be a near duplicate")
+        self.assertGreater((original_hash ^ other_hash).bit_count(), DUPLICATE_MAX_DISTANCE,
+                           "A different picture should not be a duplicate")
+
+    def test_duplicate_index(self):
+        """Test that index lookups find exactly the hashes within the distance."""
+        import random
+        rng = random.Random(7)
+        hashes = {f"id{i}": rng.getrandbits(64) for i in range(2000)}
+        index = DuplicateIndex()
+        for key, value in hashes.items():
+            index.add(key, value)
+        index.remove("id5")
+
+        for _ in range(50):
+            query = rng.getrandbits(64)
+            if rng.random() < 0.5:
+                query = hashes[rng.choice(list(hashes))] ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+            expected = sorted(((query ^ value).bit_count(), key) for key, value in hashes.items()
+                              if key != "id5" and (query ^ value).bit_count() <= DUPLICATE_MAX_DISTANCE)
+            self.assertEqual(index.search(query), expected, "Search should match a linear scan")
+        self.assertEqual(len(index), 1999)
+
+    def test_read_image_meta(self):
+        """Test that metadata comes from the header and EXIF orientation without decoding pixels."""
+        from unittest import mock
+        image = Image.new("RGB", (400, 300), "white")
+        rotated_path = os.path.join(self.test_output_dir, "rotated.jpg")
+        save_jpeg_with_exif_thumbnail(rotated_path, image, image.resize((160, 120)), orientation=6)
+
+        with mock.patch.object(Image.Image, "load", side_effect=AssertionError("pixels decoded")):
+            meta = read_image_meta(rotated_path)
+        self.assertEqual((meta.width, meta.height, meta.orientation, meta.format), (400, 300, 6, "JPEG"))
+        self.assertEqual(meta.display_size, (300, 400), "Orientation 6 should swap the sides")
+        self.assertFalse(meta.is_horizontal, "A rotated landscape shot should be treated as portrait")
+        st = os.stat(rotated_path)
+        self.assertEqual((meta.size, meta.mtime), (st.st_size, st.st_mtime))
+        with self.assertRaises(AttributeError):
+            meta.extra = 1
+
+    def test_read_image_meta_capture_time(self):
+        """Test that the capture time comes from DateTimeOriginal, with DateTime as fallback."""
+        exif = Image.Exif()
+        exif[0x0132] = "2022:01:01 08:00:00"
+        exif[0x8769] = {0x9003: "2021:05:01 10:30:00"}
+        path = os.path.join(self.test_output_dir, "taken.jpg")
+        Image.new("RGB", (40, 30)).save(path, exif=exif)
+        self.assertEqual(read_image_meta(path).taken, "2021:05:01 10:30:00")
+
+        del exif[0x8769]
+        Image.new("RGB", (40, 30)).save(path, exif=exif)
+        self.assertEqual(read_image_meta(path).taken, "2022:01:01 08:00:00")
+        Image.new("RGB", (40, 30)).save(path)
+        self.assertIsNone(read_image_meta(path).taken)
+
+    def test_image_quality_scores(self):
+        """Test that sharpness and exposure scores separate sharp, blurred and badly exposed images."""
+        import numpy as np
+        from unittest import mock
+        from PIL import ImageFilter
+        scene = Image.effect_noise((640, 480), 60).convert("RGB")
+        blurred = scene.filter(ImageFilter.GaussianBlur(3))
+        dark = Image.new("RGB", (640, 480), (5, 5, 5))
+        bright = Image.new("RGB", (480, 640), (250, 250, 250))
+
+        sharp_score, blurred_score, dark_score, bright_score = image_quality_scores(
+            [np.asarray(image.convert("L")) for image in (scene, blurred, dark, bright)])
+
+        self.assertGreater(sharp_score.sharpness, 10 * blurred_score.sharpness, "Blur should lower the sharpness")
+        self.assertFalse(sharp_score.is_blurry)
+        self.assertTrue(blurred_score.is_blurry)
+        self.assertIsNone(sharp_score.exposure)
+        self.assertEqual(dark_score.exposure, "dark")
+        self.assertEqual(bright_score.exposure, "bright", "Images of another shape should be scored too")
+
+        image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
+        with mock.patch("pdf_creator.Image.open", wraps=Image.open) as pillow_open:
+            thumb, luma = load_thumbnail(image_path, THUMBNAIL_SIZE, QUALITY_SIZE)
+        self.assertEqual(pillow_open.call_count, 1, "The luma should come from the thumbnail's decode")
+        self.assertEqual(thumb.size, load_thumbnail(image_path).size)
+        self.assertEqual(luma.shape, (3024 // 8, 4032 // 8),
+                         "Quality should be scored on the draft decode, not the thumbnail")
+
+    def test_grouping_uses_import_metadata(self):
+        """Test that the PDF worker groups by the metadata it was given and only reads what is missing."""
+        from unittest import mock
+        import pdf_creator
+        paths = [os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")] * 3
+        worker = PDFCreationWorker(
+            image_paths=paths,
+            aktennummer="12345",
+            dokumentenkürzel="UB",
+            dokumentenzahl="01",
+            pdf_path="test.pdf",
+            briefkopf_path=self.briefkopf_path,
+            output_folder=self.test_output_dir,
+            image_meta=[ImageMeta(3000, 4000), ImageMeta(4000, 3000), None]
+        )
+        with mock.patch.object(pdf_creator, "read_image_meta", wraps=read_image_meta) as read:
+            grouped = worker.groupImages()
+        self.assertEqual([len(group) for group in grouped], [1, 2], "Known portrait alone, then a landscape pair")
+        self.assertEqual(read.call_count, 1, "Only the image without metadata should be read")
+
+    def test_set_jpeg_orientation(self):
+        """Test that the orientation tag is rewritten in place without touching the image data."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buf = BytesIO()
+        Image.new("RGB", (40, 30), (10, 120, 200)).save(buf, "JPEG", exif=exif)
+        big_endian = buf.getvalue()
+        little_endian_path = os.path.join(self.test_output_dir, "little.jpg")
+        save_jpeg_with_exif_thumbnail(little_endian_path, Image.new("RGB", (40, 30)), Image.new("RGB", (8, 6)), 8)
+        with open(little_endian_path, "rb") as f:
+            little_endian = f.read()
+
+        for data in (big_endian, little_endian):
+            patched = set_jpeg_orientation(data, 1)
+            self.assertEqual(len(patched), len(data), "Only the tag value should change")
+            self.assertEqual(sum(a != b for a, b in zip(patched, data)), 1)
+            with Image.open(BytesIO(patched)) as img:
+                self.assertEqual(img.getexif()[0x0112], 1)
+        without_exif = BytesIO()
+        Image.new("RGB", (40, 30)).save(without_exif, "JPEG")
+        self.assertEqual(set_jpeg_orientation(without_exif.getvalue(), 1), without_exif.getvalue(),
+                         "JPEGs without an orientation tag should be left alone")
+
+    def test_lossless_jpeg_transform(self):
+        """Test that JPEGs needing no downscale are rotated and cropped by jpegtran instead of re-encoded."""
+        from unittest import mock
+        import pdf_creator
+        rotated_path = os.path.join(self.test_output_dir, "rotated.jpg")
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        Image.new("RGB", (400, 300), (30, 200, 30)).save(rotated_path, exif=exif)
+        square_path = os.path.join(self.test_output_dir, "square.jpg")
+        Image.new("RGB", (400, 360), (200, 30, 30)).save(square_path)
+        worker = PDFCreationWorker(
+            image_paths=[],
+            aktennummer="12345",
+            dokumentenkürzel="UB",
+            dokumentenzahl="01",
+            pdf_path="test.pdf",
+            briefkopf_path=self.briefkopf_path,
+            output_folder=self.test_output_dir,
+            export_mode="upright"
+        )
+
+        with mock.patch.object(pdf_creator, "find_jpegtran", return_value="jpegtran"), \
+                mock.patch.object(pdf_creator.subprocess, "run", side_effect=fake_jpegtran) as run:
+            rotated = worker.processImage(rotated_path, 1)
+            square = worker.processImage(square_path, 2)
+
+        self.assertEqual(run.call_args_list[0].args[0],
+                         ["jpegtran", "-copy", "all", "-perfect", "-rotate", "90"])
+        self.assertTrue(rotated.dct_transformed)
+        with open(os.path.join(self.test_output_dir, "12345-UB-01 Foto Nr. 1.jpg"), "rb") as f:
+            exported = f.read()
+        self.assertEqual(rotated.data, strip_jpeg_metadata(exported),
+                         "Export and PDF copy should share the transformed JPEG")
+        with Image.open(BytesIO(exported)) as img:
+            self.assertEqual(img.size, (300, 400))
+            self.assertEqual(img.getexif()[0x0112], 1, "The transformed JPEG should be tagged upright")
+
+        # 4:2:0 snaps to 16 px: the centred offset 30 moves to 32, not back to 16
+        self.assertEqual(run.call_args_list[1].args[0][-2:], ["-crop", "400x300+0+32"])
+        self.assertTrue(square.dct_transformed)
+        self.assertEqual((square.width, square.height), (400, 300))
+
+        with mock.patch.object(pdf_creator, "find_jpegtran", return_value=None):
+            fallback = worker.processImage(rotated_path, 3)
+        self.assertFalse(fallback.dct_transformed, "Without jpegtran the image should be re-encoded")
+        self.assertEqual((fallback.width, fallback.height), (300, 400))
+
+    def test_snap_crop_box(self):
+        """Test that MCU-aligned crops stay as close to the centre as the grid allows."""
+        self.assertEqual(snap_crop_box((0, 30, 400, 330), 400, 360, (16, 16)), (0, 32, 400, 332))
+        self.assertEqual(snap_crop_box((0, 4, 400, 304), 400, 310, (16, 16)), (0, 0, 400, 300))
+        self.assertEqual(snap_crop_box((3, 7, 303, 307), 306, 314, (8, 8)), (0, 8, 300, 308))
+
+    def test_find_bundled_jpegtran(self):
+        """Test that the packaged app uses the jpegtran bundled with it."""
+        from unittest import mock
+        bundled = os.path.join(self.test_output_dir, "bin", "jpegtran")
+        os.makedirs(os.path.dirname(bundled))
+        open(bundled, "wb").close()
+        with mock.patch.object(sys, "frozen", True, create=True), \
+                mock.patch.object(sys, "_MEIPASS", self.test_output_dir, create=True):
+            self.assertEqual(find_jpegtran(), bundled)
+
+    def test_passthrough_tolerance(self):
+        """Test that JPEGs somewhat larger than their slot keep their scan data within the profile's tolerance."""
+        buf = BytesIO()
+        Image.new("RGB", (300, 400), (10, 120, 200)).save(buf, "JPEG")
+        with Image.open(buf) as img:
+            self.assertTrue(can_pass_through(img, (300, 400)))
+            self.assertFalse(can_pass_through(img, (240, 320)), "Without tolerance any downscale re-encodes")
+            self.assertTrue(can_pass_through(img, (240, 320), PASSTHROUGH_TOLERANCE["print"]))
+            self.assertFalse(can_pass_through(img, (150, 200), PASSTHROUGH_TOLERANCE["print"]),
+                             "Photos far beyond the slot should still be resampled")
+
+    def test_strip_jpeg_metadata(self):
+        """Test that EXIF and ICC segments are dropped from embedded copies without touching the image data."""
+        image = Image.new("RGB", (64, 48), (10, 120, 200))
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buf = BytesIO()
+        image.save(buf, "JPEG", exif=exif, icc_profile=b"\0" * 2000)
+        plain = BytesIO()
+        image.save(plain, "JPEG")
+
+        stripped = strip_jpeg_metadata(buf.getvalue())
+        self.assertEqual(stripped, plain.getvalue(), "Only the metadata segments should differ")
+        with Image.open(BytesIO(stripped)) as img:
+            self.assertNotIn(0x0112, img.getexif())
+            self.assertNotIn("icc_profile", img.info)
+
+    def test_foreign_icc_profile(self):
+        """Test that photos with a non-sRGB profile are converted to sRGB instead of losing the profile."""
+        from PIL import ImageCms
+        srgb = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+        image = Image.new("RGB", (64, 48), (200, 30, 30))
+        cases = ((srgb, True, (200, 30, 30)), (swapped_primaries_profile(), False, (30, 200, 30)))
+        for icc, passthrough, color in cases:
+            buf = BytesIO()
+            image.save(buf, "JPEG", quality=95, icc_profile=icc)
+            prepared = prepare_pdf_image("photo.jpg", None, buf.getvalue(), target_size=(64, 48))
+            self.assertEqual(prepared.passthrough, passthrough)
+            with prepared.open() as img:
+                self.assertNotIn("icc_profile", img.info)
+                for actual, expected in zip(img.getpixel((32, 24)), color):
+                    self.assertAlmostEqual(actual, expected, delta=6)
+
+    def test_plan_size_budget(self):
+        """Test that the planned JPEG settings keep the predicted total under the budget."""
+        images = []
+        for i in range(4):
+            noise = Image.effect_noise((300 + 50 * i, 200), 40 + 20 * i).convert("RGB")
+            images.append((len(encode_jpeg_for_test(noise, 95)), jpeg_rate_probes(noise)))
+        current = sum(size for size, _ in images)
+
+        self.assertEqual(plan_size_budget(images, current), [None] * 4, "Nothing should change when it fits")
+        budget = current * 0.5
+        plan = plan_size_budget(images, budget)
+        predicted = [predicted_jpeg_size(probes, *setting) if setting else size
+                     for (size, probes), setting in zip(images, plan)]
+        self.assertLessEqual(sum(predicted), budget)
+        self.assertTrue(all(setting in BUDGET_LADDER for setting in plan))
+        levels = [BUDGET_LADDER.index(setting) for setting in plan]
+        self.assertLessEqual(max(levels) - min(levels), 1, "Photos should end up within one quality step")
+        self.assertEqual(plan_size_budget(images, 1), [BUDGET_LADDER[-1]] * 4,
+                         "An impossible budget should get the smallest setting")
+
+    def test_reduce_on_decode(self):
+        """Test that the PDF copy of a large JPEG is decoded at a reduced DCT scale."""
+        from unittest import mock
+        rotated_path = os.path.join(self.test_output_dir, "rotated.jpg")
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        Image.new("RGB", (4800, 3600), (30, 200, 30)).save(rotated_path, exif=exif)
+        worker = PDFCreationWorker(
+            image_paths=[],
+            aktennummer="12345",
+            dokumentenkürzel="UB",
+            dokumentenzahl="01",
+            pdf_path="test.pdf",
+            briefkopf_path=self.briefkopf_path,
+            output_folder=self.test_output_dir
+        )
+        resized = []
+        original_resize = Image.Image.resize
+
+        def resize(image, *args, **kwargs):
+            resized.append(image.size)
+            return original_resize(image, *args, **kwargs)
+
+        with mock.patch.object(Image.Image, "resize", autospec=True, side_effect=resize):
+            processed = worker.processImage(rotated_path, 1)
+            landscape = worker.processImage(os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG"), 2)
+
+        self.assertEqual((processed.width, processed.height), (1500, 2000))
+        self.assertEqual((landscape.width, landscape.height), (2000, 1500))
+        self.assertEqual(resized, [(1800, 2400), (2016, 1512)],
+                         "The resample should start from the half-scale decode")
+
+    @unittest.skipUnless(find_jpegtran(), "jpegtran is not installed")
+    def test_lossless_jpeg_transform_with_jpegtran(self):
+        """Test the DCT-domain rotation and centred crop with the real jpegtran."""
+        rotated_path = os.path.join(self.test_output_dir, "rotated.jpg")
+        exif = Image.Exif()
+        exif[0x0112] = 8
+        Image.new("RGB", (320, 240), (30, 200, 30)).save(rotated_path, exif=exif)
+        worker = PDFCreationWorker(
+            image_paths=[],
+            aktennummer="12345",
+            dokumentenkürzel="UB",
+            dokumentenzahl="01",
+            pdf_path="test.pdf",
+            briefkopf_path=self.briefkopf_path,
+            output_folder=self.test_output_dir
+        )
+        processed = worker.processImage(rotated_path, 1)
+        self.assertTrue(processed.dct_transformed)
+        with processed.open() as img:
+            self.assertEqual(img.size, (240, 320))
+        # The PDF copy has no EXIF block left; the transformed JPEG keeps one
+        with open(rotated_path, "rb") as f:
+            upright = lossless_jpeg_transform(f.read(), 8)
+        with Image.open(BytesIO(upright)) as img:
+            self.assertEqual(img.size, (240, 320))
+            self.assertEqual(img.getexif()[0x0112], 1, "The copied EXIF block should say upright")
+
+        # A vertical gradient shows where the 4:3 crop starts; centred it
+        # starts at 32, which is on the 16 px grid of 4:2:0
+        square = Image.linear_gradient("L").resize((400, 364)).convert("RGB")
+        buf = BytesIO()
+        square.save(buf, "JPEG", quality=95)
+        cropped = lossless_jpeg_transform(buf.getvalue(), 1, crop_box_4_3(400, 364))
+        with Image.open(BytesIO(cropped)) as img:
+            self.assertEqual(img.size, (400, 300))
+            self.assertAlmostEqual(img.getpixel((200, 150))[0], square.getpixel((200, 182))[0], delta=4,
+                                   msg="The crop should stay centred")
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
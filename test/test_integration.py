@@ -3,12 +3,15 @@ import os
 import sys
 import tempfile
 import shutil
+import zipfile
 from PIL import Image
 import PyPDF2
 
 # Add the parent directory to the path so we can import the pdf_creator module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from pdf_creator import PDFCreationWorker, ImageImportWorker
+from pdf_creator import (
+    PDFCreationWorker, ThumbnailLoader, FolderScanWorker, open_image_source, read_image_meta, close_archives
+)
 from PyQt6.QtCore import QEventLoop
 
 class TestIntegration(unittest.TestCase):
@@ -31,25 +34,24 @@ class TestIntegration(unittest.TestCase):
             os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 03.JPG")
         ]
         
-        # First, import the images
-        image_worker = ImageImportWorker(test_images)
+        # First, load the thumbnails
+        loader = ThumbnailLoader()
         
         # Create a loop to wait for signals
         loop = QEventLoop()
         imported_images = []
         
-        def on_image_imported(file_path, qimage):
-            imported_images.append((file_path, qimage))
+        loader.thumbnailsLoaded.connect(
+            lambda batch: imported_images.extend((test_images[int(unique_id)], qimage)
+                                                 for unique_id, qimage, *_ in batch))
+        loader.idle.connect(loop.quit)
         
-        def on_finished():
-            loop.quit()
-        
-        image_worker.imageImported.connect(on_image_imported)
-        image_worker.finished.connect(on_finished)
-        
-        # Start the worker and wait for it to finish
-        image_worker.start()
+        # Start the loader and wait until the queue is empty
+        loader.start()
+        loader.request((str(i), path, None) for i, path in enumerate(test_images))
         loop.exec()
+        loader.cancel()
+        loader.wait()
         
         # Verify all images were imported
         self.assertEqual(len(imported_images), len(test_images), 
@@ -83,4 +85,204 @@ class TestIntegration(unittest.TestCase):
             pdf_reader = PyPDF2.PdfReader(f)
             # We should have at least one page
             self.assertGreater(len(pdf_reader.pages), 0, 
-                             "PDF should have at least one page")
\ No newline at end of file
+                             "PDF should have at least one page")
+
+    def load_thumbnails(self, loader, test_images):
+        # Runs the loader on this thread until every requested thumbnail is done
+        loader.idle.connect(loader.cancel)
+        loader.request((str(i), path, None) for i, path in enumerate(test_images))
+        loader.run()
+
+    def test_thumbnail_loader_keeps_request_order(self):
+        """Test that background thumbnails are delivered in the original selection order."""
+        test_images = sorted(
+            os.path.join(self.test_images_dir, name) for name in os.listdir(self.test_images_dir)
+        ) * 3
+
+        loader = ThumbnailLoader(max_workers=4)
+        loaded_ids = []
+        loader.thumbnailsLoaded.connect(lambda batch: loaded_ids.extend(unique_id for unique_id, *_ in batch))
+        self.load_thumbnails(loader, test_images)
+
+        self.assertEqual(loaded_ids, [str(i) for i in range(len(test_images))],
+                         "Thumbnails should arrive in selection order")
+
+    def test_thumbnail_loader_cancel(self):
+        """Test that cancelling the loader stops delivering thumbnails."""
+        test_images = sorted(
+            os.path.join(self.test_images_dir, name) for name in os.listdir(self.test_images_dir)
+        ) * 4
+
+        loader = ThumbnailLoader(max_workers=4, batch_interval=0)
+        batches = []
+
+        def on_thumbnails_loaded(batch):
+            batches.append(batch)
+            loader.cancel()
+
+        loader.thumbnailsLoaded.connect(on_thumbnails_loaded)
+        loader.request((str(i), path, None) for i, path in enumerate(test_images))
+        loader.run()
+
+        self.assertEqual(len(batches), 1, "No thumbnails should be delivered after cancel")
+        self.assertLessEqual(len(batches[0]), 4, "Only the wave in flight should be delivered")
+        self.assertGreater(loader.pendingCount(), 0, "Queued thumbnails should not be loaded after cancel")
+
+    def test_thumbnail_loader_batches(self):
+        """Test that loaded thumbnails are delivered in batches for the grid."""
+        test_images = sorted(
+            os.path.join(self.test_images_dir, name) for name in os.listdir(self.test_images_dir)
+        )
+
+        for batch_interval, sizes in ((0, [2, 2, 1]), (60, [5])):
+            loader = ThumbnailLoader(max_workers=2, batch_interval=batch_interval)
+            batches = []
+            loader.thumbnailsLoaded.connect(batches.append)
+            self.load_thumbnails(loader, test_images)
+
+            self.assertEqual([len(batch) for batch in batches], sizes,
+                             "A batch should be sent per batch_interval and when the queue runs empty")
+            self.assertEqual([unique_id for batch in batches for unique_id, *_ in batch],
+                             [str(i) for i in range(len(test_images))], "Batches should keep the selection order")
+
+    def test_thumbnail_loader_priorities(self):
+        """Test that prioritized thumbnails are loaded first and the rest follow in request order."""
+        loader = ThumbnailLoader(max_workers=1)
+        loader.request([(f"id{i}", f"/photos/{i}.jpg", None) for i in range(6)])
+        loader.prioritize(["id4", "id2"])
+
+        self.assertEqual([unique_id for unique_id, *_ in loader.takeNext(3)], ["id4", "id2", "id0"],
+                         "Prioritized thumbnails should come first, then the oldest requests")
+        loader.prioritize(["id5"])
+        self.assertEqual([unique_id for unique_id, *_ in loader.takeNext(3)], ["id5", "id1", "id3"],
+                         "New priorities should apply to the next pick")
+
+        loader.request([("id4", "/photos/4.jpg", None)])
+        self.assertEqual(loader.pendingCount(), 0, "Thumbnails already being loaded should not be queued again")
+
+    def test_thumbnail_loader_runs_until_cancelled(self):
+        """Test that the loader thread delivers requested thumbnails and stops on cancel."""
+        test_images = sorted(
+            os.path.join(self.test_images_dir, name) for name in os.listdir(self.test_images_dir)
+        )
+        loader = ThumbnailLoader(max_workers=2)
+        loop = QEventLoop()
+        loaded = {}
+        metas = {}
+        qualities = {}
+
+        def on_thumbnails_loaded(batch):
+            for unique_id, qimage, phash, meta, quality in batch:
+                loaded[unique_id] = qimage
+                qualities[unique_id] = quality
+                metas[unique_id] = meta
+
+        failed = []
+        loader.thumbnailsLoaded.connect(on_thumbnails_loaded)
+        loader.thumbnailsFailed.connect(failed.extend)
+        loader.idle.connect(loop.quit)
+        loader.start()
+        loader.request([(f"id{i}", path, None) for i, path in enumerate(test_images)]
+                       + [("broken", os.path.join(self.test_output_dir, "missing.jpg"), None)])
+        loop.exec()
+
+        loader.cancel()
+        self.assertTrue(loader.wait(5000), "Loader should stop after cancel")
+        self.assertEqual(sorted(loaded), sorted(f"id{i}" for i in range(len(test_images))),
+                         "Every readable image should get a thumbnail")
+        self.assertEqual(failed, [("broken", os.path.join(self.test_output_dir, "missing.jpg"))],
+                         "Unreadable files should be reported")
+        self.assertEqual([metas[f"id{i}"].is_horizontal for i in range(len(test_images))],
+                         [True, True, False, False, True], "Header metadata should come with the thumbnail")
+        self.assertTrue(all(quality.exposure == "dark" for quality in qualities.values()),
+                        "The black test photos should be scored as underexposed")
+
+    def test_folder_scan(self):
+        """Test that folders are walked recursively and streamed in a stable order."""
+        root = os.path.join(self.test_output_dir, "Akte")
+        for folder in ["Bad", os.path.join("Bad", "Decke"), "Küche", ".hidden"]:
+            os.makedirs(os.path.join(root, folder))
+        names = ["Küche/b.jpg", "Küche/a.JPG", "Bad/Decke/c.png", "Bad/d.jpeg", "e.bmp",
+                 "notes.txt", "._e.jpg", ".hidden/f.jpg"]
+        for name in names:
+            with open(os.path.join(root, name), "wb") as f:
+                f.write(b"")
+        single_file = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
+
+        scanner = FolderScanWorker([single_file, root], batch_size=2)
+        batches = []
+        scanner.filesFound.connect(batches.append)
+        scanner.run()
+
+        self.assertTrue(all(len(batch) <= 2 for batch in batches), "Files should be streamed in batches")
+        found = [os.path.relpath(path, root) if path != single_file else "single" for batch in batches for path in batch]
+        expected = ["single", "e.bmp", os.path.join("Bad", "d.jpeg"), os.path.join("Bad", "Decke", "c.png"),
+                    os.path.join("Küche", "a.JPG"), os.path.join("Küche", "b.jpg")]
+        self.assertEqual(found, expected, "Only images should be found, folder by folder in name order")
+
+    def test_archive_member_sources(self):
+        """Test that archive members are streamed and a replaced archive is reopened."""
+        archive_path = os.path.join(self.test_output_dir, "Fotos.zip")
+        member_path = f"{archive_path}/IMG_1.JPG"
+        for size in ((40, 30), (30, 40)):
+            Image.new("RGB", size, (200, 30, 30)).save(os.path.join(self.test_output_dir, "member.jpg"))
+            with zipfile.ZipFile(archive_path, "w") as zf:
+                zf.write(os.path.join(self.test_output_dir, "member.jpg"), "IMG_1.JPG",
+                         compress_type=zipfile.ZIP_DEFLATED)
+            # Make sure the rewrite is seen even on coarse file system timestamps
+            os.utime(archive_path, ns=(0, size[0] * 10 ** 9))
+            with open_image_source(member_path) as source:
+                self.assertTrue(source.seekable(), "Members should be opened as seekable streams")
+                with Image.open(source) as img:
+                    self.assertEqual(img.size, size)
+            self.assertEqual(read_image_meta(member_path).width, size[0],
+                             "A replaced archive should be read anew")
+        close_archives()
+
+    def test_import_and_pdf_from_zip_archive(self):
+        """Test that images inside a ZIP archive are imported and exported without extracting it."""
+        archive_path = os.path.join(self.test_output_dir, "Fotos.zip")
+        with zipfile.ZipFile(archive_path, "w") as zf:
+            zf.write(os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG"), "Bad/IMG_2.JPG",
+                     compress_type=zipfile.ZIP_DEFLATED)
+            zf.write(os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 03.JPG"), "Bad/IMG_1.JPG")
+            zf.writestr("__MACOSX/Bad/._IMG_1.JPG", b"")
+            zf.writestr("Bad/readme.txt", b"")
+
+        scanner = FolderScanWorker([archive_path])
+        members = []
+        scanner.filesFound.connect(members.extend)
+        scanner.run()
+        self.assertEqual(members, [f"{archive_path}/Bad/IMG_1.JPG", f"{archive_path}/Bad/IMG_2.JPG"],
+                         "Only image members should be listed, in name order")
+
+        loader = ThumbnailLoader(max_workers=1)
+        imported = []
+        loader.thumbnailsLoaded.connect(lambda batch: imported.extend(qimage for _, qimage, *_ in batch))
+        self.load_thumbnails(loader, members)
+        self.assertEqual(len(imported), 2, "Archive members should be imported")
+        self.assertGreater(imported[0].height(), imported[0].width(), "Member orientation should be kept")
+
+        output_folder = os.path.join(self.test_output_dir, "out")
+        os.makedirs(output_folder)
+        pdf_path = os.path.join(output_folder, "zip_test.pdf")
+        pdf_worker = PDFCreationWorker(
+            image_paths=members,
+            aktennummer="12345",
+            dokumentenkürzel="UB",
+            dokumentenzahl="01",
+            pdf_path=pdf_path,
+            briefkopf_path=self.briefkopf_path,
+            output_folder=output_folder
+        )
+        errors = []
+        pdf_worker.errorOccurred.connect(errors.append)
+        pdf_worker.run()
+
+        self.assertEqual(errors, [], "PDF creation from archive members should not fail")
+        self.assertTrue(os.path.exists(pdf_path), f"PDF should exist at {pdf_path}")
+        for i in (1, 2):
+            self.assertTrue(os.path.exists(os.path.join(output_folder, f"12345-UB-01 Foto Nr. {i}.JPG")),
+                            "Archive members should be exported with the usual file names")
+        self.assertEqual(sorted(os.listdir(self.test_output_dir)), ["Fotos.zip", "out"],
+                         "The archive should not be extracted")
\ No newline at end of file
@@ -1,14 +1,17 @@
 import unittest
 import os
+import re
 import shutil
 import sys
 import tempfile
+import time
 import PyPDF2
+from io import BytesIO
 from PIL import Image
 
 # Add the parent directory to the path so we can import the pdf_creator module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from pdf_creator import PDFCreationWorker
+from pdf_creator import PDFCreationWorker, PreparedImage
 
 class TestPDFCreation(unittest.TestCase):
     def setUp(self):
@@ -281,5 +284,327 @@ class TestPDFCreation(unittest.TestCase):
         self.assertFalse(os.path.exists(pdf_path), 
                         "PDF should not be created when briefkopf is missing")
 
+    def test_parallel_preparation_keeps_page_order(self):
+        """Test that images prepared on a process pool still land on the pages in order."""
+        colors = [(200, 30, 30), (30, 200, 30), (30, 30, 200), (200, 200, 30), (30, 200, 200)]
+        source_dir = os.path.join(self.test_output_dir, "source")
+        os.makedirs(source_dir)
+        image_paths = []
+        for i, color in enumerate(colors):
+            image_paths.append(os.path.join(source_dir, f"{i}.jpg"))
+            Image.new("RGB", (200 + 20 * i, 400), color).save(image_paths[-1])
+        output_folder = os.path.join(self.test_output_dir, "out")
+        os.makedirs(output_folder)
+        pdf_path = os.path.join(output_folder, "parallel_test.pdf")
+
+        worker = PDFCreationWorker(
+            image_paths=image_paths,
+            aktennummer="12345",
+            dokumentenkürzel="UB",
+            dokumentenzahl="01",
+            pdf_path=pdf_path,
+            briefkopf_path=self.briefkopf_path,
+            output_folder=output_folder,
+            start_photo_number=3,
+            max_workers=2
+        )
+        progress = []
+        worker.progressUpdate.connect(progress.append)
+        worker.run()
+
+        self.assertEqual(progress, list(range(1, len(colors) + 1)), "Progress should count prepared images")
+        with open(pdf_path, 'rb') as f:
+            pdf_reader = PyPDF2.PdfReader(f)
+            self.assertEqual(len(pdf_reader.pages), len(colors))
+            for page, color in zip(pdf_reader.pages, colors):
+                # All pages share one XObject dictionary; the content stream says which one is drawn
+                xobjects = page["/Resources"]["/XObject"]
+                drawn = re.findall(rb"(/I\d+) Do", page.get_contents().get_data())
+                photos = [xobjects[name.decode()].get_object() for name in drawn
+                          if xobjects[name.decode()].get_object().get("/Filter") == "/DCTDecode"]
+                with Image.open(BytesIO(photos[0].get_data())) as photo:
+                    pixel = photo.convert("RGB").getpixel((50, 50))
+                self.assertTrue(all(abs(a - b) <= 3 for a, b in zip(pixel, color)), "Pages should keep the image order")
+        for i, (image_path, color) in enumerate(zip(image_paths, colors)):
+            with Image.open(os.path.join(output_folder, f"12345-UB-01 Foto Nr. {i + 3}.jpg")) as exported:
+                self.assertEqual(exported.size, (200 + 20 * i, 400), "Exports should be numbered in order")
+
+    def test_resolution_profiles(self):
+        """Test that each profile resamples the photo to its placed size at the profile's DPI."""
+        image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 03.JPG")
+        resolutions = {}
+        for profile in ("screen", "print", "archive"):
+            output_folder = os.path.join(self.test_output_dir, profile)
+            os.makedirs(output_folder)
+            pdf_path = os.path.join(output_folder, "profile_test.pdf")
+            worker = PDFCreationWorker(
+                image_paths=[image_path],
+                aktennummer="12345",
+                dokumentenkürzel="UB",
+                dokumentenzahl="01",
+                pdf_path=pdf_path,
+                briefkopf_path=self.briefkopf_path,
+                output_folder=output_folder,
+                profile=profile
+            )
+            worker.run()
+            with open(pdf_path, 'rb') as f:
+                page = PyPDF2.PdfReader(f).pages[0]
+                xobjects = page["/Resources"]["/XObject"]
+                for width_pt, name in re.findall(rb"([\d.]+) 0 0 [\d.]+ [\d.]+ [\d.]+ cm (/I\d+) Do",
+                                                 page.get_contents().get_data()):
+                    photo = xobjects[name.decode()].get_object()
+                    if photo.get("/Filter") == "/DCTDecode":
+                        resolutions[profile] = (photo["/Width"], photo["/Width"] / (float(width_pt) / 72))
+
+        self.assertAlmostEqual(resolutions["screen"][1], 150, delta=1)
+        self.assertAlmostEqual(resolutions["print"][1], 300, delta=1)
+        self.assertEqual(resolutions["archive"][0], 3024, "The archive profile should keep the original pixels")
+
+    def test_size_budget(self):
+        """Test that the size budget mode re-encodes photos in a second pass to stay under the limit."""
+        from unittest import mock
+        import pdf_creator
+        source_dir = os.path.join(self.test_output_dir, "source")
+        os.makedirs(source_dir)
+        image_paths = []
+        for i in range(3):
+            image_paths.append(os.path.join(source_dir, f"{i}.jpg"))
+            Image.effect_noise((900, 1200), 30 + 10 * i).convert("RGB").save(image_paths[-1], quality=95)
+        sizes = {}
+        overshoots = {}
+        probes = {}
+        for name, max_pdf_size in (("unlimited", None), ("impossible", 20000), ("budget", 600000)):
+            output_folder = os.path.join(self.test_output_dir, name)
+            os.makedirs(output_folder)
+            pdf_path = os.path.join(output_folder, "budget_test.pdf")
+            worker = PDFCreationWorker(
+                image_paths=image_paths,
+                aktennummer="12345",
+                dokumentenkürzel="UB",
+                dokumentenzahl="01",
+                pdf_path=pdf_path,
+                briefkopf_path=self.briefkopf_path,
+                output_folder=output_folder,
+                max_workers=1,
+                max_pdf_size=max_pdf_size
+            )
+            progress = []
+            worker.progressUpdate.connect(progress.append)
+            with mock.patch("pdf_creator.read_image_source", wraps=pdf_creator.read_image_source) as reads, \
+                    mock.patch("pdf_creator.jpeg_rate_probes", wraps=pdf_creator.jpeg_rate_probes) as rate_probes:
+                worker.run()
+            sizes[name] = os.path.getsize(pdf_path)
+            probes[name] = rate_probes.call_count
+            overshoots[name] = worker.budget_overshoot
+
+        self.assertGreater(sizes["unlimited"], 600000, "The test photos should need the budget")
+        self.assertLessEqual(sizes["budget"], 600000, "The PDF should fit the size budget")
+        self.assertGreater(sizes["budget"], 600000 * 0.8, "The budget should not be wasted")
+        self.assertEqual(overshoots["budget"], 0)
+        self.assertEqual(overshoots["impossible"], sizes["impossible"] - 20000,
+                         "A budget out of reach should be reported as overshot")
+        self.assertEqual(probes["unlimited"], 0, "Without a budget no rate probes should be taken")
+        self.assertEqual(probes["budget"], len(image_paths), "Rate probes should be taken in the first pass only")
+        self.assertGreater(reads.call_count, len(image_paths), "Re-encoded photos should start from their source")
+        self.assertLessEqual(reads.call_count, 2 * len(image_paths), "No more than two passes over the photos")
+        self.assertEqual(progress, list(range(1, reads.call_count + 1)),
+                         "Progress should count on across both passes")
+        self.assertEqual(worker.passthrough_count, sum(p.passthrough for p in worker.placed.values()),
+                         "Re-encoded photos should no longer count as taken over")
+        for i, image_path in enumerate(image_paths):
+            with open(image_path, "rb") as f:
+                with open(os.path.join(output_folder, f"12345-UB-01 Foto Nr. {i + 1}.jpg"), "rb") as exported:
+                    self.assertEqual(exported.read(), f.read(), "The originals should be exported unchanged")
+
+    def test_pipeline_queues_are_bounded(self):
+        """Test that the read-ahead stage never runs further ahead than the queue depths allow."""
+        from unittest import mock
+        import pdf_creator
+        test_image = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 03.JPG")
+        worker = PDFCreationWorker(
+            image_paths=[],
+            aktennummer="12345",
+            dokumentenkürzel="UB",
+            dokumentenzahl="01",
+            pdf_path="test.pdf",
+            briefkopf_path=self.briefkopf_path,
+            output_folder=self.test_output_dir,
+            max_workers=1,
+            read_ahead=1,
+            prepare_ahead=1
+        )
+        jobs = [worker.prepareJob(test_image, i + 1) for i in range(6)]
+        reads = []
+        ahead = []
+        with mock.patch.object(pdf_creator, "read_image_source",
+                               side_effect=lambda path: reads.append(path) or b"not an image"):
+            for count, _ in enumerate(worker.preparedImages(jobs), 1):
+                time.sleep(0.05)
+                ahead.append(len(reads) - count)
+
+        self.assertEqual(len(reads), len(jobs))
+        # One image in the pool, one in the queue and one in the reader's hands
+        self.assertLessEqual(max(ahead), 3, "Reading should stop when the queues are full")
+        self.assertGreater(worker.stage_stalls["read"], 0, "The reader should report waiting on the full queue")
+
+    def test_output_folder_holds_only_results(self):
+        """Test that prepared images go to the PDF in memory, without temporary files."""
+        source_dir = os.path.join(self.test_output_dir, "source")
+        os.makedirs(source_dir)
+        png_path = os.path.join(source_dir, "plan.png")
+        plan = Image.merge("RGB", [Image.linear_gradient("L").resize((300, 400))] * 3)
+        plan.save(png_path)
+        image_paths = [png_path, os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 03.JPG")]
+        output_folder = os.path.join(self.test_output_dir, "out")
+        os.makedirs(output_folder)
+        pdf_path = os.path.join(output_folder, "memory_test.pdf")
+
+        worker = PDFCreationWorker(
+            image_paths=image_paths,
+            aktennummer="12345",
+            dokumentenkürzel="UB",
+            dokumentenzahl="01",
+            pdf_path=pdf_path,
+            briefkopf_path=self.briefkopf_path,
+            output_folder=output_folder
+        )
+        worker.run()
+
+        self.assertEqual(sorted(os.listdir(output_folder)),
+                         ["12345-UB-01 Foto Nr. 1.png", "12345-UB-01 Foto Nr. 2.JPG", "memory_test.pdf"],
+                         "Only the PDF and the renamed originals should be written")
+        with open(pdf_path, 'rb') as f:
+            pdf_reader = PyPDF2.PdfReader(f)
+            xobjects = pdf_reader.pages[0]["/Resources"]["/XObject"]
+            images = {xobjects[name].get_object()["/Width"]: xobjects[name].get_object() for name in xobjects}
+            self.assertEqual(images[300].get("/Filter"), "/FlateDecode", "PNG sources should stay lossless in the PDF")
+            self.assertEqual(images[300]["/DecodeParms"]["/Predictor"], 15, "Rows should be PNG-filtered")
+            self.assertEqual(images[300]["/DecodeParms"]["/Colors"], 3)
+            # PyPDF2 ignores /Colors when undoing predictors, so the raw stream is decoded as PNG rows
+            with PreparedImage(300, 400, "DeviceRGB", "FlateDecode", images[300]._data).open() as img:
+                self.assertEqual(img.tobytes(), plan.tobytes(), "The pixels should survive unchanged")
+
+    def test_jpeg_passthrough(self):
+        """Test that upright JPEGs within the size limit are embedded and exported byte for byte."""
+        source_dir = os.path.join(self.test_output_dir, "source")
+        os.makedirs(source_dir)
+        upright_path = os.path.join(source_dir, "upright.jpg")
+        Image.new("RGB", (300, 400), (200, 30, 30)).save(upright_path, quality=70)
+        rotated_path = os.path.join(source_dir, "rotated.jpg")
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        Image.new("RGB", (400, 300), (30, 200, 30)).save(rotated_path, exif=exif)
+        output_folder = os.path.join(self.test_output_dir, "out")
+        os.makedirs(output_folder)
+        pdf_path = os.path.join(output_folder, "passthrough_test.pdf")
+
+        worker = PDFCreationWorker(
+            image_paths=[upright_path, rotated_path],
+            aktennummer="12345",
+            dokumentenkürzel="UB",
+            dokumentenzahl="01",
+            pdf_path=pdf_path,
+            briefkopf_path=self.briefkopf_path,
+            output_folder=output_folder
+        )
+        worker.run()
+
+        self.assertEqual(worker.passthrough_count, 1, "Only the upright image should be passed through")
+        self.assertTrue(any(line.startswith("1 von 2 Bildern ohne Neukodierung") for line in worker.report),
+                        "The summary should be reported for the message box")
+        with open(upright_path, "rb") as f:
+            original = f.read()
+        with open(os.path.join(output_folder, "12345-UB-01 Foto Nr. 1.jpg"), "rb") as f:
+            self.assertEqual(f.read(), original, "The export should be a byte copy")
+        with open(pdf_path, 'rb') as f:
+            pdf_reader = PyPDF2.PdfReader(f)
+            xobjects = pdf_reader.pages[0]["/Resources"]["/XObject"]
+            streams = [xobjects[name].get_object().get_data() for name in xobjects
+                       if xobjects[name].get_object().get("/Filter") == "/DCTDecode"]
+        self.assertIn(original, streams, "The JPEG bitstream should be embedded unchanged")
+        with Image.open(os.path.join(output_folder, "12345-UB-01 Foto Nr. 2.jpg")) as exported:
+            self.assertEqual(exported.size, (400, 300), "Rotated originals should be copied as they are")
+            self.assertEqual(exported.getexif()[0x0112], 6, "The orientation tag should be kept")
+        self.assertNotIn("hardlink", worker.export_report, "Originals should only be hard-linked when asked to")
+        self.assertEqual(os.stat(upright_path).st_nlink, 1)
+
+    def test_upright_export(self):
+        """Test that the upright export mode rotates photos and reports copied and re-encoded bytes."""
+        source_dir = os.path.join(self.test_output_dir, "source")
+        os.makedirs(source_dir)
+        upright_path = os.path.join(source_dir, "upright.png")
+        Image.new("RGB", (300, 400), (200, 30, 30)).save(upright_path)
+        rotated_path = os.path.join(source_dir, "rotated.jpg")
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        Image.new("RGB", (400, 300), (30, 200, 30)).save(rotated_path, exif=exif)
+        broken_tag_path = os.path.join(source_dir, "broken_tag.jpg")
+        exif[0x0112] = 0
+        Image.new("RGB", (300, 400), (30, 30, 200)).save(broken_tag_path, exif=exif)
+        output_folder = os.path.join(self.test_output_dir, "out")
+        os.makedirs(output_folder)
+
+        worker = PDFCreationWorker(
+            image_paths=[upright_path, rotated_path, broken_tag_path],
+            aktennummer="12345",
+            dokumentenkürzel="UB",
+            dokumentenzahl="01",
+            pdf_path=os.path.join(output_folder, "export_test.pdf"),
+            briefkopf_path=self.briefkopf_path,
+            output_folder=output_folder,
+            export_mode="upright"
+        )
+        worker.run()
+
+        with open(upright_path, "rb") as f:
+            with open(os.path.join(output_folder, "12345-UB-01 Foto Nr. 1.png"), "rb") as exported:
+                self.assertEqual(exported.read(), f.read(), "Upright originals should not be re-encoded")
+        with Image.open(os.path.join(output_folder, "12345-UB-01 Foto Nr. 2.jpg")) as exported:
+            self.assertEqual(exported.size, (300, 400), "Rotated photos should be stored upright")
+        with Image.open(os.path.join(output_folder, "12345-UB-01 Foto Nr. 3.jpg")) as exported:
+            self.assertEqual(exported.getexif()[0x0112], 1, "An invalid orientation tag should be rewritten")
+        self.assertEqual(os.stat(broken_tag_path).st_nlink, 1, "A rewritten original must not be linked")
+        self.assertNotIn("hardlink", worker.export_report)
+        # The PNG is cloned where the file system can, the rewritten JPEG is always copied
+        self.assertEqual(worker.export_report.get("reflink", [0])[0] + worker.export_report["copy"][0], 2)
+        self.assertEqual(worker.export_report["reencode"],
+                         [1, os.path.getsize(os.path.join(output_folder, "12345-UB-01 Foto Nr. 2.jpg"))])
+
+    def test_hardlink_export(self):
+        """Test that the link mode hard-links originals and leaves the tags of non-JPEG sources alone."""
+        source_dir = os.path.join(self.test_output_dir, "source")
+        os.makedirs(source_dir)
+        photo_path = os.path.join(source_dir, "photo.jpg")
+        Image.new("RGB", (300, 400), (200, 30, 30)).save(photo_path)
+        plan_path = os.path.join(source_dir, "plan.png")
+        exif = Image.Exif()
+        exif[0x0112] = 0
+        Image.new("RGB", (300, 400), (30, 30, 200)).save(plan_path, exif=exif)
+        output_folder = os.path.join(self.test_output_dir, "out")
+        os.makedirs(output_folder)
+
+        worker = PDFCreationWorker(
+            image_paths=[photo_path, plan_path],
+            aktennummer="12345",
+            dokumentenkürzel="UB",
+            dokumentenzahl="01",
+            pdf_path=os.path.join(output_folder, "link_test.pdf"),
+            briefkopf_path=self.briefkopf_path,
+            output_folder=output_folder,
+            export_mode="link"
+        )
+        errors = []
+        worker.errorOccurred.connect(errors.append)
+        worker.run()
+
+        self.assertEqual(errors, [], "A PNG with an invalid orientation tag should not fail the export")
+        self.assertNotIn("copy", worker.export_report, "Both originals should be linked, not copied")
+        if "hardlink" in worker.export_report:
+            self.assertEqual(os.stat(photo_path).st_nlink, 2)
+        with open(plan_path, "rb") as f:
+            with open(os.path.join(output_folder, "12345-UB-01 Foto Nr. 2.png"), "rb") as exported:
+                self.assertEqual(exported.read(), f.read(), "Non-JPEG originals should be exported as they are")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -9,7 +9,7 @@ from PyQt6.QtCore import Qt
 
 # Add the parent directory to the path so we can import the pdf_creator module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from pdf_creator import ImageUploader
+from pdf_creator import ImageUploader, ImageRecord, ThumbnailCache
 
 class TestUI(unittest.TestCase):
     @classmethod
@@ -30,7 +30,7 @@ class TestUI(unittest.TestCase):
         self.test_images_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
         
         # Create the UI
-        self.ui = ImageUploader()
+        self.ui = ImageUploader(ThumbnailCache(os.path.join(self.test_output_dir, "thumbnails")))
         
     def tearDown(self):
         # Clean up the temporary directory
@@ -42,6 +42,15 @@ class TestUI(unittest.TestCase):
         self.assertEqual(self.ui.images, [], "Images list should be empty initially")
         self.assertFalse(self.ui.pdf_button.isEnabled(), "PDF button should be disabled initially")
         
+    def test_options_fit_window(self):
+        """Test that the option rows fit the fixed window width without squeezing the combo boxes."""
+        self.ui.show()
+        QApplication.processEvents()
+        self.assertLessEqual(self.ui.layout().minimumSize().width(), self.ui.maximumWidth())
+        for combo in (self.ui.export_mode_input, self.ui.profile_input):
+            self.assertGreaterEqual(combo.width(), combo.sizeHint().width(), "Combo box labels should not be cut off")
+        self.ui.close()
+
     def test_input_validation(self):
         """Test input validation for required fields."""
         # Set valid inputs
@@ -51,16 +60,9 @@ class TestUI(unittest.TestCase):
         # Verify PDF button is still disabled without images
         self.assertFalse(self.ui.pdf_button.isEnabled(), "PDF button should be disabled without images")
         
-        # Since we can't directly add images, we'll simulate it by directly modifying the images list
-        # This is a test-only approach that doesn't require changing the application code
+        # Add an image record directly instead of running the import worker
         test_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
-        
-        # Create a mock frame and add it to the images list
-        from PyQt6.QtWidgets import QFrame
-        from PyQt6.QtGui import QPixmap
-        mock_frame = QFrame()
-        mock_pixmap = QPixmap()
-        self.ui.images.append((mock_frame, test_image_path, mock_pixmap))
+        self.ui.image_model.appendRecords([ImageRecord(test_image_path)])
         
         # Call the method that updates the UI based on the images list
         self.ui.updateImageCounter()
@@ -113,12 +115,11 @@ class TestUI(unittest.TestCase):
         self.ui.dokumentenzahl_input.setText("01")
         self.ui.dokumentenkürzel_input.setCurrentIndex(2)  # Select "ST"
         
-        # Add a mock image
-        from PyQt6.QtWidgets import QFrame, QMessageBox
+        # Add an image record
+        from PyQt6.QtWidgets import QMessageBox
         from PyQt6.QtCore import QTimer
-        mock_frame = QFrame()
         test_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
-        self.ui.images.append((mock_frame, test_image_path, "unique_id"))
+        self.ui.image_model.appendRecords([ImageRecord(test_image_path)])
         self.ui.updateImageCounter()
         
         # Set up a timer to automatically click "Yes" on the confirmation dialog
@@ -146,5 +147,276 @@ class TestUI(unittest.TestCase):
         self.assertEqual(self.ui.images, [], "Images list should be empty")
         self.assertEqual(self.ui.image_counter_label.text(), "0 Bilder", "Image counter should be reset")
 
+    def test_batched_image_insertion(self):
+        """Test that imported batches are appended to the grid model without a reset."""
+        from PyQt6.QtGui import QImage
+        qimage = QImage(240, 180, QImage.Format.Format_RGB888)
+        test_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
+
+        try:
+            self.ui.startImageImport([test_image_path] * 3)
+            first_records = list(self.ui.images)
+            inserted = []
+            self.ui.image_model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+            self.ui.startImageImport([test_image_path] * 3)
+        finally:
+            self.ui.stopThumbnailLoader()
+        self.ui.addThumbnails([(self.ui.images[0].unique_id, qimage, 0, None, None)])
+
+        self.assertEqual(len(self.ui.images), 6, "Both batches should be added")
+        self.assertEqual(inserted, [(3, 5)], "A batch should be inserted as one block of rows")
+        self.assertEqual(self.ui.image_counter_label.text(), "6 Bilder", "Counter should be updated per batch")
+        self.assertEqual(len({record.unique_id for record in self.ui.images}), 6,
+                         "Every image instance should get its own ID")
+        self.assertEqual(self.ui.images[:3], first_records, "Existing records should be kept")
+        self.assertLessEqual(max(self.ui.images[0].thumbnail.width(), self.ui.images[0].thumbnail.height()), 120,
+                             "Thumbnails should be scaled to the grid size")
+
+    def test_reorder_and_remove(self):
+        """Test that drag-reorder and remove act on image IDs, even for the same file added twice."""
+        test_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
+        records = [ImageRecord(test_image_path) for _ in range(4)]
+        self.ui.image_model.appendRecords(records)
+
+        self.ui.reorderImages(records[0].unique_id, records[2].unique_id)
+        self.assertEqual(self.ui.images, [records[1], records[2], records[0], records[3]],
+                         "Dragging forward should place the image at the target position")
+        self.ui.reorderImages(records[3].unique_id, records[1].unique_id)
+        self.assertEqual(self.ui.images, [records[3], records[1], records[2], records[0]],
+                         "Dragging backward should place the image at the target position")
+
+        self.ui.removeImage(records[2].unique_id)
+        self.assertEqual(self.ui.images, [records[3], records[1], records[0]], "Only the clicked image should be removed")
+        self.assertEqual(self.ui.image_counter_label.text(), "3 Bilder")
+
+    def test_image_id_index(self):
+        """Test that the ID index stays consistent through moves and removals."""
+        import random
+        from pdf_creator import ImageListModel
+        model = ImageListModel()
+        model.appendRecords([ImageRecord(f"/photos/{i}.jpg") for i in range(200)])
+        rng = random.Random(42)
+        for _ in range(300):
+            if rng.random() < 0.2 and len(model.records) > 1:
+                model.removeRecords([rng.randrange(len(model.records))])
+            else:
+                model.moveRecord(rng.randrange(len(model.records)), rng.randrange(len(model.records)))
+        for row, record in enumerate(model.records):
+            self.assertEqual(model.rowOf(record.unique_id), row, "Index should match the record order")
+            self.assertIs(model.recordFor(record.unique_id), record)
+        self.assertEqual(model.rowOf("missing"), -1)
+
+    def test_lazy_import_placeholders(self):
+        """Test that imported images are counted at once and far thumbnails can be dropped."""
+        import pdf_creator
+        from PyQt6.QtGui import QPixmap
+        self.ui.aktennummer_input.setText("12345")
+        self.ui.dokumentenzahl_input.setText("01")
+        test_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
+
+        self.ui.startImageImport([test_image_path] * 60)
+        try:
+            self.assertEqual(self.ui.image_counter_label.text(), "60 Bilder",
+                             "Counter should be updated before thumbnails are decoded")
+            self.assertTrue(self.ui.pdf_button.isEnabled(), "PDF button should not wait for thumbnails")
+        finally:
+            self.ui.stopThumbnailLoader()
+
+        pixmap = QPixmap(120, 90)
+        for row in range(len(self.ui.images)):
+            self.ui.image_model.setThumbnail(row, pixmap)
+        original_limit = pdf_creator.MAX_LOADED_THUMBNAILS
+        pdf_creator.MAX_LOADED_THUMBNAILS = 40
+        try:
+            self.ui.dropFarThumbnails()
+        finally:
+            pdf_creator.MAX_LOADED_THUMBNAILS = original_limit
+        loaded = [record.thumbnail is not None for record in self.ui.images]
+        self.assertEqual(sum(loaded), 36, "Thumbnails should be dropped down to 90% of the limit")
+        self.assertTrue(all(loaded[:20]), "Thumbnails near the viewport should be kept")
+        self.assertFalse(any(loaded[-20:]), "The farthest thumbnails should be dropped")
+
+    def test_duplicate_flags(self):
+        """Test that near-identical thumbnails are flagged and unflagged when the original is removed."""
+        from PyQt6.QtGui import QImage
+        from pdf_creator import ImageListModel
+        test_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
+        records = [ImageRecord(test_image_path) for _ in range(3)]
+        self.ui.image_model.appendRecords(records)
+        qimage = QImage(120, 90, QImage.Format.Format_RGB888)
+
+        self.ui.addThumbnails([(records[0].unique_id, qimage, 0x0F0F0F0F0F0F0F0F, None, None),
+                               (records[1].unique_id, qimage, 0x0F0F0F0F0F0F0F0E, None, None),
+                               (records[2].unique_id, qimage, 0xF0F0F0F0F0F0F0F0, None, None)])
+        flags = [self.ui.image_model.index(row).data(ImageListModel.DuplicateRole) for row in range(3)]
+        self.assertEqual(flags, [False, True, False], "Only the near-identical later image should be flagged")
+        self.assertIn("Mögliches Duplikat", self.ui.image_model.index(1).data(Qt.ItemDataRole.ToolTipRole))
+
+        self.ui.removeImage(records[0].unique_id)
+        self.assertIsNone(records[1].duplicate_of, "Removing the original should clear the flag")
+
+    def test_unreadable_import(self):
+        """Test that files that fail to decode are removed, reported and kept out of the PDF."""
+        from unittest import mock
+        from PyQt6.QtCore import QEventLoop
+        from PyQt6.QtWidgets import QMessageBox
+        broken_path = os.path.join(self.test_output_dir, "kaputt.jpg")
+        with open(broken_path, "wb") as f:
+            f.write(b"not an image")
+        test_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
+
+        loop = QEventLoop()
+        self.ui.thumbnailLoader().idle.connect(loop.quit)
+        try:
+            with mock.patch.object(QMessageBox, "warning") as warning:
+                self.ui.startImageImport([test_image_path, broken_path])
+                loop.exec()
+        finally:
+            self.ui.stopThumbnailLoader()
+        self.assertEqual([record.file_path for record in self.ui.images], [test_image_path],
+                         "The unreadable file should be removed from the grid")
+        self.assertEqual(self.ui.image_counter_label.text(), "1 Bild")
+        warning.assert_called_once()
+        self.assertIn("kaputt.jpg", warning.call_args.args[2])
+        self.assertTrue(self.ui.import_progress.isHidden(), "Progress should be hidden once the import is done")
+
+    def test_cancel_import(self):
+        """Test that cancelling an import keeps decoded images and drops the waiting placeholders."""
+        from PyQt6.QtGui import QImage
+        qimage = QImage(120, 90, QImage.Format.Format_RGB888)
+        test_image_path = os.path.join(self.test_images_dir, "22498-UB-01 Foto Nr. 01.JPG")
+        self.ui.startImageImport([test_image_path] * 3)
+        self.ui.stopThumbnailLoader()
+        self.ui.addThumbnails([(self.ui.images[0].unique_id, qimage, 0, None, None)])
+        self.assertFalse(self.ui.import_cancel_button.isHidden(), "Cancel should be offered during an import")
+        self.assertEqual((self.ui.import_progress.value(), self.ui.import_progress.maximum()), (1, 3))
+
+        QTest.mouseClick(self.ui.import_cancel_button, Qt.MouseButton.LeftButton)
+        self.assertEqual(len(self.ui.images), 1, "Only the decoded image should be kept")
+        self.assertTrue(self.ui.import_cancel_button.isHidden())
+        self.assertTrue(self.ui.import_progress.isHidden())
+
+    def test_project_save_and_open(self):
+        """Test that a saved project reopens without decoding unchanged images."""
+        from unittest import mock
+        from PyQt6.QtGui import QImage
+        from PIL import Image
+        from pdf_creator import read_image_meta, ImageQuality
+        paths = []
+        for i, name in enumerate(["22498-UB-01 Foto Nr. 03.JPG", "22498-UB-01 Foto Nr. 01.JPG", "22498-UB-01 Foto Nr. 05.JPG"]):
+            paths.append(os.path.join(self.test_output_dir, f"{i}.jpg"))
+            shutil.copy(os.path.join(self.test_images_dir, name), paths[-1])
+        self.ui.aktennummer_input.setText("12345")
+        self.ui.dokumentenkürzel_input.setCurrentIndex(4)
+        self.ui.dokumentenzahl_input.setText("02")
+        self.ui.start_photo_number.setText("7")
+        self.ui.startImageImport(paths)
+        self.ui.stopThumbnailLoader()
+        qimage = QImage(120, 90, QImage.Format.Format_RGB888)
+        qimage.fill(Qt.GlobalColor.darkGreen)
+        self.ui.addThumbnails([(record.unique_id, qimage, i, read_image_meta(record.file_path),
+                                ImageQuality(120.0 * i, 128.0, 0.0, 0.0))
+                               for i, record in enumerate(self.ui.images)])
+        project_path = os.path.join(self.test_output_dir, "Akte.pdfprojekt")
+        self.ui.saveProject(project_path)
+
+        os.utime(paths[1], (0, 1000))
+        other = ImageUploader(self.ui.thumbnail_cache)
+        try:
+            with mock.patch.object(Image, "open", side_effect=AssertionError("source decoded")):
+                missing = other.openProject(project_path)
+                other.stopThumbnailLoader()
+            self.assertEqual(missing, [])
+            self.assertEqual([record.file_path for record in other.images], paths, "Order should be restored")
+            self.assertEqual((other.aktennummer_input.text(), other.dokumentenkürzel_input.currentText(),
+                              other.dokumentenzahl_input.text(), other.start_photo_number.text()),
+                             ("12345", "UB", "02", "7"), "Form fields should be restored")
+            self.assertEqual([record.thumbnail is not None for record in other.images], [True, False, True],
+                             "Only the changed file should need a new thumbnail")
+            self.assertEqual(other.images[0].meta.height, 4032, "Metadata of unchanged files should be restored")
+            self.assertIsNone(other.images[1].meta, "Metadata of the changed file should be read again")
+            self.assertEqual(other.images[2].quality.sharpness, 240.0, "Quality scores should be restored")
+        finally:
+            other.stopThumbnailLoader()
+
+    def test_bulk_remove(self):
+        """Test that removing a selection updates the grid in one pass."""
+        records = [ImageRecord(f"/photos/{i}.jpg") for i in range(10)]
+        self.ui.image_model.appendRecords(records)
+        from PyQt6.QtCore import QItemSelectionModel
+        model = self.ui.image_model
+        self.ui.image_view.selectionModel().select(model.index(5), QItemSelectionModel.SelectionFlag.Select)
+        layouts = []
+        # The index must already match the new order when the view hears about it
+        model.layoutChanged.connect(lambda *args: layouts.append([model.rowOf(record.unique_id) for record in records]))
+
+        self.ui.removeImages([records[i].unique_id for i in (7, 1, 2, 3, 8)])
+        self.assertEqual(self.ui.images, [records[i] for i in (0, 4, 5, 6, 9)])
+        self.assertEqual(layouts, [[0, -1, -1, -1, 1, 2, 3, -1, -1, 4]], "Scattered rows should go in one layout change")
+        self.assertEqual(self.ui.image_view.selectedIds(), [records[5].unique_id], "Selection should follow the image")
+        self.assertEqual(self.ui.image_counter_label.text(), "5 Bilder")
+
+    def test_sort_images(self):
+        """Test sorting by capture time, natural file name and folder as one layout change."""
+        import time
+        from PyQt6.QtCore import QItemSelectionModel
+        from pdf_creator import ImageMeta
+        names = ["/b/Foto Nr. 10.jpg", "/a/Foto Nr. 9.jpg", "/b/Foto Nr. 2.jpg", "/a/Foto Nr. 11.jpg"]
+        taken = ["2021:05:01 12:00:00", None, "2021:05:01 09:00:00", "2020:12:24 18:00:00"]
+        records = []
+        for name, time_taken in zip(names, taken):
+            record = ImageRecord(name)
+            record.meta = ImageMeta(400, 300, mtime=time.mktime((2021, 5, 1, 10, 0, 0, 0, 0, -1)), taken=time_taken)
+            records.append(record)
+        # Metadata of this one has not been loaded yet
+        records.append(ImageRecord("/a/Foto Nr. 1.jpg"))
+        self.ui.image_model.appendRecords(records)
+        self.ui.image_view.selectionModel().select(self.ui.image_model.index(0),
+                                                   QItemSelectionModel.SelectionFlag.Select)
+        layout_changes = []
+        self.ui.image_model.layoutChanged.connect(lambda *args: layout_changes.append(1))
+
+        self.ui.sortImages(1)
+        self.assertEqual([record.file_path for record in self.ui.images],
+                         ["/a/Foto Nr. 11.jpg", "/b/Foto Nr. 2.jpg", "/a/Foto Nr. 9.jpg", "/b/Foto Nr. 10.jpg",
+                          "/a/Foto Nr. 1.jpg"],
+                         "The file time should stand in for a missing capture time, unknown images go last")
+        self.assertEqual(self.ui.image_view.selectedIds(), [records[0].unique_id], "Selection should follow the image")
+        self.ui.sortImages(2)
+        self.assertEqual([os.path.basename(record.file_path) for record in self.ui.images],
+                         ["Foto Nr. 1.jpg", "Foto Nr. 2.jpg", "Foto Nr. 9.jpg", "Foto Nr. 10.jpg", "Foto Nr. 11.jpg"],
+                         "File names should sort by photo number")
+        self.ui.sortImages(3)
+        self.assertEqual([record.file_path for record in self.ui.images],
+                         ["/a/Foto Nr. 1.jpg", "/a/Foto Nr. 9.jpg", "/a/Foto Nr. 11.jpg", "/b/Foto Nr. 2.jpg",
+                          "/b/Foto Nr. 10.jpg"])
+        self.assertEqual(len(layout_changes), 3, "Every sort should be a single layout change")
+        self.assertEqual([self.ui.image_model.rowOf(record.unique_id) for record in self.ui.images], list(range(5)))
+
+    def test_move_selected_images(self):
+        """Test that several selected images move together to the drop target."""
+        records = [ImageRecord(f"/photos/{i}.jpg") for i in range(6)]
+        self.ui.image_model.appendRecords(records)
+        self.ui.moveImages([records[0].unique_id, records[2].unique_id], records[4].unique_id)
+        self.assertEqual(self.ui.images, [records[i] for i in (1, 3, 4, 0, 2, 5)])
+        self.ui.moveImages([records[5].unique_id, records[4].unique_id], records[1].unique_id)
+        self.assertEqual(self.ui.images, [records[i] for i in (4, 5, 1, 3, 0, 2)])
+
+    def test_remove_blurry_images(self):
+        """Test that images below a sharpness threshold are found for bulk removal and get a badge."""
+        from pdf_creator import ImageQuality, ImageListModel
+        records = [ImageRecord(f"/photos/{i}.jpg") for i in range(4)]
+        self.ui.image_model.appendRecords(records)
+        for row, sharpness in enumerate([10.0, 400.0, None, 45.0]):
+            if sharpness is not None:
+                self.ui.image_model.setQuality(row, ImageQuality(sharpness, 128.0, 0.0, 0.0))
+
+        blurry = self.ui.imagesBelowSharpness(50)
+        self.assertEqual(blurry, [records[0].unique_id, records[3].unique_id],
+                         "Only scored images below the threshold should be picked")
+        self.assertTrue(self.ui.image_model.index(0).data(ImageListModel.QualityRole).is_blurry)
+        self.ui.removeImages(blurry)
+        self.assertEqual(self.ui.images, [records[1], records[2]])
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file